@@ -1,17 +1,40 @@
 from http.server import BaseHTTPRequestHandler
 import json
 import os
+import sys
 import tempfile
-import yt_dlp
 import base64
+import hashlib
+import shutil
 from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
 import re
 
+# 共享模块位于 backend/ 目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+from video_info import YDL_HTTP_HEADERS, get_video_info, source_caption_langs
+from result_cache import get_result_cache, source_key_for_text, source_key_for_url, TranscriptCache
+from translation import MultiTranslator, asr_language, source_language, target_languages
+from translators import backend_from_env
+from http_clients import open_media, openai_client
+from captions import align_translations, fetch_translated_cues, looks_rolling, normalize_cues, parse_captions, stream_captions
+from whisper_api import transcribe_any, transcribe_file
+from vad import transcribe_with_vad
+from streaming import media_headers, stream_transcribe
+from event_stream import MEDIA_TYPES, TranscriptCollector, cached_events, done_event, encode_event, negotiate, transcript_events
+from upload_store import get_upload_store, parse_sha256
+from uploads import UploadError, parse_boundary, parse_multipart_stream, save_stream
+
+ASR_MODEL = 'whisper-1'
+TRANSLATOR = backend_from_env('google')
+SOURCE_LANGUAGE = 'en'
+TARGET_LANGUAGE = 'zh-cn'
+
 class handler(BaseHTTPRequestHandler):
     def send_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Accept, X-Filename, X-Api-Key')
     
     def do_OPTIONS(self):
         self.send_response(200)
@@ -30,37 +53,64 @@ class handler(BaseHTTPRequestHandler):
             "version": "2.0.0-ai-updated",
             "features": ["yt-dlp", "openai-whisper", "translation", "base64-upload"],
             "timestamp": str(os.getenv('VERCEL_DEPLOYMENT_ID', 'local')),
-            "test": "API is working"
+            "test": "API is working",
+            "result_cache": get_result_cache().stats()
         }
         self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
     
     def do_POST(self):
+        audio_file = None
         try:
-            # Read request body
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length) if content_length else b'{}'
-            
-            # 处理JSON数据
-            data = json.loads(body.decode())
+            # 读取请求: JSON、multipart/form-data 或原始二进制音频
+            try:
+                data, audio_file, audio_hash = self.read_request()
+            except UploadError as e:
+                self.send_error_response(e.status, str(e))
+                return
             
             url = data.get('url', '')
-            api_key = data.get('api_key', os.environ.get('OPENAI_API_KEY', ''))
-            audio_base64 = data.get('audio_base64', '')
-            filename = data.get('filename', 'audio.mp3')
+            api_key = data.get('api_key') or os.environ.get('OPENAI_API_KEY', '')
             subtitle_text = data.get('subtitle_text', '')
-            
-            # 处理base64音频文件
-            audio_file = None
-            if audio_base64:
-                audio_file = self.save_base64_audio(audio_base64, filename)
+            # 一次转写翻成多种语言: target_languages 列表 (或逗号分隔)，source_language 写 auto 时自动识别
+            try:
+                self.source_language = source_language(data.get('source_language'), SOURCE_LANGUAGE)
+                self.target_languages = target_languages(
+                    data.get('target_languages') or data.get('target_language'), TARGET_LANGUAGE)
+            except ValueError as e:
+                self.send_error_response(400, str(e))
+                return
+            # Accept: text/event-stream 或 application/x-ndjson 时逐段推送结果
+            stream_mode = negotiate(self.headers.get('Accept'))
             
             if not url and not audio_file and not subtitle_text:
                 self.send_error_response(400, "URL, audio file, or subtitle text is required")
                 return
             
-            # 获取标题
+            # 结果缓存：同一来源、模型和语言已经处理过就直接返回，不再下载/转写/翻译
+            cache_key = None
+            if api_key:
+                if audio_hash:
+                    source_key = f"sha256:{audio_hash}"
+                elif subtitle_text:
+                    source_key = source_key_for_text(subtitle_text)
+                else:
+                    source_key = source_key_for_url(url)
+                cache_key = TranscriptCache.make_key(source_key, ASR_MODEL, self.source_language,
+                                                     ','.join(self.target_languages), TRANSLATOR)
+                cached = get_result_cache().get(cache_key)
+                if cached:
+                    print(f"Result cache hit: {source_key}")
+                    if stream_mode:
+                        self.send_event_stream(stream_mode, cached_events(cached))
+                    else:
+                        self.send_success_response(cached)
+                    return
+            
+            # 获取标题 —— 每个请求只探测一次，后续字幕/音频都复用 video_info
+            video_info = None
             if url:
-                title = self.get_video_title(url)
+                video_info = self.probe_video_info(url)
+                title = video_info.title if video_info else "YouTube Video"
             elif subtitle_text:
                 title = "Pasted Subtitles"
             else:
@@ -128,22 +178,27 @@ class handler(BaseHTTPRequestHandler):
                     # YouTube字幕提取不需要API密钥，但翻译需要
                     try:
                         print("Extracting subtitles without API key...")
-                        subtitle_content, video_title = self.extract_subtitles(url)
-                        title = video_title
-                        segments = self.parse_subtitles(subtitle_content)
+                        segments, title = self.extract_subtitles(video_info)
                         
                         # 不翻译，只返回英文字幕
+                        primary = self.target_languages[0]
                         translated_segments = []
                         for seg in segments:
-                            translated_segments.append({
+                            aligned = seg.get('translations', {})
+                            translated = {
                                 "start": seg['start'],
                                 "end": seg['end'],
                                 "text": seg['text'],
-                                "translation": f"[需要API密钥进行中文翻译] {seg['text'][:50]}..."
-                            })
+                                "translation": aligned.get(primary) or f"[需要API密钥进行中文翻译] {seg['text'][:50]}..."
+                            }
+                            if len(self.target_languages) > 1:
+                                translated["translations"] = {lang: aligned.get(lang, '') for lang in self.target_languages}
+                            translated_segments.append(translated)
                         
+                        # 有 YouTube 翻译字幕时不需要机器翻译也能给出中文
+                        has_translations = any(seg.get('translations') for seg in segments)
                         response = {
-                            "title": f"[仅英文字幕] {title}",
+                            "title": title if has_translations else f"[仅英文字幕] {title}",
                             "segments": translated_segments
                         }
                         self.send_success_response(response)
@@ -165,13 +220,15 @@ class handler(BaseHTTPRequestHandler):
                         self.send_success_response(response)
                         return
             
+            if stream_mode:
+                self.stream_transcription(stream_mode, title, video_info, audio_file, subtitle_text, api_key, cache_key)
+                return
+            
             # 尝试进行真实的转写
             try:
-                # 只有有API密钥时才导入这些包
-                from openai import OpenAI
-                from deep_translator import GoogleTranslator
-                
                 segments = []
+                cacheable = True
+                client = openai_client(api_key)
                 
                 if audio_file:
                     # 使用上传的音频文件进行AI转录
@@ -188,7 +245,6 @@ class handler(BaseHTTPRequestHandler):
                     
                     # 转写
                     print(f"Starting transcription with OpenAI...")
-                    client = OpenAI(api_key=api_key)
                     segments = self.transcribe_audio(final_audio_file, client)
                     print(f"Transcription complete, got {len(segments)} segments")
                     
@@ -202,12 +258,12 @@ class handler(BaseHTTPRequestHandler):
                     # 使用yt-dlp获取音频URL进行转录
                     try:
                         print(f"Getting audio URL with yt-dlp...")
-                        audio_url, video_title, debug_info = self.get_audio_url(url)
+                        audio_format, video_title, debug_info = self.get_audio_url(video_info)
                         title = video_title
                         print(f"Audio URL obtained, proceeding with transcription...")
                         
                         # 使用音频URL进行转录
-                        segments = self.transcribe_from_url(audio_url, client)
+                        segments = self.transcribe_from_url(audio_format, client)
                         print(f"Audio URL transcription complete, got {len(segments)} segments")
                         
                     except Exception as audio_error:
@@ -225,9 +281,7 @@ class handler(BaseHTTPRequestHandler):
                         # 回退到字幕提取方法
                         try:
                             print(f"Falling back to subtitle extraction...")
-                            subtitle_content, video_title = self.extract_subtitles(url)
-                            title = video_title
-                            segments = self.parse_subtitles(subtitle_content)
+                            segments, title = self.extract_subtitles(video_info)
                             print(f"Subtitle extraction complete, got {len(segments)} segments")
                         except Exception as subtitle_error:
                             print(f"Both methods failed. Audio: {audio_error}, Subtitle: {subtitle_error}")
@@ -262,26 +316,20 @@ class handler(BaseHTTPRequestHandler):
                             })
                             
                             title = "调试信息 - Debug Info"
+                            cacheable = False
                 
                 # 翻译
                 print(f"Starting translation...")
-                translator = GoogleTranslator(source='en', target='zh-cn')
-                translated_segments = self.translate_segments(segments, translator)
+                translated_segments = self.translate_segments(segments)
                 print(f"Translation complete")
                 
-                # 清理文件
-                if audio_file:  # 只有上传的文件才需要清理
-                    try:
-                        if os.path.exists(final_audio_file):
-                            os.remove(final_audio_file)
-                            print(f"Cleaned up file: {final_audio_file}")
-                    except Exception as cleanup_error:
-                        print(f"Cleanup error: {cleanup_error}")
-                
                 response = {
                     "title": title,
                     "segments": translated_segments
                 }
+                # 有翻译失败的片段时不缓存，下次请求还能重试
+                if cacheable and all(seg.get('translation_status') != 'failed' for seg in translated_segments):
+                    get_result_cache().put(cache_key, response)
                 self.send_success_response(response)
                 
             except Exception as e:
@@ -301,9 +349,20 @@ class handler(BaseHTTPRequestHandler):
                 
         except Exception as e:
             self.send_error_response(500, f"Request error: {str(e)}")
+        finally:
+            # 上传或检出的音频 (最大 500 MB) 只属于这个请求，无论从哪条路径返回都删掉
+            self.remove_audio(audio_file)
+    
+    def remove_audio(self, audio_file):
+        try:
+            if audio_file and os.path.exists(audio_file):
+                os.remove(audio_file)
+                print(f"Cleaned up file: {audio_file}")
+        except OSError as e:
+            print(f"Cleanup error: {e}")
     
     def save_base64_audio(self, base64_data, filename):
-        """Save base64 encoded audio to a temporary file"""
+        """Save base64 encoded audio to a temporary file, returns (path, sha256)"""
         try:
             # 移除data URL前缀（如果存在）
             if ',' in base64_data:
@@ -311,6 +370,7 @@ class handler(BaseHTTPRequestHandler):
             
             # 解码base64数据
             audio_data = base64.b64decode(base64_data)
+            audio_hash = hashlib.sha256(audio_data).hexdigest()
             
             # 获取文件扩展名
             file_ext = '.mp3'
@@ -326,250 +386,115 @@ class handler(BaseHTTPRequestHandler):
             with open(audio_path, 'wb') as f:
                 f.write(audio_data)
             
-            print(f"Saved base64 audio to: {audio_path}, size: {len(audio_data)} bytes")
-            return audio_path
+            print(f"Saved base64 audio to: {audio_path}, size: {len(audio_data)} bytes, sha256: {audio_hash[:12]}")
+            return audio_path, audio_hash
             
         except Exception as e:
             print(f"Error saving base64 audio: {e}")
-            return None
+            return None, None
     
-    def parse_multipart(self, body, boundary):
-        """Parse multipart/form-data"""
-        try:
-            # 处理boundary格式
-            if boundary.startswith('"') and boundary.endswith('"'):
-                boundary = boundary[1:-1]
-            
-            boundary_bytes = boundary.encode()
-            parts = body.split(b'--' + boundary_bytes)
-            
-            data = {}
-            audio_file = None
-            
-            for part in parts:
-                if b'Content-Disposition' not in part:
-                    continue
-                    
-                # 提取头部和内容
-                if b'\r\n\r\n' in part:
-                    header, content = part.split(b'\r\n\r\n', 1)
-                    header_str = header.decode('utf-8', errors='ignore')
-                    
-                    # 提取字段名
-                    if 'name="' in header_str:
-                        field_name = header_str.split('name="')[1].split('"')[0]
-                        
-                        if field_name == 'audio':
-                            # 获取文件扩展名
-                            file_ext = '.mp3'
-                            if 'filename="' in header_str:
-                                filename = header_str.split('filename="')[1].split('"')[0]
-                                if '.' in filename:
-                                    file_ext = '.' + filename.split('.')[-1]
-                            
-                            # 保存音频文件
-                            temp_dir = '/tmp'
-                            import uuid
-                            unique_id = str(uuid.uuid4())[:8]
-                            audio_filename = os.path.join(temp_dir, f'uploaded_{unique_id}{file_ext}')
-                            
-                            # 去除尾部的boundary标记
-                            content = content.rstrip(b'\r\n--')
-                            
-                            with open(audio_filename, 'wb') as f:
-                                f.write(content)
-                            
-                            audio_file = audio_filename
-                            print(f"Saved uploaded file: {audio_filename}, size: {len(content)} bytes")
-                        else:
-                            # 其他字段
-                            content_str = content.decode('utf-8', errors='ignore').rstrip('\r\n--')
-                            data[field_name] = content_str
-                            print(f"Parsed field {field_name}: {content_str[:50]}...")
-            
-            return data, audio_file
-            
-        except Exception as e:
-            print(f"Multipart parsing error: {e}")
-            import traceback
-            traceback.print_exc()
-            return {}, None
+    def read_request(self):
+        """Return (fields, audio_path, audio_sha256) without buffering uploads in memory
+        
+        - application/json: url / subtitle_text / upload_sha256 from a chunked upload,
+          or audio_base64 (legacy clients)
+        - multipart/form-data: same fields, audio file in the "audio" part
+        - application/octet-stream: the body is the audio; filename and key come from
+          the X-Filename / X-Api-Key headers
+        """
+        content_type = self.headers.get('Content-Type', '')
+        content_length = int(self.headers.get('Content-Length', 0))
+        
+        if content_type.startswith('multipart/form-data'):
+            fields, files = parse_multipart_stream(self.rfile, content_length, parse_boundary(content_type))
+            upload = files.pop('audio', None)
+            for extra in files.values():
+                os.remove(extra.path)
+            if upload is None:
+                return fields, None, None
+            print(f"Saved uploaded file: {upload.path}, size: {upload.size} bytes, sha256: {upload.sha256[:12]}")
+            return fields, upload.path, upload.sha256
+        
+        if content_type.startswith('application/octet-stream'):
+            filename = self.headers.get('X-Filename', 'audio.mp3')
+            upload = save_stream(self.rfile, content_length, filename)
+            print(f"Saved uploaded file: {upload.path}, size: {upload.size} bytes, sha256: {upload.sha256[:12]}")
+            return {'filename': filename, 'api_key': self.headers.get('X-Api-Key', '')}, upload.path, upload.sha256
+        
+        body = self.rfile.read(content_length) if content_length else b'{}'
+        data = json.loads(body.decode())
+        audio_file, audio_hash = None, None
+        if data.get('upload_sha256'):
+            # 分片上传 (api/upload.py) 完成后按内容哈希引用文件
+            audio_hash = parse_sha256(data['upload_sha256'])
+            audio_file = get_upload_store().checkout(audio_hash)
+        elif data.get('audio_base64'):
+            audio_file, audio_hash = self.save_base64_audio(data['audio_base64'], data.get('filename', 'audio.mp3'))
+        return data, audio_file, audio_hash
     
-    def extract_subtitles(self, url):
-        """Extract subtitles from YouTube - No download needed"""
+    def extract_subtitles(self, video_info):
+        """Download and parse the source-language caption track listed in the probed video info
+        
+        Returns (segments, title); the track is parsed while it downloads.
+        """
         try:
-            print(f"Extracting subtitles from: {url}")
-            
-            ydl_opts = {
-                'writesubtitles': True,
-                'writeautomaticsub': True,  # 包括自动生成的字幕
-                'subtitleslangs': ['en', 'en-US', 'en-GB'],  # 优先英文字幕
-                'skip_download': True,  # 不下载视频
-                'quiet': True,
-                'no_warnings': True,
-                # 反检测措施
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Connection': 'keep-alive',
-                },
-                'extractor_retries': 3,
-                'sleep_interval': 1,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # 获取视频信息，包括字幕
-                info = ydl.extract_info(url, download=False)
-                if not info:
-                    raise Exception("无法获取视频信息")
-                
-                # 获取字幕数据
-                subtitles = info.get('subtitles', {})
-                automatic_captions = info.get('automatic_captions', {})
-                
-                print(f"Available subtitles: {list(subtitles.keys())}")
-                print(f"Available auto captions: {list(automatic_captions.keys())}")
-                
-                # 优先使用手动字幕，然后是自动字幕
-                subtitle_data = None
-                subtitle_lang = None
-                
-                # 检查手动字幕
-                for lang in ['en', 'en-US', 'en-GB']:
-                    if lang in subtitles:
-                        subtitle_data = subtitles[lang]
-                        subtitle_lang = lang
-                        print(f"Found manual subtitles in {lang}")
-                        break
-                
-                # 如果没有手动字幕，使用自动字幕
-                if not subtitle_data:
-                    for lang in ['en', 'en-US', 'en-GB']:
-                        if lang in automatic_captions:
-                            subtitle_data = automatic_captions[lang]
-                            subtitle_lang = lang
-                            print(f"Found auto captions in {lang}")
-                            break
-                
-                if not subtitle_data:
-                    raise Exception("没有找到英文字幕")
-                
-                # 获取字幕内容
-                subtitle_url = None
-                for format_data in subtitle_data:
-                    if format_data.get('ext') in ['vtt', 'srv3', 'ttml']:
-                        subtitle_url = format_data.get('url')
-                        break
-                
-                if not subtitle_url:
-                    raise Exception("无法获取字幕下载链接")
-                
-                print(f"Downloading subtitles from: {subtitle_url}")
+            if video_info is None:
+                raise Exception("无法获取视频信息")
+            
+            print(f"Available subtitles: {list(video_info.subtitles.keys())}")
+            print(f"Available auto captions: {list(video_info.automatic_captions.keys())}")
+            
+            # 优先使用手动字幕，然后是自动字幕
+            subtitle_lang, track, is_auto = video_info.find_caption_track(source_caption_langs(self.source_language))
+            if not track:
+                raise Exception("没有找到英文字幕")
+            print(f"Found {'auto captions' if is_auto else 'manual subtitles'} in {subtitle_lang}")
+            
+            subtitle_url = track['url']
+            print(f"Downloading {track.get('ext')} subtitles from: {subtitle_url}")
+            
+            # 各目标语言的 YouTube 翻译字幕和原文并行下载，按时间对齐，对不上的片段才走机器翻译
+            translated_tracks = {}
+            if os.environ.get('CAPTION_TRANSLATIONS', '1') != '0':
+                for target in self.target_languages:
+                    translated_track, translated_auto = video_info.find_translated_track(target, track)
+                    if translated_track:
+                        translated_tracks[target] = (translated_track, translated_auto)
+            with ThreadPoolExecutor(max_workers=max(1, len(translated_tracks))) as executor:
+                translated = {
+                    target: executor.submit(fetch_translated_cues, translated_track, translated_auto)
+                    for target, (translated_track, translated_auto) in translated_tracks.items()
+                }
                 
-                # 下载字幕内容
-                import urllib.request
-                with urllib.request.urlopen(subtitle_url) as response:
-                    subtitle_content = response.read().decode('utf-8')
+                # 自动字幕逐行滚动，先去重再合并成句子
+                segments = list(normalize_cues(stream_captions(subtitle_url, track.get('ext')), rolling=is_auto))
+                if not segments:
+                    raise Exception("字幕为空")
+                print(f"Parsed {len(segments)} subtitle segments")
                 
-                return subtitle_content, info.get('title', 'Unknown Video')
+                for target, future in translated.items():
+                    try:
+                        aligned = align_translations(segments, future.result(), lang=target)
+                        print(f"Aligned {aligned}/{len(segments)} segments with YouTube {target} captions")
+                    except Exception as e:
+                        print(f"YouTube {target} captions unavailable: {e}")
+            return segments, video_info.title
                 
         except Exception as e:
             print(f"Subtitle extraction error: {e}")
             raise Exception(f"字幕提取失败: {str(e)}")
     
-    def parse_subtitles(self, subtitle_content):
-        """Parse VTT/SRT subtitle format to segments"""
-        try:
-            segments = []
-            
-            # VTT格式解析
-            if 'WEBVTT' in subtitle_content:
-                print("Parsing VTT format")
-                lines = subtitle_content.split('\n')
-                current_segment = {}
-                
-                for line in lines:
-                    line = line.strip()
-                    if not line or line.startswith('WEBVTT') or line.startswith('NOTE'):
-                        continue
-                    
-                    # 时间戳行 (格式: 00:00:01.000 --> 00:00:05.000)
-                    if '-->' in line:
-                        time_match = re.search(r'(\d{2}:\d{2}:\d{2}\.\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2}\.\d{3})', line)
-                        if time_match:
-                            start_time = self.time_to_seconds(time_match.group(1))
-                            end_time = self.time_to_seconds(time_match.group(2))
-                            current_segment = {
-                                'start': start_time,
-                                'end': end_time,
-                                'text': ''
-                            }
-                    
-                    # 文本行
-                    elif line and 'start' in current_segment:
-                        # 去除HTML标签
-                        clean_text = re.sub(r'<[^>]+>', '', line)
-                        if clean_text.strip():
-                            if current_segment['text']:
-                                current_segment['text'] += ' ' + clean_text.strip()
-                            else:
-                                current_segment['text'] = clean_text.strip()
-                    
-                    # 空行表示段落结束
-                    elif not line and current_segment.get('text'):
-                        segments.append(current_segment)
-                        current_segment = {}
-                
-                # 添加最后一个segment
-                if current_segment.get('text'):
-                    segments.append(current_segment)
-            
-            # 如果解析失败，尝试简单的文本提取
-            if not segments:
-                print("Fallback to simple text extraction")
-                # 提取所有文本，创建一个简单的segment
-                clean_text = re.sub(r'<[^>]+>', '', subtitle_content)
-                clean_text = re.sub(r'\d{2}:\d{2}:\d{2}\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3}', '', clean_text)
-                clean_text = '\n'.join([line.strip() for line in clean_text.split('\n') if line.strip() and not line.strip().startswith('WEBVTT')])
-                
-                if clean_text:
-                    segments = [{
-                        'start': 0.0,
-                        'end': 30.0,
-                        'text': clean_text[:500] + ('...' if len(clean_text) > 500 else '')
-                    }]
-            
-            print(f"Parsed {len(segments)} subtitle segments")
-            return segments
-            
-        except Exception as e:
-            print(f"Subtitle parsing error: {e}")
-            return [{
-                'start': 0.0,
-                'end': 10.0,
-                'text': '字幕解析失败，请尝试其他视频'
-            }]
-    
-    def time_to_seconds(self, time_str):
-        """Convert time string (HH:MM:SS.mmm) to seconds"""
-        try:
-            parts = time_str.split(':')
-            hours = int(parts[0])
-            minutes = int(parts[1])
-            seconds_parts = parts[2].split('.')
-            seconds = int(seconds_parts[0])
-            milliseconds = int(seconds_parts[1]) if len(seconds_parts) > 1 else 0
-            
-            total_seconds = hours * 3600 + minutes * 60 + seconds + milliseconds / 1000.0
-            return total_seconds
-        except:
-            return 0.0
-    
     def parse_simple_subtitles(self, subtitle_text):
         """Parse simple subtitle text format"""
         try:
+            if '-->' in subtitle_text or subtitle_text.lstrip().startswith(('{', '<')):
+                # 粘贴的是完整的 VTT/SRT/json3/XML 字幕文件
+                cues = list(parse_captions(subtitle_text))
+                segments = list(normalize_cues(cues, rolling=looks_rolling(cues)))
+                if segments:
+                    print(f"Parsed {len(segments)} pasted caption segments")
+                    return segments
+            
             segments = []
             lines = subtitle_text.strip().split('\n')
             
@@ -624,228 +549,189 @@ class handler(BaseHTTPRequestHandler):
                 'text': subtitle_text[:200] + ('...' if len(subtitle_text) > 200 else '')
             }]
     
-    def get_audio_url(self, url):
-        """Extract direct audio URL using yt-dlp command line tool"""
+    def get_audio_url(self, video_info):
+        """Pick the direct audio URL from the probed video info"""
         debug_info = []
         
         try:
-            print(f"Extracting audio URL from: {url}")
-            debug_info.append(f"开始提取: {url}")
-            
-            # 使用yt-dlp命令行工具获取音频URL
-            import subprocess
-            
-            # 尝试多种格式
-            format_attempts = [
-                'bestaudio',  # 最佳音频
-                'worstaudio',  # 最低质量
-                'bestaudio[ext=m4a]',  # M4A格式
-            ]
-            
-            for i, format_str in enumerate(format_attempts):
-                try:
-                    print(f"Trying yt-dlp with format: {format_str}")
-                    debug_info.append(f"尝试格式 {i+1}/{len(format_attempts)}: {format_str}")
-                    
-                    # 构建yt-dlp命令
-                    cmd = [
-                        'yt-dlp',
-                        '--get-url',
-                        '--format', format_str,
-                        url
-                    ]
-                    
-                    debug_info.append(f"执行命令: {' '.join(cmd)}")
-                    
-                    # 执行命令
-                    result = subprocess.run(
-                        cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=60
-                    )
-                    
-                    debug_info.append(f"命令返回码: {result.returncode}")
-                    
-                    if result.returncode == 0 and result.stdout.strip():
-                        audio_url = result.stdout.strip()
-                        debug_info.append(f"✓ 成功获取音频URL")
-                        debug_info.append(f"URL长度: {len(audio_url)} 字符")
-                        debug_info.append(f"URL开头: {audio_url[:100]}...")
-                        
-                        # 获取视频标题
-                        try:
-                            title_cmd = ['yt-dlp', '--get-title', url]
-                            title_result = subprocess.run(title_cmd, capture_output=True, text=True, timeout=30)
-                            video_title = title_result.stdout.strip() if title_result.returncode == 0 else "Unknown Video"
-                        except:
-                            video_title = "Unknown Video"
-                        
-                        debug_info.append(f"视频标题: {video_title}")
-                        
-                        print(f"Successfully got audio URL with format: {format_str}")
-                        print(f"Audio URL: {audio_url[:100]}...")
-                        return audio_url, video_title, debug_info
-                    else:
-                        error_output = result.stderr.strip() if result.stderr else "无输出"
-                        debug_info.append(f"格式 {format_str} 失败: {error_output[:100]}")
-                        print(f"Format {format_str} failed: {error_output}")
-                        
-                except subprocess.TimeoutExpired:
-                    debug_info.append(f"格式 {format_str}: 命令超时")
-                    print(f"Format {format_str} timed out")
-                except Exception as format_error:
-                    error_msg = str(format_error)
-                    debug_info.append(f"格式 {format_str} 异常: {error_msg[:100]}")
-                    print(f"Format {format_str} exception: {format_error}")
-                    continue
+            if video_info is None:
+                raise Exception("无法获取视频信息")
+            
+            # 缓存里的签名音频URL已过期时重新探测
+            if not video_info.audio_formats:
+                debug_info.append("缓存中的音频URL已过期，重新探测")
+                video_info = get_video_info(video_info.webpage_url, need_media=True)
+            
+            debug_info.append(f"视频: {video_info.webpage_url or video_info.video_id}")
+            debug_info.append(f"可用音频格式: {len(video_info.audio_formats)}")
+            
+            audio_format = video_info.best_audio()
+            if not audio_format:
+                raise Exception("没有可直接下载的音频格式")
+            
+            debug_info.append(f"✓ 选择格式 {audio_format.format_id} ({audio_format.ext}, {audio_format.abr:.0f}kbps)")
+            debug_info.append(f"URL开头: {audio_format.url[:100]}...")
+            debug_info.append(f"视频标题: {video_info.title}")
             
-            debug_info.append("所有格式提取尝试都失败了")
-            raise Exception("所有音频格式提取尝试都失败了")
+            print(f"Selected audio format {audio_format.format_id}: {audio_format.url[:100]}...")
+            return audio_format, video_info.title, debug_info
                 
         except Exception as e:
             print(f"Audio URL extraction error: {e}")
             debug_info.append(f"总体错误: {str(e)}")
             raise Exception(f"音频URL提取失败: {str(e)} | 调试信息: {' | '.join(debug_info)}")
 
-    def transcribe_from_url(self, audio_url, client):
+    def transcribe_from_url(self, audio_format, client):
         """Transcribe audio from direct URL using OpenAI Whisper"""
+        return list(self.iter_url_segments(audio_format, client))
+    
+    def iter_url_segments(self, audio_format, client):
+        """Yield segments while the audio is still downloading
+        
+        Falls back to downloading the whole file only if streaming fails before
+        the first segment, so nothing is transcribed twice.
+        """
+        headers = media_headers(YDL_HTTP_HEADERS, audio_format.http_headers)
+        if os.environ.get('STREAMING_TRANSCRIBE', '1') != '0':
+            # 边下载边转写，每个块单独做VAD
+            produced = False
+            try:
+                for seg in stream_transcribe(
+                    audio_format.url,
+                    lambda chunk: transcribe_with_vad(
+                        chunk, lambda path: transcribe_file(client, path, language=asr_language(self.source_language))
+                    ),
+                    headers=headers,
+                ):
+                    produced = True
+                    yield seg
+                return
+            except Exception as e:
+                if produced:
+                    raise
+                print(f"Streaming transcription failed, downloading whole file: {e}")
+        
+        print(f"Downloading audio from URL for transcription...")
+        
+        # 下载音频到临时文件
+        temp_audio = tempfile.NamedTemporaryFile(suffix='.' + (audio_format.ext or 'm4a'), delete=False)
+        temp_audio.close()
+        
         try:
-            print(f"Downloading audio from URL for transcription...")
-            
-            # 下载音频到临时文件
-            import urllib.request
-            import tempfile
-            
-            # 创建临时文件
-            temp_audio = tempfile.NamedTemporaryFile(suffix='.m4a', delete=False)
-            temp_audio.close()
-            
-            # 下载音频
-            urllib.request.urlretrieve(audio_url, temp_audio.name)
-            
+            with open_media(audio_format.url, headers=headers, timeout=30) as response, open(temp_audio.name, 'wb') as out:
+                shutil.copyfileobj(response, out, 1024 * 1024)
             print(f"Audio downloaded to temp file: {temp_audio.name}")
             
             # 使用现有的转录方法
-            segments = self.transcribe_audio(temp_audio.name, client)
+            yield from self.transcribe_audio(temp_audio.name, client)
             
-            # 清理临时文件
+        except Exception as e:
+            # 向上抛出，由调用方回退到字幕提取
+            print(f"URL transcription error: {e}")
+            raise
+        
+        finally:
             try:
                 os.remove(temp_audio.name)
                 print(f"Cleaned up temp audio file")
             except Exception as cleanup_error:
                 print(f"Cleanup error: {cleanup_error}")
-            
-            return segments
-            
+
+    def iter_video_segments(self, video_info, client):
+        """Audio transcription for a video, falling back to its captions if that fails up front"""
+        produced = False
+        try:
+            audio_format, _, _ = self.get_audio_url(video_info)
+            for seg in self.iter_url_segments(audio_format, client):
+                produced = True
+                yield seg
+            return
         except Exception as e:
-            print(f"URL transcription error: {e}")
-            return [{
-                "start": 0,
-                "end": 5,
-                "text": f"URL transcription failed: {str(e)}"
-            }]
+            if produced:
+                raise
+            print(f"Audio transcription failed, falling back to subtitles: {e}")
+        segments, _ = self.extract_subtitles(video_info)
+        yield from segments
 
-    def transcribe_audio(self, audio_file, client):
-        """Transcribe using OpenAI Whisper"""
+    def stream_transcription(self, mode, title, video_info, audio_file, subtitle_text, api_key, cache_key):
+        """Send each segment and then its translation as SSE/NDJSON events as soon as they are ready"""
+        self.start_event_stream(mode)
+        collector = TranscriptCollector()
         try:
-            # 获取文件扩展名
-            file_ext = os.path.splitext(audio_file)[1].lower()
-            
-            # OpenAI支持的格式
-            supported_formats = ['.mp3', '.mp4', '.m4a', '.wav', '.webm', '.mpeg', '.mpga']
-            
-            if file_ext not in supported_formats:
-                print(f"Warning: File format {file_ext} may not be supported")
+            self.send_event(mode, 'progress', {"stage": "started", "title": title})
+            client = openai_client(api_key)
             
-            with open(audio_file, 'rb') as audio:
-                response = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio,
-                    response_format="verbose_json",
-                    timestamp_granularities=["segment"]
-                )
-            
-            segments = []
-            if hasattr(response, 'segments') and response.segments:
-                for seg in response.segments:
-                    segments.append({
-                        "start": seg.get('start', 0),
-                        "end": seg.get('end', 0),
-                        "text": seg.get('text', '').strip()
-                    })
+            if audio_file:
+                self.send_event(mode, 'progress', {"stage": "transcribing"})
+                segments = self.transcribe_audio(audio_file, client)
+            elif subtitle_text:
+                segments = self.parse_simple_subtitles(subtitle_text)
             else:
-                # Fallback
-                text = getattr(response, 'text', str(response))
-                segments.append({
-                    "start": 0,
-                    "end": 30,
-                    "text": text
-                })
+                self.send_event(mode, 'progress', {"stage": "transcribing"})
+                segments = self.iter_video_segments(video_info, client)
             
-            return segments
+            for event, data in transcript_events(segments, self.translator()):
+                collector.add(event, data)
+                self.send_event(mode, event, data)
+            
+            if collector.segments and collector.cacheable:
+                get_result_cache().put(cache_key, collector.result(title))
+            self.send_event(mode, *done_event(title, len(collector.segments)))
+        
+        except (BrokenPipeError, ConnectionResetError):
+            print("Client disconnected from event stream")
+        except Exception as e:
+            print(f"Streaming error: {e}")
+            try:
+                self.send_event(mode, 'error', {"message": str(e)})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def transcribe_audio(self, audio_file, client):
+        """Transcribe the speech regions using OpenAI Whisper, splitting files over the 25 MB limit"""
+        language = asr_language(self.source_language)
+        
+        try:
+            return transcribe_with_vad(audio_file, lambda path: transcribe_any(client, path, language=language))
             
         except Exception as e:
+            # 失败结果不能进缓存，交给上层返回错误信息
             print(f"Transcription error: {e}")
-            return [{
-                "start": 0,
-                "end": 5,
-                "text": f"Transcription failed: {str(e)}"
-            }]
+            raise Exception(f"Transcription failed: {str(e)}")
     
-    def translate_segments(self, segments, translator):
-        """Translate to Chinese using deep-translator"""
-        translated = []
-        for seg in segments:
-            try:
-                translation = translator.translate(seg['text'])
-                translated.append({
-                    "start": seg['start'],
-                    "end": seg['end'],
-                    "text": seg['text'],
-                    "translation": translation
-                })
-            except Exception as e:
-                print(f"Translation error: {e}")
-                translated.append({
-                    "start": seg['start'],
-                    "end": seg['end'],
-                    "text": seg['text'],
-                    "translation": seg['text']  # Fallback
-                })
-        return translated
+    def translator(self):
+        """One BatchTranslator per requested target language, run side by side on the same transcript"""
+        return MultiTranslator.for_targets(TRANSLATOR, self.source_language, self.target_languages)
+    
+    def translate_segments(self, segments):
+        """Translate into every target language in concurrent, rate-limited batches"""
+        return self.translator().translate_segments(segments)
     
-    def get_video_title(self, url):
-        """Get YouTube video title"""
+    def probe_video_info(self, url):
+        """Single yt-dlp probe shared by the title, subtitle and audio stages"""
         try:
-            ydl_opts = {
-                'quiet': True, 
-                'no_warnings': True,
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Sec-Fetch-Dest': 'document',
-                    'Sec-Fetch-Mode': 'navigate',
-                    'Sec-Fetch-Site': 'none',
-                    'Sec-Fetch-User': '?1',
-                    'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-                    'sec-ch-ua-mobile': '?0',
-                    'sec-ch-ua-platform': '"Windows"'
-                },
-                'extractor_retries': 5,
-                'sleep_interval': 2,
-                'skip_unavailable_fragments': True,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return info.get('title', 'Unknown Video')
+            return get_video_info(url)
         except Exception as e:
-            print(f"Title extraction error: {e}")
-            return "YouTube Video"
+            print(f"Video probe error: {e}")
+            return None
+    
+    def start_event_stream(self, mode):
+        self.send_response(200)
+        self.send_header('Content-Type', f'{MEDIA_TYPES[mode]}; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        # 关闭反向代理缓冲，事件才能立即到达浏览器
+        self.send_header('X-Accel-Buffering', 'no')
+        self.send_cors_headers()
+        self.end_headers()
+    
+    def send_event(self, mode, event, data):
+        self.wfile.write(encode_event(mode, event, data))
+        self.wfile.flush()
+    
+    def send_event_stream(self, mode, events):
+        self.start_event_stream(mode)
+        for event, data in events:
+            self.send_event(mode, event, data)
     
     def send_success_response(self, data):
         self.send_response(200)
@@ -0,0 +1,104 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+
+# 共享模块位于 backend/ 目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+from upload_store import get_upload_store
+from uploads import UploadError
+
+
+class handler(BaseHTTPRequestHandler):
+    """Resumable chunked uploads
+
+    POST /api/upload?action=init      {"filename", "size", "sha256"?, "part_size"?}
+    PUT  /api/upload?upload_id=..&part=N   raw part bytes (X-Part-Sha256 optional)
+    GET  /api/upload?upload_id=..     which parts have arrived
+    POST /api/upload?action=complete&upload_id=..
+
+    The returned sha256 is then sent to /api/transcribe as "upload_sha256".
+    All of these calls must reach the same instance with a persistent disk
+    (see upload_store.py); on Vercel they answer 501 unless UPLOAD_STORE_DIR is set.
+    """
+
+    def send_cors_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Part-Sha256')
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_cors_headers()
+        self.end_headers()
+
+    def query(self):
+        params = parse_qs(urlparse(self.path).query)
+        return {key: values[0] for key, values in params.items()}
+
+    def do_GET(self):
+        try:
+            self.send_success_response(get_upload_store().status(self.query().get('upload_id', '')))
+        except UploadError as e:
+            self.send_error_response(e.status, str(e))
+
+    def do_POST(self):
+        try:
+            query = self.query()
+            content_length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(content_length).decode()) if content_length else {}
+            store = get_upload_store()
+            action = query.get('action') or data.get('action')
+
+            if action == 'init':
+                result = store.init(
+                    filename=data.get('filename', 'audio.mp3'),
+                    size=int(data.get('size', 0)),
+                    sha256=data.get('sha256'),
+                    part_size=data.get('part_size'),
+                )
+            elif action == 'complete':
+                result = store.complete(query.get('upload_id') or data.get('upload_id', ''))
+            else:
+                self.send_error_response(400, "action must be init or complete")
+                return
+            self.send_success_response(result)
+
+        except UploadError as e:
+            self.send_error_response(e.status, str(e))
+        except Exception as e:
+            self.send_error_response(500, f"Request error: {str(e)}")
+
+    def do_PUT(self):
+        try:
+            query = self.query()
+            result = get_upload_store().put_part(
+                query.get('upload_id', ''),
+                int(query.get('part', -1)),
+                self.rfile,
+                int(self.headers.get('Content-Length', 0)),
+                expected_sha256=self.headers.get('X-Part-Sha256'),
+            )
+            self.send_success_response(result)
+
+        except UploadError as e:
+            self.send_error_response(e.status, str(e))
+        except Exception as e:
+            self.send_error_response(500, f"Request error: {str(e)}")
+
+    def send_success_response(self, data):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_cors_headers()
+        self.end_headers()
+        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def send_error_response(self, code, message):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_cors_headers()
+        self.end_headers()
+
+        error_response = {"error": message, "code": code}
+        self.wfile.write(json.dumps(error_response).encode('utf-8'))
@@ -0,0 +1,104 @@
+"""
+本地语音识别后端
+
+统一的 transcribe(audio_path, language) -> [{start, end, text}] 接口：
+- whisper: openai-whisper，PyTorch fp32
+- faster-whisper: CTranslate2 推理，CPU 上默认 int8 量化，速度快、内存占用低
+
+通过 ASR_BACKEND / ASR_COMPUTE_TYPE / ASR_BEAM_SIZE 按部署选择。
+"""
+import os
+from typing import Dict, List, Optional
+
+
+class ASRBackend:
+    name = 'base'
+
+    def __init__(self, model_size: str, threads: int = 1, compute_type: str = 'int8',
+                 beam_size: Optional[int] = None):
+        self.model_size = model_size
+        self.threads = threads
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+
+    @property
+    def model_id(self) -> str:
+        return model_id(self.name, self.model_size, self.compute_type, self.beam_size)
+
+    def transcribe(self, audio_path: str, language: Optional[str] = 'en') -> List[Dict]:
+        raise NotImplementedError
+
+
+class WhisperBackend(ASRBackend):
+    name = 'whisper'
+
+    def __init__(self, model_size: str, threads: int = 1, compute_type: str = 'float32',
+                 beam_size: Optional[int] = None):
+        super().__init__(model_size, threads, compute_type, beam_size)
+        import torch
+        import whisper
+
+        torch.set_num_threads(threads)
+        self._model = whisper.load_model(model_size, device='cpu')
+
+    def transcribe(self, audio_path: str, language: Optional[str] = 'en') -> List[Dict]:
+        # 未设置 ASR_BEAM_SIZE 时保持 openai-whisper 默认的贪心解码，CPU 上快好几倍
+        options = {'beam_size': self.beam_size} if self.beam_size else {}
+        result = self._model.transcribe(audio_path, language=language, fp16=False, **options)
+        return [
+            {"start": float(seg['start']), "end": float(seg['end']), "text": seg['text'].strip()}
+            for seg in result['segments']
+        ]
+
+
+class FasterWhisperBackend(ASRBackend):
+    name = 'faster-whisper'
+
+    def __init__(self, model_size: str, threads: int = 1, compute_type: str = 'int8',
+                 beam_size: Optional[int] = None):
+        super().__init__(model_size, threads, compute_type, beam_size)
+        from faster_whisper import WhisperModel
+
+        self._model = WhisperModel(model_size, device='cpu', compute_type=compute_type,
+                                   cpu_threads=threads, num_workers=1)
+
+    def transcribe(self, audio_path: str, language: Optional[str] = 'en') -> List[Dict]:
+        segments, _ = self._model.transcribe(audio_path, language=language, beam_size=self.beam_size or 5)
+        # segments 是惰性生成器，遍历时才真正解码
+        return [
+            {"start": float(seg.start), "end": float(seg.end), "text": seg.text.strip()}
+            for seg in segments
+        ]
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def model_id(backend: str, model_size: str, compute_type: str = 'int8', beam_size: Optional[int] = None) -> str:
+    """Identifies the exact model, precision and decoding, e.g. for result cache keys"""
+    if backend == FasterWhisperBackend.name:
+        key = f"{backend}-{model_size}-{compute_type}"
+    else:
+        # openai-whisper 在 CPU 上始终是 fp32
+        key = f"{backend}-{model_size}"
+    # 显式设置的 beam size 会改变输出，不能和默认解码共用缓存
+    return f"{key}-beam{beam_size}" if beam_size else key
+
+
+def backend_options_from_env() -> Dict:
+    return {
+        'backend': os.environ.get('ASR_BACKEND', 'whisper'),
+        'compute_type': os.environ.get('ASR_COMPUTE_TYPE', 'int8'),
+        # 不设置时用各后端自己的默认值 (openai-whisper 贪心解码，faster-whisper beam 5)
+        'beam_size': int(os.environ.get('ASR_BEAM_SIZE', 0)) or None,
+    }
+
+
+def create_backend(backend: str, model_size: str, threads: int = 1, compute_type: str = 'int8',
+                   beam_size: Optional[int] = None) -> ASRBackend:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend: {backend} (available: {', '.join(BACKENDS)})")
+    return BACKENDS[backend](model_size, threads=threads, compute_type=compute_type, beam_size=beam_size)
@@ -0,0 +1,122 @@
+"""
+长音频分段转写
+
+在目标时长附近找静音点切分音频，各段并发转写，再按偏移量平移时间戳，
+合并时去掉相邻两段重叠区域里重复的片段。
+"""
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from audio_io import API_AUDIO_EXT, detect_silences, export_clip, probe_duration
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+
+def plan_chunks(duration: float, silences: List[Tuple[float, float]], target: float = 600.0,
+                window: float = 60.0, overlap: float = 2.0) -> List[Tuple[float, float]]:
+    """Choose (start, end) ranges of roughly `target` seconds
+
+    Each cut goes in the middle of the silence closest to the target within
+    `window` seconds before it. Without a usable silence the cut is hard and
+    the next chunk starts `overlap` seconds earlier so no words are lost.
+    """
+    chunks = []
+    start = 0.0
+    while duration - start > target + window / 2:
+        ideal = start + target
+        midpoints = [(s + e) / 2 for s, e in silences if ideal - window <= (s + e) / 2 <= ideal]
+        if midpoints:
+            cut = max(midpoints)
+            chunks.append((start, cut))
+            start = cut
+        else:
+            chunks.append((start, ideal))
+            start = ideal - overlap
+    chunks.append((start, duration))
+    return chunks
+
+
+def _normalized(text: str) -> str:
+    return _PUNCT_RE.sub('', (text or '').lower()).strip()
+
+
+def merge_chunk(merged: List[Dict], chunks: List[Tuple[float, float]], index: int,
+                segments: List[Dict]) -> List[Dict]:
+    """Append chunk `index`'s segments to `merged` on the original timeline
+
+    `chunks` must already contain the following chunk, if there is one.
+    Returns the newly appended segments.
+    """
+    start, end = chunks[index]
+    is_last = index + 1 >= len(chunks)
+    # 与下一段重叠的区域，以重叠中点为界各取一半
+    next_start = end if is_last else chunks[index + 1][0]
+    upper = (next_start + end) / 2 if next_start < end else end
+    lower = None
+    if index > 0:
+        prev_end = chunks[index - 1][1]
+        lower = (start + prev_end) / 2 if start < prev_end else start
+    added = []
+    for seg in segments:
+        seg_start = seg['start'] + start
+        seg_end = seg['end'] + start
+        if lower is not None and seg_start < lower:
+            continue
+        if seg_start >= upper and not is_last:
+            continue
+        text = seg['text'].strip()
+        previous = added[-1] if added else (merged[-1] if merged else None)
+        if previous and _normalized(previous['text']) == _normalized(text):
+            continue
+        added.append({"start": round(seg_start, 3), "end": round(min(seg_end, end), 3), "text": text})
+    merged.extend(added)
+    return added
+
+
+def merge_chunk_segments(chunks: List[Tuple[float, float]], results: List[List[Dict]]) -> List[Dict]:
+    """Shift each chunk's segments by its offset and drop duplicates in overlaps"""
+    merged = []
+    for index, segments in enumerate(results):
+        merge_chunk(merged, chunks, index, segments)
+    return merged
+
+
+def transcribe_in_chunks(audio_file: str, transcribe_fn: Callable[[str], List[Dict]],
+                         target_seconds: Optional[float] = None, max_workers: Optional[int] = None,
+                         overlap: float = 2.0) -> List[Dict]:
+    """Split `audio_file` at silences and run `transcribe_fn(chunk_path)` concurrently
+
+    transcribe_fn receives a small opus file path and returns segments relative to it.
+    """
+    target_seconds = target_seconds or float(os.environ.get('WHISPER_CHUNK_SECONDS', 600))
+    max_workers = max_workers or int(os.environ.get('WHISPER_CHUNK_WORKERS', 4))
+
+    duration = probe_duration(audio_file)
+    try:
+        silences = detect_silences(audio_file)
+    except Exception as e:
+        print(f"Silence detection failed, using fixed cuts: {e}")
+        silences = []
+    chunks = plan_chunks(duration, silences, target=target_seconds, overlap=overlap)
+    print(f"Splitting {duration:.0f}s of audio into {len(chunks)} chunks")
+
+    work_dir = tempfile.mkdtemp(prefix='chunks_')
+    try:
+        def run(index):
+            start, end = chunks[index]
+            chunk_path = os.path.join(work_dir, f'chunk_{index:04d}{API_AUDIO_EXT}')
+            export_clip(audio_file, start, end - start, chunk_path)
+            segments = transcribe_fn(chunk_path)
+            print(f"Chunk {index + 1}/{len(chunks)} done ({start:.0f}-{end:.0f}s, {len(segments)} segments)")
+            return segments
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(run, range(len(chunks))))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return merge_chunk_segments(chunks, results)
@@ -0,0 +1,150 @@
+"""
+ffmpeg / ffprobe 辅助函数
+"""
+import os
+import re
+import subprocess
+import tempfile
+from typing import Iterator, List, Tuple
+
+SAMPLE_RATE = 16000
+
+# Whisper API 路径用低码率 opus，本地模型直接用 PCM wav，省掉一次 mp3 编码
+API_AUDIO_EXT = '.ogg'
+API_AUDIO_BITRATE = '24k'
+
+def download_postprocessors() -> List[dict]:
+    """yt-dlp postprocessors for AUDIO_DOWNLOAD_MODE
+
+    native (default) keeps YouTube's opus/m4a stream as-is, since every consumer
+    decodes it with ffmpeg anyway; mp3 restores the old 128 kbps re-encode.
+    """
+    if os.environ.get('AUDIO_DOWNLOAD_MODE', 'native') == 'mp3':
+        return [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '128'}]
+    return []
+
+
+_SILENCE_START_RE = re.compile(r'silence_start: (-?\d+(?:\.\d+)?)')
+_SILENCE_END_RE = re.compile(r'silence_end: (\d+(?:\.\d+)?)')
+
+
+def probe_duration(path: str) -> float:
+    """Duration in seconds as reported by ffprobe"""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+         '-of', 'default=noprint_wrappers=1:nokey=1', path],
+        capture_output=True, text=True, timeout=60,
+    )
+    if result.returncode != 0:
+        raise Exception(f"ffprobe failed: {result.stderr.strip()[:200]}")
+    return float(result.stdout.strip())
+
+
+def detect_silences(path: str, noise_db: float = -35.0, min_silence: float = 0.5) -> List[Tuple[float, float]]:
+    """Run ffmpeg's silencedetect filter and return (start, end) pairs"""
+    result = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-nostats', '-i', path,
+         '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}', '-f', 'null', '-'],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"silencedetect failed: {result.stderr.strip()[-200:]}")
+
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        match = _SILENCE_START_RE.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = _SILENCE_END_RE.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def _codec_args(out_path: str, bitrate: str) -> List[str]:
+    """Encoder chosen by output extension; .wav stays uncompressed 16-bit PCM"""
+    ext = os.path.splitext(out_path)[1].lower()
+    if ext in ('.ogg', '.opus'):
+        return ['-c:a', 'libopus', '-b:a', bitrate, '-application', 'voip']
+    if ext == '.mp3':
+        return ['-c:a', 'libmp3lame', '-b:a', bitrate]
+    if ext == '.wav':
+        return ['-c:a', 'pcm_s16le']
+    return []
+
+
+def export_clip(path: str, start: float, duration: float, out_path: str, bitrate: str = API_AUDIO_BITRATE):
+    """Cut [start, start+duration) into a small mono 16 kHz file (codec from out_path's extension)"""
+    result = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+         '-ss', f'{start:.3f}', '-t', f'{duration:.3f}', '-i', path,
+         '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE)] + _codec_args(out_path, bitrate) + [out_path],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg clip export failed: {result.stderr.strip()[-200:]}")
+
+
+def iter_pcm(path: str, block_bytes: int = 1024 * 1024, sample_rate: int = SAMPLE_RATE) -> Iterator[bytes]:
+    """Decode any input to 16-bit mono PCM and yield it in blocks, without holding it all in memory"""
+    process = subprocess.Popen(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', path,
+         '-vn', '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), '-'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    finished = False
+    try:
+        while True:
+            block = process.stdout.read(block_bytes)
+            if not block:
+                break
+            yield block
+        finished = True
+    finally:
+        if not finished:
+            # 调用方提前停止读取
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', errors='ignore')
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise Exception(f"ffmpeg decode failed: {stderr.strip()[-200:]}")
+
+
+def export_ranges(path: str, ranges: List[Tuple[float, float]], out_path: str,
+                  bitrate: str = API_AUDIO_BITRATE):
+    """Concatenate the given (start, end) ranges of `path` into one mono 16 kHz file"""
+    expression = '+'.join(f'between(t,{start:.3f},{end:.3f})' for start, end in ranges)
+    # 区间很多时表达式会很长，写进 filter script 文件而不是命令行
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as script:
+        script.write(f"aselect='{expression}',asetpts=N/SR/TB")
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path, '-vn',
+             '-filter_script:a', script.name, '-ac', '1', '-ar', str(SAMPLE_RATE)]
+            + _codec_args(out_path, bitrate) + [out_path],
+            capture_output=True, text=True,
+        )
+    finally:
+        os.remove(script.name)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg range export failed: {result.stderr.strip()[-200:]}")
+
+
+def ensure_api_format(path: str, supported_exts: List[str]) -> str:
+    """Return `path` if the Whisper API accepts its container, else a low-bitrate opus copy"""
+    if os.path.splitext(path)[1].lower() in supported_exts:
+        return path
+    out_path = os.path.splitext(path)[0] + '.api' + API_AUDIO_EXT
+    result = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path, '-vn',
+         '-ac', '1', '-ar', str(SAMPLE_RATE)] + _codec_args(out_path, API_AUDIO_BITRATE) + [out_path],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg transcode failed: {result.stderr.strip()[-200:]}")
+    return out_path
@@ -0,0 +1,132 @@
+"""
+ASR 后端基准测试：实时率 (RTF)、词错误率 (WER)、峰值内存
+
+样本目录里每个音频文件配一个同名 .txt 参考文本:
+    samples/lecture.mp3
+    samples/lecture.txt
+
+用法:
+    python benchmark_asr.py --samples samples \\
+        --config whisper:base --config faster-whisper:base:int8 --config faster-whisper:base:float32
+
+每个配置在独立进程里运行，峰值内存互不影响。
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from asr_backends import create_backend
+from audio_io import probe_duration
+
+AUDIO_EXTS = ('.mp3', '.m4a', '.wav', '.webm', '.opus', '.flac')
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    ref = _WORD_RE.findall(reference.lower())
+    hyp = _WORD_RE.findall(hypothesis.lower())
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    # 逐行计算编辑距离，只保留上一行
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def find_samples(samples_dir: str) -> List[Tuple[str, str]]:
+    samples = []
+    for path in sorted(glob.glob(os.path.join(samples_dir, '*'))):
+        base, ext = os.path.splitext(path)
+        if ext.lower() in AUDIO_EXTS and os.path.exists(base + '.txt'):
+            samples.append((path, base + '.txt'))
+    return samples
+
+
+def parse_config(spec: str) -> Dict:
+    parts = spec.split(':')
+    return {
+        'backend': parts[0],
+        'model_size': parts[1] if len(parts) > 1 else 'base',
+        'compute_type': parts[2] if len(parts) > 2 else 'int8',
+    }
+
+
+def _run_config(config: Dict, samples: List[Tuple[str, str]], threads: int, beam_size: Optional[int], queue):
+    started = time.time()
+    backend = create_backend(threads=threads, beam_size=beam_size, **config)
+    load_seconds = time.time() - started
+
+    audio_seconds = 0.0
+    asr_seconds = 0.0
+    errors = []
+    for audio_path, reference_path in samples:
+        duration = probe_duration(audio_path)
+        started = time.time()
+        segments = backend.transcribe(audio_path, language='en')
+        asr_seconds += time.time() - started
+        audio_seconds += duration
+        with open(reference_path, encoding='utf-8') as f:
+            reference = f.read()
+        errors.append(word_error_rate(reference, ' '.join(seg['text'] for seg in segments)))
+
+    # Linux 上 ru_maxrss 单位是 KB
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put({
+        'model': backend.model_id,
+        'load_s': load_seconds,
+        'rtf': asr_seconds / audio_seconds if audio_seconds else 0.0,
+        'wer': sum(errors) / len(errors) if errors else 0.0,
+        'peak_rss_mb': peak_rss_mb,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ASR backends on sample audio")
+    parser.add_argument('--samples', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples'),
+                        help="directory of audio files with matching .txt references")
+    parser.add_argument('--config', action='append', dest='configs',
+                        help="backend:model[:compute_type], repeatable")
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--beam-size', type=int, default=None,
+                        help="decoder beam size (default: each backend's own default, greedy for whisper)")
+    args = parser.parse_args()
+
+    samples = find_samples(args.samples)
+    if not samples:
+        sys.exit(f"No audio+.txt sample pairs found in {args.samples}")
+    configs = args.configs or ['whisper:base', 'faster-whisper:base:int8']
+
+    print(f"{len(samples)} samples, {args.threads} threads, beam size {args.beam_size or 'default'}")
+    print(f"{'model':<32} {'load s':>8} {'RTF':>8} {'WER':>8} {'peak MB':>9}")
+    ctx = multiprocessing.get_context('spawn')
+    for spec in configs:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run_config,
+                              args=(parse_config(spec), samples, args.threads, args.beam_size, queue))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"{spec:<32} failed (exit code {process.exitcode})")
+            continue
+        row = queue.get()
+        print(f"{row['model']:<32} {row['load_s']:>8.1f} {row['rtf']:>8.3f} "
+              f"{row['wer']:>8.3f} {row['peak_rss_mb']:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
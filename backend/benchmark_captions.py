@@ -0,0 +1,96 @@
+"""
+字幕解析基准测试
+
+生成指定时长的合成字幕 (每种格式各一份)，按 64KB 分块喂给解析器，模拟边下载边解析:
+    python benchmark_captions.py --hours 3
+也可以测真实的字幕文件 (格式按扩展名判断):
+    python benchmark_captions.py --file talk.en.json3 --file talk.en.vtt
+"""
+import argparse
+import json
+import os
+import random
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from captions import READ_BLOCK, parse_captions
+
+WORDS = ('the', 'model', 'we', 'train', 'data', 'is', 'going', 'to', 'look', 'at', 'this',
+         'really', 'important', 'result', 'and', 'then', 'you', 'can', 'see', 'that')
+
+
+def synthetic_cues(hours: float, seed: int = 0) -> List[Tuple[int, int, str]]:
+    """(start_ms, duration_ms, text) cues roughly every 2-4 seconds"""
+    rng = random.Random(seed)
+    cues = []
+    t = 0
+    while t < hours * 3600 * 1000:
+        duration = rng.randint(2000, 4000)
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 12)))
+        cues.append((t, duration, text))
+        t += duration
+    return cues
+
+
+def _clock(ms: int, sep: str = '.') -> str:
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{sep}{ms % 1000:03d}"
+
+
+def render(cues: List[Tuple[int, int, str]], fmt: str) -> bytes:
+    if fmt == 'json3':
+        events = [{"tStartMs": s, "dDurationMs": d, "segs": [{"utf8": text}]} for s, d, text in cues]
+        return json.dumps({"wireMagic": "pb3", "events": events}).encode('utf-8')
+    if fmt == 'srv3':
+        body = ''.join(f'<p t="{s}" d="{d}">{text}</p>' for s, d, text in cues)
+        return f'<?xml version="1.0" encoding="utf-8" ?><timedtext format="3"><body>{body}</body></timedtext>'.encode('utf-8')
+    if fmt == 'ttml':
+        body = ''.join(f'<p begin="{_clock(s)}" end="{_clock(s + d)}">{text}</p>' for s, d, text in cues)
+        return f'<tt xmlns="http://www.w3.org/ns/ttml"><body><div>{body}</div></body></tt>'.encode('utf-8')
+    if fmt == 'vtt':
+        body = ''.join(f"{_clock(s)} --> {_clock(s + d)}\n<c>{text}</c>\n\n" for s, d, text in cues)
+        return ("WEBVTT\nKind: captions\nLanguage: en\n\n" + body).encode('utf-8')
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def blocks(data: bytes) -> Iterator[bytes]:
+    for offset in range(0, len(data), READ_BLOCK):
+        yield data[offset:offset + READ_BLOCK]
+
+
+def measure(data: bytes, fmt: str, repeat: int) -> Dict:
+    best = float('inf')
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = sum(1 for _ in parse_captions(blocks(data), fmt))
+        best = min(best, time.perf_counter() - started)
+    return {'format': fmt, 'bytes': len(data), 'cues': count, 'ms': best * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming caption parser")
+    parser.add_argument('--hours', type=float, default=3.0, help="length of the synthetic captions")
+    parser.add_argument('--formats', default='json3,srv3,ttml,vtt')
+    parser.add_argument('--file', action='append', default=[], help="real caption file(s) to parse instead")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.file:
+        inputs = []
+        for path in args.file:
+            with open(path, 'rb') as f:
+                inputs.append((os.path.basename(path), f.read(), os.path.splitext(path)[1].lstrip('.')))
+    else:
+        cues = synthetic_cues(args.hours)
+        inputs = [(f"{args.hours:g}h synthetic", render(cues, fmt), fmt) for fmt in args.formats.split(',')]
+
+    print(f"{'input':<24} {'format':<6} {'size':>9} {'cues':>7} {'time':>9} {'cues/s':>10}")
+    for name, data, fmt in inputs:
+        result = measure(data, fmt, args.repeat)
+        rate = result['cues'] / (result['ms'] / 1000) if result['ms'] else 0
+        print(f"{name:<24} {fmt:<6} {result['bytes'] / 1024:>7.0f}KB {result['cues']:>7} "
+              f"{result['ms']:>7.1f}ms {rate:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+"""
+字幕解析
+
+一遍扫描、边下载边解析，按格式分派，逐条产出 {start, end, text}:
+    json3           YouTube 原生 JSON，逐个 event 增量解码
+    srv1/srv2/srv3  YouTube timedtext XML (<text start dur> / <p t d><s>)
+    ttml            W3C TTML (<p begin end|dur>)
+    vtt / srt       按行解析
+结构化的 json3/srv3 不需要猜测时间戳和标签，有的话优先使用 (见 video_info.CAPTION_EXTS)。
+
+normalize_cues 再把解析结果整理成句子大小的片段: 去掉自动字幕滚动显示造成的重复行，
+按标点、停顿、最大时长/字数合并短 cue，翻译调用和响应体积都能少好几倍。
+"""
+import codecs
+import html
+import itertools
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+Chunk = Union[bytes, str]
+
+READ_BLOCK = 64 * 1024
+
+# 00:01:02.345 / 01:02.345 / 00:01:02,345 (SRT)
+_CUE_TIME = r'(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{1,3})'
+_CUE_TIMING_RE = re.compile(_CUE_TIME + r'\s*-->\s*' + _CUE_TIME)
+_TAG_RE = re.compile(r'<[^>]*>')
+_SPACE_RE = re.compile(r'\s+')
+# TTML 时间: 时钟格式 (可带帧) 或 带单位的偏移 (1.5s / 1500ms / 120t)
+_TTML_CLOCK_RE = re.compile(r'^(\d+):(\d{2}):(\d{2}(?:\.\d+)?)(?::(\d+(?:\.\d+)?))?$')
+_TTML_OFFSET_RE = re.compile(r'^(\d+(?:\.\d+)?)(h|ms|m|s|f|t)$')
+_SENTENCE_END_RE = re.compile(r'[.!?。！？…]["\')\]」』]*$')
+_WORD_EDGE_RE = re.compile(r'^\W+|\W+$')
+
+
+class CaptionError(Exception):
+    pass
+
+
+def _clean(text: str) -> str:
+    if '&' in text:
+        text = html.unescape(text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def _decoded(chunks: Iterable[Chunk]) -> Iterator[str]:
+    """Decode a byte stream incrementally (a UTF-8 sequence may straddle two chunks)"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    for chunk in chunks:
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _lines(chunks: Iterable[Chunk]) -> Iterator[str]:
+    pending = ''
+    for text in _decoded(chunks):
+        pending += text
+        lines = pending.split('\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _cue_seconds(hours, minutes, seconds, millis) -> float:
+    # 毫秒位数不足三位时按小数处理 (".5" 是 500ms)
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis.ljust(3, '0')) / 1000.0
+
+
+def parse_vtt(chunks: Iterable[Chunk]) -> Iterator[Dict]:
+    """WebVTT and SRT: a timing line followed by text lines until a blank line"""
+    start = end = None
+    text: List[str] = []
+    in_note = False
+
+    for line in _lines(chunks):
+        line = line.strip()
+        if not line:
+            if start is not None and text:
+                cleaned = _clean(' '.join(text))
+                if cleaned:
+                    yield {'start': start, 'end': end, 'text': cleaned}
+            start = None
+            text = []
+            in_note = False
+            continue
+        if in_note:
+            continue
+        if '-->' in line:
+            match = _CUE_TIMING_RE.search(line)
+            if match:
+                groups = match.groups()
+                start, end = _cue_seconds(*groups[:4]), _cue_seconds(*groups[4:])
+                text = []
+            continue
+        if start is None:
+            # 头部、NOTE/STYLE/REGION 块、cue 标识、SRT 序号
+            if line.startswith(('NOTE', 'STYLE', 'REGION')):
+                in_note = True
+            continue
+        text.append(_TAG_RE.sub('', line) if '<' in line else line)
+
+    if start is not None and text:
+        cleaned = _clean(' '.join(text))
+        if cleaned:
+            yield {'start': start, 'end': end, 'text': cleaned}
+
+
+def parse_json3(chunks: Iterable[Chunk]) -> Iterator[Dict]:
+    """YouTube json3: decode the "events" array one event at a time as it arrives"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = -1  # events 数组里下一个元素的位置，-1 表示还没找到数组
+    done = False
+
+    def events() -> Iterator[Dict]:
+        nonlocal buffer, position, done
+        if position < 0:
+            key = buffer.find('"events"')
+            bracket = buffer.find('[', key) if key >= 0 else -1
+            if bracket < 0:
+                return
+            position = bracket + 1
+        while not done:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(buffer):
+                break
+            if buffer[position] == ']':
+                done = True
+                break
+            try:
+                event, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # 这个 event 还没收全
+                break
+            yield event
+        # 丢掉已经解析过的部分
+        buffer = buffer[position:]
+        position = 0
+
+    for text in _decoded(chunks):
+        if done:
+            break
+        buffer += text
+        for event in events():
+            segs = event.get('segs')
+            if not segs or 'tStartMs' not in event:
+                continue
+            cleaned = _clean(''.join(seg.get('utf8', '') for seg in segs))
+            if not cleaned:
+                continue
+            start = event['tStartMs'] / 1000.0
+            yield {'start': start, 'end': start + event.get('dDurationMs', 0) / 1000.0, 'text': cleaned}
+
+    if not done:
+        raise CaptionError("json3 captions ended before the events array was complete")
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _ttml_seconds(value: Optional[str], frame_rate: float, tick_rate: float) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    match = _TTML_CLOCK_RE.match(value)
+    if match:
+        hours, minutes, seconds, frames = match.groups()
+        total = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        return total + (float(frames) / frame_rate if frames else 0.0)
+    match = _TTML_OFFSET_RE.match(value)
+    if match:
+        number, unit = float(match.group(1)), match.group(2)
+        return {
+            'h': number * 3600, 'm': number * 60, 's': number, 'ms': number / 1000.0,
+            'f': number / frame_rate, 't': number / tick_rate,
+        }[unit]
+    return None
+
+
+def _element_text(element) -> str:
+    """Text of an element and its children, with <br/> as a space"""
+    parts = [element.text or '']
+    for child in element:
+        if _local(child.tag) == 'br':
+            parts.append(' ')
+        else:
+            parts.append(_element_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def parse_xml(chunks: Iterable[Chunk]) -> Iterator[Dict]:
+    """srv1 (<text start dur>), srv2/srv3 (<text|p t d> in ms) and TTML (<p begin end|dur>)"""
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    frame_rate, tick_rate = 30.0, 1.0
+    depth = 0
+
+    def cue(element) -> Optional[Dict]:
+        attrs = element.attrib
+        if 't' in attrs:
+            # srv2/srv3: 毫秒
+            start = int(attrs['t']) / 1000.0
+            end = start + int(attrs.get('d', 0)) / 1000.0
+        elif 'start' in attrs:
+            # srv1: 秒
+            start = float(attrs['start'])
+            end = start + float(attrs.get('dur', 0))
+        else:
+            start = _ttml_seconds(attrs.get('begin'), frame_rate, tick_rate)
+            if start is None:
+                return None
+            end = _ttml_seconds(attrs.get('end'), frame_rate, tick_rate)
+            if end is None:
+                end = start + (_ttml_seconds(attrs.get('dur'), frame_rate, tick_rate) or 0.0)
+        text = _clean(_element_text(element))
+        return {'start': start, 'end': end, 'text': text} if text else None
+
+    for text in _decoded(chunks):
+        parser.feed(text)
+        for event, element in parser.read_events():
+            name = _local(element.tag)
+            if event == 'start':
+                if name == 'tt':
+                    for key, value in element.attrib.items():
+                        if _local(key) == 'frameRate':
+                            frame_rate = float(value)
+                        elif _local(key) == 'tickRate':
+                            tick_rate = float(value)
+                if name in ('p', 'text'):
+                    depth += 1
+                continue
+            if name in ('p', 'text'):
+                depth -= 1
+                if depth == 0:
+                    segment = cue(element)
+                    if segment:
+                        yield segment
+                    # 已处理的节点清掉，长字幕也不会在内存里攒出整棵树
+                    element.clear()
+    parser.close()
+
+
+PARSERS = {
+    'json3': parse_json3,
+    'srv1': parse_xml,
+    'srv2': parse_xml,
+    'srv3': parse_xml,
+    'ttml': parse_xml,
+    'xml': parse_xml,
+    'vtt': parse_vtt,
+    'srt': parse_vtt,
+}
+
+
+def sniff_format(head: str) -> str:
+    """Guess the caption format from the first bytes of the document"""
+    head = head.lstrip('\ufeff \t\r\n')
+    if head.startswith('{'):
+        return 'json3'
+    if head.startswith('<'):
+        return 'xml'
+    return 'vtt'
+
+
+def parse_captions(chunks: Iterable[Chunk], fmt: Optional[str] = None) -> Iterator[Dict]:
+    """Yield {start, end, text} cues from caption data in any supported format
+
+    `chunks` may be the whole document as one str/bytes or an iterable of
+    pieces as they arrive; `fmt` is the track's ext and is sniffed when unknown.
+    """
+    if isinstance(chunks, (bytes, str)):
+        chunks = [chunks]
+    parser = PARSERS.get((fmt or '').lower())
+    if parser is None:
+        iterator = iter(chunks)
+        head = []
+        for chunk in iterator:
+            head.append(chunk)
+            if chunk.strip():
+                break
+        first = head[-1] if head else ''
+        parser = PARSERS[sniff_format(first.decode('utf-8', 'replace') if isinstance(first, bytes) else first)]
+        chunks = _chain(head, iterator)
+    return parser(chunks)
+
+
+def _chain(head: List[Chunk], rest: Iterator[Chunk]) -> Iterator[Chunk]:
+    yield from head
+    yield from rest
+
+
+def _word_key(word: str) -> str:
+    return _WORD_EDGE_RE.sub('', word.lower())
+
+
+def _overlap(tail: List[str], keys: List[str]) -> int:
+    """Length of the longest end of `tail` that `keys` starts with"""
+    for size in range(min(len(tail), len(keys)), 0, -1):
+        if tail[-size:] == keys[:size]:
+            return size
+    return 0
+
+
+def dedupe_rolling(cues: Iterable[Dict], window: int = 40) -> Iterator[Dict]:
+    """Drop the words a cue repeats from the previous ones (YouTube auto captions roll each line)
+
+    Each cue keeps only the words after the longest overlap between the end
+    of what was already emitted and its own beginning; pure repeats vanish.
+    """
+    tail: List[str] = []
+    for cue in cues:
+        words = cue['text'].split()
+        keys = [_word_key(w) for w in words]
+        overlap = _overlap(tail, keys)
+        if overlap == len(words):
+            continue
+        tail = (tail + keys[overlap:])[-window:]
+        yield {'start': cue['start'], 'end': cue['end'], 'text': ' '.join(words[overlap:])}
+
+
+def merge_cues(cues: Iterable[Dict], max_duration: Optional[float] = None, max_chars: Optional[int] = None,
+               pause: Optional[float] = None) -> Iterator[Dict]:
+    """Merge short cues into sentence-sized segments
+
+    A segment ends at sentence punctuation, before a silence longer than
+    `pause`, or before it would exceed `max_duration` seconds / `max_chars`.
+    Its end is clipped to the next segment's start so segments never overlap.
+    """
+    max_duration = max_duration or float(os.environ.get('CAPTION_MERGE_MAX_SECONDS', 12))
+    max_chars = max_chars or int(os.environ.get('CAPTION_MERGE_MAX_CHARS', 200))
+    pause = pause if pause is not None else float(os.environ.get('CAPTION_MERGE_PAUSE', 1.0))
+
+    current: Optional[Dict] = None
+    ready: Optional[Dict] = None  # 已结束的片段，等下一个 cue 到了再裁剪结束时间
+    for cue in cues:
+        text = cue['text']
+        if current is not None and (
+            cue['start'] - current['end'] > pause
+            or max(cue['end'], current['end']) - current['start'] > max_duration
+            or current['chars'] + 1 + len(text) > max_chars
+        ):
+            ready, current = current, None
+        if ready is not None:
+            yield _closed(ready, cue['start'])
+            ready = None
+        if current is None:
+            current = {'start': cue['start'], 'end': cue['end'], 'parts': [], 'chars': -1}
+        current['end'] = max(current['end'], cue['end'])
+        current['parts'].append(text)
+        current['chars'] += 1 + len(text)
+        if _SENTENCE_END_RE.search(text):
+            ready, current = current, None
+    if current is not None:
+        ready = current
+    if ready is not None:
+        yield _closed(ready, None)
+
+
+def _closed(segment: Dict, next_start: Optional[float]) -> Dict:
+    end = segment['end']
+    if next_start is not None and end > next_start:
+        end = max(segment['start'], next_start)
+    return {'start': segment['start'], 'end': end, 'text': ' '.join(segment['parts'])}
+
+
+def looks_rolling(cues: List[Dict]) -> bool:
+    """Guess whether cues roll (each repeats the end of the previous one), e.g. pasted auto captions"""
+    repeats = 0
+    for previous, cue in zip(cues, cues[1:]):
+        # 滚动字幕重复上一条的整行，不只是最后几个词
+        before = [_word_key(w) for w in previous['text'].split()]
+        if _overlap(before, [_word_key(w) for w in cue['text'].split()]) >= 2:
+            repeats += 1
+    return len(cues) > 1 and repeats >= (len(cues) - 1) * 0.3
+
+
+def dedupe_if_rolling(cues: Iterable[Dict], sample: int = 20) -> Iterator[Dict]:
+    """Dedupe only when the first `sample` cues actually roll
+
+    Structured automatic tracks (json3/srv3) never repeat words between cues;
+    deduping them would drop real words that happen to recur at a boundary.
+    """
+    cues = iter(cues)
+    head = list(itertools.islice(cues, sample))
+    chained = itertools.chain(head, cues)
+    return dedupe_rolling(chained) if looks_rolling(head) else chained
+
+
+def normalize_cues(cues: Iterable[Dict], rolling: bool = False) -> Iterator[Dict]:
+    """Parsed cues -> sentence-sized segments
+
+    `rolling` marks tracks that may roll (YouTube automatic captions); they are
+    deduped only if their cues really do.
+    """
+    if rolling:
+        cues = dedupe_if_rolling(cues)
+    return merge_cues(cues)
+
+
+def _joined(parts: List[str]) -> str:
+    """Join translated cue texts; no space between CJK text, a space between words"""
+    text = ''
+    for part in parts:
+        if text and (text[-1].isascii() and part[0].isascii()):
+            text += ' '
+        text += part
+    return text
+
+
+def align_translations(segments: List[Dict], cues: Iterable[Dict], lang: Optional[str] = None) -> int:
+    """Attach translated cues to the segments they overlap, in place; returns how many got one
+
+    Each cue goes to the segment whose span [start, next start) holds the
+    cue's midpoint. Segments no cue lands in keep no translation, so only
+    those need machine translation. With `lang` the text goes into
+    seg['translations'][lang] instead of seg['translation'].
+    """
+    if not segments:
+        return 0
+    parts: List[List[str]] = [[] for _ in segments]
+    index = 0
+    for cue in sorted(cues, key=lambda c: c['start']):
+        middle = (cue['start'] + cue['end']) / 2
+        while index + 1 < len(segments) and segments[index + 1]['start'] <= middle:
+            index += 1
+        if middle > segments[index]['end'] and (index + 1 == len(segments)):
+            # 最后一个片段之后的译文对不上任何原文
+            continue
+        parts[index].append(cue['text'])
+    aligned = 0
+    for seg, texts in zip(segments, parts):
+        if texts:
+            if lang:
+                seg.setdefault('translations', {})[lang] = _joined(texts)
+            else:
+                seg['translation'] = _joined(texts)
+            aligned += 1
+    return aligned
+
+
+def stream_captions(url: str, fmt: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> Iterator[Dict]:
+    """Download and parse a caption track in one pass, yielding cues as the body arrives"""
+    from http_clients import open_media
+
+    with open_media(url, headers=headers) as response:
+        yield from parse_captions(iter(lambda: response.read(READ_BLOCK), b''), fmt)
+
+
+def fetch_translated_cues(track: Dict, rolling: bool = False) -> List[Dict]:
+    """Cues of a translated track, unmerged so they can be aligned to the source segments"""
+    cues = stream_captions(track['url'], track.get('ext'))
+    return list(dedupe_if_rolling(cues) if rolling else cues)
@@ -0,0 +1,200 @@
+"""
+转写结果的流式输出 (SSE / NDJSON)
+
+客户端通过 Accept 头选择格式:
+    text/event-stream      -> Server-Sent Events
+    application/x-ndjson   -> 每行一个 JSON 对象
+其他情况仍返回一次性的 JSON。
+
+事件:
+    progress     {"stage": ...}
+    segment      {"index", "start", "end", "text"}          文本一出来就发送
+    translation  {"index", "translation", "translation_status"}  同一片段的译文随后补发
+                 (多目标语言时另带 "translations": {lang: text})
+    done         {"title", "segment_count"}
+    error        {"message"}
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from executors import acquire_pipeline, pipeline_executor, release_pipeline
+
+MEDIA_TYPES = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson',
+}
+
+Event = Tuple[str, Dict]
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """'sse', 'ndjson', or None for a plain JSON response"""
+    accept = (accept or '').lower()
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept or 'application/ndjson' in accept:
+        return 'ndjson'
+    return None
+
+
+def encode_event(mode: str, event: str, data: Dict) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False)
+    if mode == 'sse':
+        return f"event: {event}\ndata: {payload}\n\n".encode('utf-8')
+    return (json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+def translation_event(index: int, seg: Dict) -> Dict:
+    data = {
+        "index": index,
+        "translation": seg.get('translation', ''),
+        "translation_status": seg.get('translation_status', 'ok'),
+    }
+    if seg.get('translations'):
+        data['translations'] = seg['translations']
+    return data
+
+
+def transcript_events(segments: Iterable[Dict], translator, group_size: Optional[int] = None) -> Iterator[Event]:
+    """Emit each segment as soon as it is produced and its translation once its group is done
+
+    Segments are translated in groups of `group_size` so the translator still
+    gets reasonably sized batches without holding back the source text.
+    """
+    group_size = group_size or int(os.environ.get('STREAM_TRANSLATE_GROUP', 10))
+    pending: List[Dict] = []
+
+    def flush() -> Iterator[Event]:
+        translated = translator.translate_segments(pending)
+        for seg, result in zip(pending, translated):
+            yield 'translation', translation_event(seg['index'], result)
+        pending.clear()
+
+    index = 0
+    for seg in segments:
+        data = {"index": index, "start": seg['start'], "end": seg['end'], "text": seg['text'].strip()}
+        index += 1
+        yield 'segment', data
+        # 已带译文的片段 (YouTube 翻译字幕) 在 translate_segments 里直接透传
+        carried = {key: seg[key] for key in ('translation', 'translations') if seg.get(key)}
+        pending.append(dict(data, **carried))
+        if len(pending) >= group_size:
+            yield from flush()
+    if pending:
+        yield from flush()
+
+
+def done_event(title: str, segment_count: int) -> Event:
+    """Final event; live runs and cache replays must send the same payload"""
+    return 'done', {"title": title, "segment_count": segment_count}
+
+
+def cached_events(result: Dict) -> Iterator[Event]:
+    """Replay a cached transcript as the same event sequence, ending with done"""
+    segments = result.get('segments', [])
+    for index, seg in enumerate(segments):
+        yield 'segment', {"index": index, "start": seg['start'], "end": seg['end'], "text": seg['text']}
+        yield 'translation', translation_event(index, seg)
+    yield done_event(result.get('title', 'Unknown'), len(segments))
+
+
+class TranscriptCollector:
+    """Rebuilds the regular JSON response from events, for the result cache"""
+
+    def __init__(self):
+        self.segments: List[Dict] = []
+
+    def add(self, event: str, data: Dict):
+        if event == 'segment':
+            self.segments.append({
+                "start": data['start'],
+                "end": data['end'],
+                "text": data['text'],
+                "translation": "",
+                "translation_status": "pending",
+            })
+        elif event == 'translation':
+            seg = self.segments[data['index']]
+            seg['translation'] = data['translation']
+            seg['translation_status'] = data['translation_status']
+            if 'translations' in data:
+                seg['translations'] = data['translations']
+
+    @property
+    def cacheable(self) -> bool:
+        return all(seg['translation_status'] == 'ok' for seg in self.segments)
+
+    def result(self, title: str) -> Dict:
+        return {"title": title, "segments": self.segments}
+
+
+async def iterate_in_thread(make_iterator: Callable[[], Iterable], max_buffer: int = 64) -> AsyncIterator:
+    """Run a blocking pipeline iterator on the pipeline pool and consume it from the event loop
+
+    The consumer waits on an asyncio.Event, so no extra thread is parked per
+    stream. If the consumer stops early (client disconnected) the producer
+    stops at its next item. Raises PipelineBusy when the pipeline pool is full.
+    """
+    loop = asyncio.get_running_loop()
+    items: queue.Queue = queue.Queue(maxsize=max_buffer)
+    available = asyncio.Event()
+    stopped = threading.Event()
+    done = object()
+
+    def notify():
+        try:
+            loop.call_soon_threadsafe(available.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            stopped.set()
+
+    def put(entry) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(entry, timeout=0.5)
+            except queue.Full:
+                continue
+            notify()
+            return True
+        return False
+
+    def worker():
+        try:
+            for item in make_iterator():
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((done, e))
+            return
+        finally:
+            release_pipeline()
+        put((done, None))
+
+    acquire_pipeline()
+    try:
+        producer = loop.run_in_executor(pipeline_executor(), worker)
+    except BaseException:
+        release_pipeline()
+        raise
+    try:
+        while True:
+            try:
+                item, error = items.get_nowait()
+            except queue.Empty:
+                available.clear()
+                if items.empty():
+                    await available.wait()
+                continue
+            if item is done:
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        stopped.set()
+        if producer.done() and not producer.cancelled():
+            producer.exception()
@@ -0,0 +1,134 @@
+"""
+阻塞调用的执行器
+
+FastAPI 的 async 处理函数里直接调用 yt-dlp、OpenAI、翻译接口会卡住整个事件循环，
+连 /health 都无法响应。这些调用统一放到有上限的线程池里 (IO_THREADS)；
+CPU 密集的本地 ASR 仍由 WhisperModelPool 的进程池执行 (WHISPER_WORKERS)，两者分别配置。
+
+下载 + 转写 + 翻译整条流水线一跑就是几分钟，放在单独的 PIPELINE_THREADS 线程池里，
+不占用缓存查询、yt-dlp 探测这些短调用的线程。运行和排队的流水线超过
+PIPELINE_THREADS + PIPELINE_QUEUE 时直接拒绝 (PipelineBusy)，由接口返回 503。
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+T = TypeVar('T')
+
+_io_executor = None
+_io_threads = 0
+_io_in_flight = 0
+_io_executor_lock = threading.Lock()
+_pipeline_executor = None
+_pipeline_threads = 0
+_pipeline_capacity = 0
+_pipelines_in_flight = 0
+_pipelines_lock = threading.Lock()
+# 线程池大小、运行和排队的调用数都在这里记录，不读 ThreadPoolExecutor 的私有属性
+_counts_lock = threading.Lock()
+
+
+class PipelineBusy(Exception):
+    pass
+
+
+def io_executor() -> ThreadPoolExecutor:
+    """Process-wide thread pool for blocking network and disk calls, sized by IO_THREADS"""
+    global _io_executor, _io_threads
+    if _io_executor is None:
+        with _io_executor_lock:
+            if _io_executor is None:
+                _io_threads = int(os.environ.get('IO_THREADS', 32))
+                _io_executor = ThreadPoolExecutor(max_workers=_io_threads, thread_name_prefix='io')
+    return _io_executor
+
+
+async def run_io(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Await a blocking call on the I/O pool without stalling the event loop"""
+    global _io_in_flight
+    loop = asyncio.get_running_loop()
+    executor = io_executor()
+    with _counts_lock:
+        _io_in_flight += 1
+    try:
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+    finally:
+        with _counts_lock:
+            _io_in_flight -= 1
+
+
+def pipeline_executor() -> ThreadPoolExecutor:
+    """Thread pool for long download/transcribe/translate runs, sized by PIPELINE_THREADS"""
+    global _pipeline_executor, _pipeline_threads, _pipeline_capacity
+    if _pipeline_executor is None:
+        with _io_executor_lock:
+            if _pipeline_executor is None:
+                _pipeline_threads = int(os.environ.get('PIPELINE_THREADS', 4))
+                _pipeline_capacity = _pipeline_threads + int(os.environ.get('PIPELINE_QUEUE', 8))
+                _pipeline_executor = ThreadPoolExecutor(max_workers=_pipeline_threads,
+                                                        thread_name_prefix='pipeline')
+    return _pipeline_executor
+
+
+def pipeline_capacity() -> int:
+    """Pipelines that may run or wait at once (PIPELINE_THREADS + PIPELINE_QUEUE)"""
+    pipeline_executor()
+    return _pipeline_capacity
+
+
+def acquire_pipeline():
+    """Reserve a pipeline slot (running or queued); raises PipelineBusy when all are taken"""
+    global _pipelines_in_flight
+    capacity = pipeline_capacity()
+    with _pipelines_lock:
+        if _pipelines_in_flight >= capacity:
+            raise PipelineBusy(f"{_pipelines_in_flight} transcriptions already running or queued")
+        _pipelines_in_flight += 1
+
+
+def release_pipeline():
+    global _pipelines_in_flight
+    with _pipelines_lock:
+        _pipelines_in_flight -= 1
+
+
+async def run_pipeline(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Await a long blocking pipeline run on the pipeline pool, or raise PipelineBusy"""
+    acquire_pipeline()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pipeline_executor(), functools.partial(fn, *args, **kwargs))
+    finally:
+        release_pipeline()
+
+
+def pipeline_stats() -> dict:
+    capacity = pipeline_capacity()
+    return {
+        'threads': _pipeline_threads,
+        'in_flight': _pipelines_in_flight,
+        'queued': max(0, _pipelines_in_flight - _pipeline_threads),
+        'capacity': capacity,
+    }
+
+
+def io_stats() -> dict:
+    io_executor()
+    return {
+        'threads': _io_threads,
+        'in_flight': _io_in_flight,
+        'queued': max(0, _io_in_flight - _io_threads),
+    }
+
+
+def shutdown_io():
+    global _io_executor, _pipeline_executor
+    with _io_executor_lock:
+        for executor in (_io_executor, _pipeline_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        _io_executor = None
+        _pipeline_executor = None
@@ -0,0 +1,115 @@
+"""
+共享 HTTP 客户端
+
+长视频会对同一批主机 (api.openai.com、googlevideo、字幕接口) 发起成百上千次请求，
+每次新建客户端都要重新做 TCP/TLS 握手。这里按进程复用连接池:
+    openai_client(api_key)   每个 API 密钥一个 OpenAI 客户端 (LRU，最多 OPENAI_CLIENT_CACHE 个)，
+                             装了 h2 时走 HTTP/2
+    http_session()           媒体和字幕下载共用的 requests.Session (yt-dlp 的依赖，各环境都有)
+连接池大小和超时由 HTTP_* / OPENAI_* 配置。
+"""
+import hashlib
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec('h2') is not None
+
+
+def pool_size() -> int:
+    return int(os.environ.get('HTTP_POOL_SIZE', 20))
+
+
+def default_timeout() -> float:
+    return float(os.environ.get('HTTP_TIMEOUT', 30))
+
+
+def connect_timeout() -> float:
+    return float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10))
+
+
+_session = None
+_openai_clients: 'OrderedDict[str, object]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def http_session() -> requests.Session:
+    """Process-wide keep-alive session for media and subtitle downloads"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size(), pool_maxsize=pool_size())
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def openai_client(api_key: str):
+    """OpenAI client for `api_key`, reused across requests together with its connection pool"""
+    import httpx
+    from openai import OpenAI
+
+    key = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+    with _lock:
+        client = _openai_clients.get(key)
+        if client is not None:
+            _openai_clients.move_to_end(key)
+            return client
+        client = OpenAI(
+            api_key=api_key,
+            http_client=httpx.Client(
+                http2=http2_available(),
+                limits=httpx.Limits(max_connections=pool_size(), max_keepalive_connections=pool_size()),
+                timeout=httpx.Timeout(float(os.environ.get('OPENAI_TIMEOUT', 600)), connect=connect_timeout()),
+            ),
+            max_retries=int(os.environ.get('OPENAI_MAX_RETRIES', 2)),
+        )
+        _openai_clients[key] = client
+        # 淘汰的客户端不主动关闭，可能还有请求在用，由垃圾回收释放连接
+        while len(_openai_clients) > int(os.environ.get('OPENAI_CLIENT_CACHE', 16)):
+            _openai_clients.popitem(last=False)
+        return client
+
+
+class MediaStream:
+    """File-like view (read/close) of a streaming response, for copyfileobj and ffmpeg feeding"""
+
+    def __init__(self, response: requests.Response):
+        self._response = response
+        # 连接回到池里之前按需解压 (媒体流一般本来就没压缩)
+        response.raw.decode_content = True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._response.raw.read(None if size is None or size < 0 else size)
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self) -> 'MediaStream':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_media(url: str, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> MediaStream:
+    """Start a pooled GET and return its body as a stream; raises on HTTP errors"""
+    response = http_session().get(url, headers=headers, stream=True,
+                                  timeout=(connect_timeout(), timeout or default_timeout()))
+    try:
+        response.raise_for_status()
+    except requests.HTTPError:
+        response.close()
+        raise
+    return MediaStream(response)
+
@@ -0,0 +1,177 @@
+"""
+视频信息缓存
+
+按 YouTube 视频ID 缓存 VideoInfo：进程内 LRU 一层，可选 SQLite 磁盘一层。
+标题/时长/字幕列表这类静态字段和带签名、很快过期的音频URL分别设置TTL。
+磁盘层在启动和写入时删除过期行，超过 disk_max_entries 时先删最早过期的。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from video_info import VideoInfo
+
+# 签名URL过期前预留的安全时间（秒）
+URL_EXPIRY_MARGIN = 60
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """Read the `expire=` timestamp YouTube puts on signed media and caption URLs"""
+    try:
+        values = parse_qs(urlparse(url).query).get('expire')
+        return float(values[0]) if values else None
+    except (TypeError, ValueError):
+        return None
+
+
+class VideoInfoCache:
+    def __init__(self, max_entries: int = 256, static_ttl: float = 6 * 3600,
+                 media_ttl: float = 1800, db_path: Optional[str] = None, disk_max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.static_ttl = static_ttl
+        self.media_ttl = media_ttl
+        self.db_path = db_path
+
+        self._memory = OrderedDict()  # video_id -> (data, static_expires, media_expires)
+        self._lock = threading.Lock()
+        self._db = None
+        self._stats = {'hits': 0, 'misses': 0, 'media_misses': 0, 'disk_hits': 0, 'evictions': 0,
+                       'disk_evictions': 0}
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS video_info ('
+                'video_id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                'static_expires REAL NOT NULL, media_expires REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS video_info_expires ON video_info (static_expires)')
+            self._prune_disk(time.time())
+            self._db.commit()
+
+    def _prune_disk(self, now: float):
+        """Drop expired rows, then the soonest-to-expire ones beyond disk_max_entries"""
+        removed = self._db.execute('DELETE FROM video_info WHERE static_expires <= ?', (now,)).rowcount
+        count = self._db.execute('SELECT COUNT(*) FROM video_info').fetchone()[0]
+        if count > self.disk_max_entries:
+            # 一次多删一些，避免每次写入都触发
+            excess = count - int(self.disk_max_entries * 0.9)
+            removed += self._db.execute(
+                'DELETE FROM video_info WHERE rowid IN '
+                '(SELECT rowid FROM video_info ORDER BY static_expires LIMIT ?)',
+                (excess,),
+            ).rowcount
+        self._stats['disk_evictions'] += max(0, removed)
+
+    def _expiries(self, info: VideoInfo, now: float):
+        static_expires = now + self.static_ttl
+        # 字幕URL同样带签名，静态部分的有效期不能超过它
+        for table in (info.subtitles, info.automatic_captions):
+            for tracks in table.values():
+                for track in tracks:
+                    expire = url_expiry(track.get('url') or '')
+                    if expire:
+                        static_expires = min(static_expires, expire - URL_EXPIRY_MARGIN)
+
+        media_expires = now + self.media_ttl
+        for fmt in info.audio_formats:
+            expire = url_expiry(fmt.url)
+            if expire:
+                media_expires = min(media_expires, expire - URL_EXPIRY_MARGIN)
+        if not info.audio_formats:
+            media_expires = now
+        return static_expires, media_expires
+
+    def put(self, info: VideoInfo):
+        if not info.video_id:
+            return
+        now = time.time()
+        data = info.to_dict()
+        static_expires, media_expires = self._expiries(info, now)
+
+        with self._lock:
+            self._memory[info.video_id] = (data, static_expires, media_expires)
+            self._memory.move_to_end(info.video_id)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats['evictions'] += 1
+
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO video_info VALUES (?, ?, ?, ?)',
+                    (info.video_id, json.dumps(data, ensure_ascii=False), static_expires, media_expires),
+                )
+                self._prune_disk(now)
+                self._db.commit()
+
+    def get(self, video_id: str, need_media: bool = False) -> Optional[VideoInfo]:
+        """Return cached info, or None on a miss
+
+        Expired media URLs are stripped from the returned object; with
+        need_media=True that counts as a miss so the caller re-probes.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(video_id)
+            if entry is not None:
+                self._memory.move_to_end(video_id)
+            elif self._db is not None:
+                row = self._db.execute(
+                    'SELECT data, static_expires, media_expires FROM video_info WHERE video_id = ?',
+                    (video_id,),
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    entry = (json.loads(row[0]), row[1], row[2])
+                    self._memory[video_id] = entry
+                    self._stats['disk_hits'] += 1
+
+            if entry is None or entry[1] <= now:
+                self._memory.pop(video_id, None)
+                self._stats['misses'] += 1
+                return None
+
+            data, _, media_expires = entry
+            media_fresh = media_expires > now
+            if need_media and not media_fresh:
+                self._stats['media_misses'] += 1
+                return None
+            self._stats['hits'] += 1
+
+        info = VideoInfo.from_dict(data)
+        if not media_fresh:
+            info.audio_formats = []
+        return info
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._memory)
+        lookups = stats['hits'] + stats['misses'] + stats['media_misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_info_cache = None
+_info_cache_lock = threading.Lock()
+
+
+def get_info_cache() -> VideoInfoCache:
+    """Process-wide cache configured from INFO_CACHE_* environment variables"""
+    global _info_cache
+    if _info_cache is None:
+        with _info_cache_lock:
+            if _info_cache is None:
+                _info_cache = VideoInfoCache(
+                    max_entries=int(os.environ.get('INFO_CACHE_SIZE', 256)),
+                    static_ttl=float(os.environ.get('INFO_CACHE_TTL', 6 * 3600)),
+                    media_ttl=float(os.environ.get('INFO_CACHE_MEDIA_TTL', 1800)),
+                    db_path=os.environ.get('INFO_CACHE_DB') or None,
+                    disk_max_entries=int(os.environ.get('INFO_CACHE_DB_SIZE', 10000)),
+                )
+    return _info_cache
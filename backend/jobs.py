@@ -0,0 +1,462 @@
+"""
+异步转写作业
+
+POST /jobs 只负责入队并立即返回作业ID，转写由后台 worker 线程完成:
+    POST   /jobs                {"url", "priority"?}  -> {"id", "status"}
+    GET    /jobs/{id}           状态、阶段、进度
+    GET    /jobs/{id}/result    完成后的 {title, segments}
+    DELETE /jobs/{id}           取消排队中或运行中的作业
+
+队列持久化在 SQLite 里 (JOBS_DB)，按优先级、提交时间领取。同一视频已有排队中
+或运行中的作业时，重复提交直接返回该作业。
+多个 uvicorn worker 或副本共用同一个库：每个进程领取作业时记下自己的 owner，
+并定期刷新所持作业的心跳；只有心跳超过 JOB_HEARTBEAT_TIMEOUT 没更新的运行中作业
+(进程崩溃或重启) 才会被重新入队，超过 JOB_MAX_ATTEMPTS 次后标记失败。
+worker 线程不自己加载模型，转写交给应用传入的函数 (本地模型进程池或 OpenAI 接口)，
+JOB_WORKERS 只决定同时运行几个作业。
+"""
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+class JobStore:
+    """SQLite-backed job queue shared by the API processes and their job workers"""
+
+    def __init__(self, db_path: str, max_attempts: int = 3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, status TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0, '
+            'request TEXT NOT NULL, cache_key TEXT, stage TEXT, progress REAL NOT NULL DEFAULT 0, '
+            'attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, '
+            'error TEXT, result TEXT, created REAL NOT NULL, started REAL, finished REAL, updated REAL NOT NULL)'
+        )
+        # 旧库没有 owner / heartbeat 列；心跳为空的运行中作业视为已过期
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(jobs)')}
+        for column, kind in (('owner', 'TEXT'), ('heartbeat', 'REAL')):
+            if column not in columns:
+                self._db.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_cache_key ON jobs (cache_key, status)')
+
+    def _row(self, row) -> Optional[Dict]:
+        if row is None:
+            return None
+        columns = ('id', 'status', 'priority', 'request', 'cache_key', 'stage', 'progress', 'attempts',
+                   'worker', 'cancel_requested', 'error', 'result', 'created', 'started', 'finished', 'updated')
+        job = dict(zip(columns, row))
+        job['request'] = json.loads(job['request'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def _select(self, where: str, params=()) -> Optional[Dict]:
+        return self._row(self._db.execute(
+            'SELECT id, status, priority, request, cache_key, stage, progress, attempts, worker, '
+            'cancel_requested, error, result, created, started, finished, updated FROM jobs ' + where,
+            params,
+        ).fetchone())
+
+    def submit(self, request: Dict, priority: int = 0, cache_key: Optional[str] = None,
+               result: Optional[Dict] = None) -> Dict:
+        """Queue a job; with `result` (e.g. a cache hit) it is stored as already done
+
+        A queued or running job with the same cache_key is returned instead of
+        adding a duplicate (its priority is raised if the new one is higher).
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        status = 'done' if result is not None else 'queued'
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                active = None
+                if result is None and cache_key:
+                    active = self._db.execute(
+                        "SELECT id FROM jobs WHERE cache_key = ? AND status IN ('queued', 'running') "
+                        "ORDER BY created LIMIT 1",
+                        (cache_key,),
+                    ).fetchone()
+                if active:
+                    job_id = active[0]
+                    self._db.execute(
+                        'UPDATE jobs SET priority = MAX(priority, ?), updated = ? WHERE id = ?',
+                        (priority, now, job_id),
+                    )
+                else:
+                    self._db.execute(
+                        'INSERT INTO jobs (id, status, priority, request, cache_key, stage, progress, result, '
+                        'created, finished, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (job_id, status, priority, json.dumps(request), cache_key, status,
+                         1.0 if result is not None else 0.0,
+                         json.dumps(result, ensure_ascii=False) if result is not None else None,
+                         now, now if result is not None else None, now),
+                    )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._select('WHERE id = ?', (job_id,))
+
+    def claim(self, worker: str, owner: Optional[str] = None) -> Optional[Dict]:
+        """Atomically take the highest-priority, oldest queued job for `owner`'s `worker`"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                job = self._select("WHERE status = 'queued' ORDER BY priority DESC, created LIMIT 1")
+                if job is not None:
+                    now = time.time()
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, owner = ?, heartbeat = ?, "
+                        "attempts = attempts + 1, stage = 'starting', started = ?, updated = ? WHERE id = ?",
+                        (worker, owner, now, now, now, job['id']),
+                    )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return job
+
+    def heartbeat(self, owner: str) -> int:
+        """Mark every job `owner` is running as still alive"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND owner = ?",
+                (time.time(), owner),
+            )
+            return cursor.rowcount
+
+    def update_progress(self, job_id: str, stage: str, progress: float, worker: str, owner: Optional[str]):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, updated = ? "
+                "WHERE id = ? AND status = 'running' AND worker IS ? AND owner IS ?",
+                (stage, progress, time.time(), job_id, worker, owner),
+            )
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def finish(self, job_id: str, status: str, worker: str, owner: Optional[str],
+               result: Optional[Dict] = None, error: Optional[str] = None) -> bool:
+        """Record the outcome of a run; False if the job is no longer running on this worker
+
+        That happens when requeue_expired gave up on this worker after a missed
+        heartbeat (the job was requeued, cancelled or failed, and may already be
+        running elsewhere); that newer state is left alone.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE jobs SET status = ?, stage = ?, progress = MAX(progress, ?), result = ?, error = ?, '
+                "finished = ?, updated = ? WHERE id = ? AND status = 'running' AND worker IS ? AND owner IS ?",
+                (status, status, 1.0 if status == 'done' else 0.0,
+                 json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, now, now, job_id, worker, owner),
+            )
+            return cursor.rowcount > 0
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued job immediately; ask a running job's worker to stop"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', stage = 'cancelled', finished = ?, updated = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, now, job_id),
+            )
+            self._db.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated = ? WHERE id = ? AND status = 'running'",
+                (now, job_id),
+            )
+        return self.get(job_id)
+
+    def requeue_expired(self, timeout: float) -> int:
+        """Crash recovery: put running jobs whose heartbeat is older than `timeout` back in the queue"""
+        now = time.time()
+        where = "status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)"
+        deadline = now - timeout
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.execute(
+                    f"UPDATE jobs SET status = 'cancelled', stage = 'cancelled', finished = ?, updated = ? "
+                    f"WHERE {where} AND cancel_requested = 1",
+                    (now, now, deadline),
+                )
+                self._db.execute(
+                    f"UPDATE jobs SET status = 'failed', stage = 'failed', error = 'worker crashed too many times', "
+                    f"finished = ?, updated = ? WHERE {where} AND attempts >= ?",
+                    (now, now, deadline, self.max_attempts),
+                )
+                cursor = self._db.execute(
+                    f"UPDATE jobs SET status = 'queued', stage = 'queued', worker = NULL, owner = NULL, "
+                    f"heartbeat = NULL, progress = 0, updated = ? WHERE {where}",
+                    (now, deadline),
+                )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            return cursor.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        stats = {status: 0 for status in STATUSES}
+        stats.update(dict(rows))
+        return stats
+
+
+Transcriber = Callable[[str, Optional[str]], List[Dict]]
+
+
+def _run_job(store: JobStore, job: Dict, worker: str, owner: str, transcribe: Transcriber,
+             translator_backend: str):
+    from pipeline import Cancelled, run_transcription
+    from result_cache import get_result_cache
+    from translation import MultiTranslator, asr_language
+
+    job_id = job['id']
+    print(f"Job {job_id} started on {worker}: {job['request'].get('url')}")
+    last_update = [0.0]
+    # 语言在提交时已经校验过；旧作业没有这两个字段
+    source = job['request'].get('source_language', 'en')
+    language = asr_language(source)
+    translator = MultiTranslator.for_targets(translator_backend, source,
+                                             job['request'].get('target_languages', ['zh-cn']))
+
+    def on_progress(stage, fraction):
+        # 限制写库频率
+        if time.time() - last_update[0] >= 1.0 or fraction == 0.0:
+            last_update[0] = time.time()
+            store.update_progress(job_id, stage, fraction, worker, owner)
+
+    result, error = None, None
+    try:
+        result, cacheable = run_transcription(
+            job['request']['url'], lambda path: transcribe(path, language), translator,
+            on_progress=on_progress,
+            should_cancel=lambda: store.cancel_requested(job_id),
+            max_workers=1,
+        )
+        if cacheable and job['cache_key']:
+            get_result_cache().put(job['cache_key'], result)
+        status = 'done'
+    except Cancelled:
+        status = 'cancelled'
+    except Exception as e:
+        status, error = 'failed', str(e)
+
+    # 作业在这期间被重新排队 (心跳过期) 或取消时，不覆盖别人的状态
+    if not store.finish(job_id, status, worker, owner, result=result, error=error):
+        print(f"Job {job_id} {status} on {worker}, but it is no longer ours; outcome dropped")
+    elif status == 'done':
+        print(f"Job {job_id} done ({len(result['segments'])} segments)")
+    else:
+        print(f"Job {job_id} {status}" + (f": {error}" if error else ""))
+
+
+class JobWorkers:
+    """Threads in the API process that claim queued jobs and run them one at a time each
+
+    Transcription goes through the `transcribe(path, language)` the app passes
+    to start(): the local backend's shared WhisperModelPool or the OpenAI API,
+    so jobs never load a model of their own. A heartbeat thread keeps this
+    process's running jobs alive in the store and requeues jobs whose owner
+    stopped heartbeating for `heartbeat_timeout` seconds.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 1, poll_interval: float = 1.0,
+                 translator_backend: str = 'googletrans', heartbeat_timeout: float = 60.0):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.translator_backend = translator_backend
+        self.heartbeat_timeout = heartbeat_timeout
+        # 每个进程一个 owner，区分同一个库上的多个 uvicorn worker 和副本
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+
+    @classmethod
+    def from_env(cls, translator_backend: str = 'googletrans') -> 'JobWorkers':
+        return cls(
+            store=get_job_store(),
+            workers=int(os.environ.get('JOB_WORKERS', 1)),
+            poll_interval=float(os.environ.get('JOB_POLL_INTERVAL', 1.0)),
+            translator_backend=translator_backend,
+            heartbeat_timeout=float(os.environ.get('JOB_HEARTBEAT_TIMEOUT', 60.0)),
+        )
+
+    def _loop(self, name: str, transcribe: Transcriber):
+        print(f"Job worker {name} ready")
+        while not self._stopping.is_set():
+            try:
+                job = self.store.claim(name, self.owner)
+            except Exception as e:
+                print(f"Job worker {name} could not claim a job: {e}")
+                job = None
+            if job is None:
+                self._stopping.wait(self.poll_interval)
+                continue
+            _run_job(self.store, job, name, self.owner, transcribe, self.translator_backend)
+
+    def _requeue_expired(self):
+        recovered = self.store.requeue_expired(self.heartbeat_timeout)
+        if recovered:
+            print(f"Requeued {recovered} jobs whose worker stopped heartbeating")
+
+    def _heartbeat_loop(self):
+        # 超时时间内至少刷新几次，偶尔一次写库变慢也不会被别的进程误判为崩溃
+        interval = max(self.heartbeat_timeout / 4, 0.1)
+        while not self._stopping.wait(interval):
+            try:
+                self.store.heartbeat(self.owner)
+                self._requeue_expired()
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
+
+    def start(self, transcribe: Transcriber):
+        if self.workers <= 0 or self._threads:
+            return
+        # 崩溃进程留下的作业重新排队；别的进程还在跑的作业心跳未过期，不会动
+        self._requeue_expired()
+        self._stopping.clear()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._loop, args=(f"job-worker-{index}", transcribe),
+                                      name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stopping.is_set()
+
+    def shutdown(self):
+        # 运行中的作业停止心跳，超时后由其他进程或下次启动重新排队
+        self._stopping.set()
+        self._threads.clear()
+
+    def stats(self) -> Dict:
+        stats = self.store.stats()
+        stats['workers'] = sum(thread.is_alive() for thread in self._threads if thread.name != 'job-heartbeat')
+        return stats
+
+
+def public_job(job: Dict) -> Dict:
+    return {
+        "id": job['id'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "progress": round(job['progress'] or 0.0, 3),
+        "priority": job['priority'],
+        "attempts": job['attempts'],
+        "error": job['error'],
+        "created": job['created'],
+        "started": job['started'],
+        "finished": job['finished'],
+    }
+
+
+def create_job_router(workers: JobWorkers, cache_key_for: Callable[[str, str, List[str]], str]):
+    """FastAPI routes for the job API
+
+    cache_key_for(url, source, targets) must match the engine the workers use.
+    New jobs are refused with 503 while `workers` is not running (e.g. no API key,
+    JOB_WORKERS=0), instead of queueing jobs nothing will pick up.
+    """
+    from fastapi import APIRouter, HTTPException
+    from pydantic import BaseModel
+
+    from result_cache import get_result_cache
+    from translation import source_language, target_languages
+
+    class JobRequest(BaseModel):
+        url: str
+        priority: int = 0
+        source_language: Optional[str] = None
+        target_languages: Optional[List[str]] = None
+
+    store = workers.store
+    router = APIRouter(prefix='/jobs', tags=['jobs'])
+
+    @router.post('', status_code=202)
+    def submit_job(request: JobRequest):
+        if not workers.running:
+            raise HTTPException(status_code=503, detail="No job workers are running on this server")
+        try:
+            source = source_language(request.source_language)
+            targets = target_languages(request.target_languages)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        cache_key = cache_key_for(request.url, source, targets)
+        # 已有缓存结果的直接作为完成的作业返回
+        cached = get_result_cache().get(cache_key)
+        job = store.submit({"url": request.url, "source_language": source, "target_languages": targets},
+                           priority=request.priority, cache_key=cache_key, result=cached)
+        return public_job(job)
+
+    @router.get('/{job_id}')
+    def job_status(job_id: str):
+        job = store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return public_job(job)
+
+    @router.get('/{job_id}/result')
+    def job_result(job_id: str):
+        job = store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job['status'] != 'done':
+            raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+        return job['result']
+
+    @router.delete('/{job_id}')
+    def cancel_job(job_id: str):
+        job = store.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return public_job(job)
+
+    return router
+
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Process-wide job store configured from JOBS_DB / JOB_MAX_ATTEMPTS"""
+    global _job_store
+    if _job_store is None:
+        with _job_store_lock:
+            if _job_store is None:
+                _job_store = JobStore(
+                    db_path=os.environ.get('JOBS_DB') or os.path.join(tempfile.gettempdir(), 'jobs.db'),
+                    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', 3)),
+                )
+    return _job_store
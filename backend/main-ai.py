@@ -1,13 +1,25 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import hashlib
+from typing import List, Optional
 import yt_dlp
-import tempfile
 import os
-from openai import OpenAI
-from googletrans import Translator
 import uvicorn
 
+from video_info import get_video_info
+from translation import MultiTranslator, asr_language, source_language, target_languages
+from translators import backend_from_env
+from workdir import find_download, job_workdir
+from whisper_api import SUPPORTED_FORMATS, transcribe_any
+from vad import transcribe_with_vad
+from audio_io import download_postprocessors, ensure_api_format
+from jobs import JobWorkers, create_job_router
+from result_cache import TranscriptCache, source_key_for_url
+from singleflight import SingleFlight
+from executors import PipelineBusy, io_stats, pipeline_stats, run_pipeline, shutdown_io
+from http_clients import openai_client
+
 app = FastAPI(title="YouTube Transcriber API with AI")
 
 # CORS设置
@@ -19,9 +31,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+TRANSLATOR = backend_from_env('googletrans')
+
+def url_cache_key(url: str, source: str, targets: List[str]) -> str:
+    return TranscriptCache.make_key(source_key_for_url(url), 'openai-whisper-1', source, ','.join(targets),
+                                    TRANSLATOR)
+
+def flight_key(url: str, api_key: str, source: str, targets: List[str]) -> str:
+    # 使用服务端密钥的请求可以合并；自带密钥的只和同一密钥合并，避免别人的无效密钥连累
+    key = url_cache_key(url, source, targets)
+    if api_key == os.environ.get('OPENAI_API_KEY', ''):
+        return key
+    return f"{key}:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+
+flights = SingleFlight()
+
+# 异步作业使用服务端的 OPENAI_API_KEY；没有配置时不启动 worker，/jobs 返回 503
+job_workers = JobWorkers.from_env(TRANSLATOR)
+app.include_router(create_job_router(job_workers, url_cache_key))
+
+@app.on_event("startup")
+def start_job_workers():
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if api_key:
+        client = openai_client(api_key)
+        job_workers.start(lambda path, language: transcribe_any(client, path, language=language))
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_workers.shutdown()
+    shutdown_io()
+
 class TranscribeRequest(BaseModel):
     url: str
     api_key: str = ""
+    # 一次转写翻成多种语言；source_language 为 "auto" 时由 Whisper 识别
+    source_language: Optional[str] = None
+    target_languages: Optional[List[str]] = None
 
 @app.get("/")
 async def root():
@@ -29,7 +75,9 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "YouTube Transcriber with AI"}
+    return {"status": "healthy", "service": "YouTube Transcriber with AI", "jobs": job_workers.stats(),
+            "in_flight": flights.stats(), "io_pool": io_stats(),
+            "pipeline_pool": pipeline_stats()}
 
 @app.post("/transcribe")
 async def transcribe_video(request: TranscribeRequest):
@@ -55,138 +103,91 @@ async def transcribe_video(request: TranscribeRequest):
                 ]
             }
         
-        # 1. 获取视频信息
-        print(f"正在获取视频信息: {request.url}")
-        ydl_opts = {'quiet': True, 'no_warnings': True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(request.url, download=False)
-            title = info.get('title', 'Unknown Video')
-            duration = info.get('duration', 0)
-        
-        print(f"视频标题: {title}")
-        print(f"视频时长: {duration}秒 ({duration//60}分{duration%60}秒)")
-        
-        # 2. 下载音频
-        print("正在下载音频...")
-        temp_dir = tempfile.mkdtemp()
-        audio_path = os.path.join(temp_dir, 'audio.mp3')
+        try:
+            source = source_language(request.source_language)
+            targets = target_languages(request.target_languages)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # 同一视频、同样语言同时到达的请求共用一次下载/转写/翻译；
+        # 几分钟长的流水线在单独的线程池里跑，不挤占 run_io 的短调用
+        return await flights.do(
+            flight_key(request.url, api_key, source, targets),
+            lambda: run_pipeline(transcribe_url, request.url, api_key, source, targets),
+        )
         
+    except PipelineBusy as e:
+        raise HTTPException(status_code=503, detail=f"Server busy, please retry later: {e}",
+                            headers={"Retry-After": "30"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"错误: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def transcribe_url(url: str, api_key: str, source: str, targets: List[str]):
+    """下载、转写一次，再同时翻译成所有目标语言 (阻塞，由 run_pipeline 放在流水线线程池里执行)"""
+    # 1. 获取视频信息
+    print(f"正在获取视频信息: {url}")
+    video_info = get_video_info(url)
+    title = video_info.title
+    duration = int(video_info.duration)
+    
+    print(f"视频标题: {title}")
+    print(f"视频时长: {duration}秒 ({duration//60}分{duration%60}秒)")
+    
+    # 2. 下载音频
+    print("正在下载音频...")
+    # 中间文件都放在请求级目录里，无论成功失败都会删除
+    with job_workdir() as temp_dir:
         ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '128',
-            }],
-            'outtmpl': audio_path.replace('.mp3', '.%(ext)s'),
+            # Whisper API 可以直接接收 m4a/webm，默认不转码
+            'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
+            'postprocessors': download_postprocessors(),
+            'outtmpl': os.path.join(temp_dir, 'audio.%(ext)s'),
             'quiet': True,
             'no_warnings': True,
         }
         
+        # 复用探测结果，不再重复 extract_info；缓存命中时没有原始 info，直接下载
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([request.url])
+            if video_info.raw:
+                ydl.process_ie_result(video_info.raw, download=True)
+            else:
+                ydl.download([url])
         
         # 找到下载的文件
-        audio_file = None
-        for file in os.listdir(temp_dir):
-            if file.endswith('.mp3'):
-                audio_file = os.path.join(temp_dir, file)
-                break
-        
-        if not audio_file or not os.path.exists(audio_file):
+        audio_file = find_download(temp_dir)
+        if not audio_file:
             raise HTTPException(status_code=500, detail="音频下载失败")
+        # 极少数格式 (如 3gp) 接口不接受，才转成低码率 opus
+        audio_file = ensure_api_format(audio_file, SUPPORTED_FORMATS)
         
-        file_size_mb = os.path.getsize(audio_file) / (1024 * 1024)
-        print(f"音频文件大小: {file_size_mb:.2f} MB")
+        file_size = os.path.getsize(audio_file)
+        print(f"音频文件大小: {file_size / (1024 * 1024):.2f} MB")
         
         # 3. 使用Whisper转写
         print("正在进行AI转写...")
-        client = OpenAI(api_key=api_key)
-        
-        # 如果文件大于25MB，需要分割处理
-        if file_size_mb > 25:
-            print("文件较大，使用分段处理...")
-            # 这里可以实现音频分割逻辑
-            segments = await transcribe_large_file(audio_file, client)
-        else:
-            with open(audio_file, 'rb') as audio:
-                response = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio,
-                    response_format="verbose_json",
-                    timestamp_granularities=["segment"]
-                )
-            
-            segments = []
-            if hasattr(response, 'segments'):
-                for seg in response.segments:
-                    segments.append({
-                        "start": seg.get('start', 0),
-                        "end": seg.get('end', 0),
-                        "text": seg.get('text', '').strip()
-                    })
-        
-        print(f"转写完成，共{len(segments)}个片段")
-        
-        # 4. 翻译成中文
-        print("正在翻译成中文...")
-        translator = Translator()
-        translated_segments = []
-        
-        for i, seg in enumerate(segments):
-            try:
-                translation = translator.translate(seg['text'], dest='zh-cn')
-                translated_segments.append({
-                    "start": seg['start'],
-                    "end": seg['end'],
-                    "text": seg['text'],
-                    "translation": translation.text
-                })
-                print(f"翻译进度: {i+1}/{len(segments)}")
-            except Exception as e:
-                print(f"翻译错误: {e}")
-                translated_segments.append({
-                    "start": seg['start'],
-                    "end": seg['end'],
-                    "text": seg['text'],
-                    "translation": seg['text']
-                })
-        
-        # 5. 清理临时文件
-        try:
-            os.remove(audio_file)
-            os.rmdir(temp_dir)
-        except:
-            pass
-        
-        print("处理完成！")
-        
-        return {
-            "title": title,
-            "duration": duration,
-            "segments": translated_segments
-        }
+        client = openai_client(api_key)
+        language = asr_language(source)
         
-    except Exception as e:
-        print(f"错误: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-async def transcribe_large_file(audio_file, client):
-    """处理大文件的辅助函数"""
-    # 这里可以实现音频分割和批处理逻辑
-    # 暂时返回简单结果
-    with open(audio_file, 'rb') as audio:
-        response = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio,
-            response_format="text"
-        )
+        # 先做VAD，只转写语音部分；大于25MB的按静音点切分后并发转写
+        segments = transcribe_with_vad(audio_file, lambda path: transcribe_any(client, path, language=language))
+    
+    print(f"转写完成，共{len(segments)}个片段")
+    
+    # 4. 翻译成各目标语言
+    print(f"正在翻译成 {', '.join(targets)}...")
+    translator = MultiTranslator.for_targets(TRANSLATOR, source, targets)
+    translated_segments = translator.translate_segments(segments)
+    
+    print("处理完成！")
     
-    return [{
-        "start": 0,
-        "end": 60,
-        "text": response
-    }]
+    return {
+        "title": title,
+        "duration": duration,
+        "segments": translated_segments
+    }
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
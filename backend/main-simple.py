@@ -6,6 +6,8 @@ import os
 import tempfile
 from typing import List, Dict
 
+from executors import run_io
+
 app = FastAPI()
 
 app.add_middleware(
@@ -64,7 +66,8 @@ async def transcribe_video(request: VideoRequest):
         print(f"Processing URL: {request.url}")
         
         # 获取视频标题
-        title = download_video_info(request.url)
+        # yt-dlp 是阻塞调用，放到线程池里，不卡住事件循环
+        title = await run_io(download_video_info, request.url)
         
         # 返回模拟的转写结果（用于测试部署）
         demo_segments = [
@@ -1,13 +1,24 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import yt_dlp
-import whisper
-from googletrans import Translator
+import asyncio
 import os
-import tempfile
 import json
-from typing import List, Dict
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from executors import PipelineBusy, io_stats, pipeline_stats, run_io, shutdown_io
+from event_stream import MEDIA_TYPES, Event, TranscriptCollector, cached_events, done_event, encode_event, iterate_in_thread, negotiate, transcript_events
+from info_cache import get_info_cache
+from jobs import JobWorkers, create_job_router
+from model_pool import PoolBusy, WhisperModelPool
+from result_cache import get_result_cache, source_key_for_url, TranscriptCache
+from translation import MultiTranslator, asr_language, source_language, target_languages
+from translators import backend_from_env
+from translation_memory import get_translation_memory
+from pipeline import iter_url_segments
+from singleflight import SingleFlight
 
 app = FastAPI()
 
@@ -21,82 +32,115 @@ app.add_middleware(
 
 class VideoRequest(BaseModel):
     url: str
+    # 一次转写翻成多种语言；source_language 为 "auto" 时由 Whisper 识别
+    source_language: Optional[str] = None
+    target_languages: Optional[List[str]] = None
 
 class TranscriptSegment(BaseModel):
     start: float
     end: float
     text: str
     translation: str
+    translation_status: str = "ok"
+    translations: Optional[Dict[str, str]] = None
 
 class TranscriptResponse(BaseModel):
     title: str
     segments: List[TranscriptSegment]
 
-whisper_model = None
-translator = Translator()
+SOURCE_LANGUAGE = 'en'
 
-def get_whisper_model():
-    global whisper_model
-    if whisper_model is None:
-        print("Loading Whisper model...")
-        whisper_model = whisper.load_model("base")
-    return whisper_model
+TRANSLATOR = backend_from_env('googletrans')
 
-def download_audio(url: str) -> tuple[str, str]:
-    with tempfile.TemporaryDirectory() as temp_dir:
-        output_path = os.path.join(temp_dir, 'audio.mp3')
-        
-        ydl_opts = {
-            'format': 'worstaudio/worst',  # Use lower quality to avoid 403
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '128',
-            }],
-            'outtmpl': output_path.replace('.mp3', '.%(ext)s'),
-            'quiet': False,
-            'no_warnings': False,
-            'cookiefile': 'cookies.txt',  # Optional: use cookies if available
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'referer': 'https://www.youtube.com/',
-            'socket_timeout': 30,
-            'retries': 3,
-            'fragment_retries': 3,
-            'extractor_args': {'youtube': {'skip': ['dash', 'hls']}},
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'Unknown')
-            
-            audio_file = output_path
-            if not os.path.exists(audio_file):
-                for file in os.listdir(temp_dir):
-                    if file.endswith('.mp3'):
-                        audio_file = os.path.join(temp_dir, file)
-                        break
-            
-            with open(audio_file, 'rb') as f:
-                audio_data = f.read()
-            
-            new_temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-            new_temp_file.write(audio_data)
-            new_temp_file.close()
-            
-            return new_temp_file.name, title
-
-def transcribe_audio(audio_path: str) -> List[Dict]:
-    model = get_whisper_model()
-    result = model.transcribe(audio_path, language='en')
-    return result['segments']
-
-def translate_text(text: str, target_lang: str = 'zh-cn') -> str:
+whisper_pool = WhisperModelPool.from_env()
+flights = SingleFlight()
+
+def request_languages(request: VideoRequest) -> Tuple[str, List[str]]:
+    try:
+        return (source_language(request.source_language, SOURCE_LANGUAGE),
+                target_languages(request.target_languages))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def url_cache_key(url: str, source: str, targets: List[str]) -> str:
+    return TranscriptCache.make_key(source_key_for_url(url), whisper_pool.model_id, source, ','.join(targets),
+                                   TRANSLATOR)
+
+# 异步作业：worker 线程把转写提交到同一个 whisper_pool，不再单独加载模型
+job_workers = JobWorkers.from_env(TRANSLATOR)
+app.include_router(create_job_router(job_workers, url_cache_key))
+
+@app.on_event("startup")
+def preload_whisper_models():
+    # 启动时预加载，第一个请求不用再等模型加载
+    whisper_pool.start()
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_workers.start(job_transcriber(asyncio.get_running_loop()))
+
+@app.on_event("shutdown")
+def stop_whisper_workers():
+    job_workers.shutdown()
+    whisper_pool.shutdown()
+    shutdown_io()
+
+def pool_transcriber(loop: asyncio.AbstractEventLoop, language: Optional[str]) -> Callable[[str], List[Dict]]:
+    """Blocking transcribe_fn for pipeline threads, backed by the process pool on the event loop"""
+    def transcribe(path):
+        return asyncio.run_coroutine_threadsafe(
+            whisper_pool.transcribe(path, language=language), loop
+        ).result()
+    return transcribe
+
+def job_transcriber(loop: asyncio.AbstractEventLoop) -> Callable[[str, Optional[str]], List[Dict]]:
+    """transcribe(path, language) for job threads; waits for a free pool slot instead of failing the job"""
+    def transcribe(path, language):
+        while True:
+            try:
+                return pool_transcriber(loop, language)(path)
+            except PoolBusy:
+                time.sleep(5)
+    return transcribe
+
+def iter_video_segments(url: str, loop: asyncio.AbstractEventLoop, meta: Dict, source: str) -> Iterator[Dict]:
+    return iter_url_segments(url, pool_transcriber(loop, asr_language(source)), meta,
+                             max_workers=whisper_pool.workers, no_fallback=(PoolBusy,))
+
+async def pipeline_events(url: str, cache_key: str, source: str, targets: List[str]) -> AsyncIterator[Event]:
+    """One pipeline run as events, shared by every concurrent request for the same video and languages
+
+    The video is transcribed once; all target languages are translated side by side.
+    """
+    loop = asyncio.get_running_loop()
+    meta = {"title": "Unknown"}
+    collector = TranscriptCollector()
+    translator = MultiTranslator.for_targets(TRANSLATOR, source, targets)
+    yield 'progress', {"stage": "transcribing"}
+    events = lambda: transcript_events(iter_video_segments(url, loop, meta, source), translator)
+    async for event, data in iterate_in_thread(events):
+        collector.add(event, data)
+        yield event, data
+    if collector.segments and collector.cacheable:
+        await run_io(get_result_cache().put, cache_key, collector.result(meta['title']))
+    yield done_event(meta['title'], len(collector.segments))
+
+def shared_events(url: str, cache_key: str, source: str, targets: List[str]) -> AsyncIterator[Event]:
+    # 同一视频、同样语言同时到达的请求挂到同一次执行上 (cache_key 已包含语言)
+    return flights.stream(cache_key, lambda: pipeline_events(url, cache_key, source, targets))
+
+async def transcript_event_stream(url: str, mode: str, cache_key: str, source: str,
+                                  targets: List[str]) -> AsyncIterator[bytes]:
     try:
-        translation = translator.translate(text, dest=target_lang)
-        return translation.text
+        async for event, data in shared_events(url, cache_key, source, targets):
+            yield encode_event(mode, event, data)
     except Exception as e:
-        print(f"Translation error: {e}")
-        return text
+        print(f"Streaming error: {e}")
+        yield encode_event(mode, 'error', {"message": str(e)})
+
+async def replay_events(cached: Dict, mode: str) -> AsyncIterator[bytes]:
+    for event, data in cached_events(cached):
+        yield encode_event(mode, event, data)
 
 @app.get("/")
 def read_root():
@@ -106,22 +150,59 @@ def read_root():
         "version": "1.0.0",
         "endpoints": {
             "transcribe": "/transcribe",
+            "jobs": "/jobs",
             "health": "/"
         }
     }
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"}
+    return {
+        "status": "healthy",
+        "timestamp": "2024-01-01T00:00:00Z",
+        "info_cache": get_info_cache().stats(),
+        "result_cache": get_result_cache().stats(),
+        "translation_memory": get_translation_memory().stats() if get_translation_memory() else None,
+        "whisper_pool": whisper_pool.stats(),
+        "io_pool": io_stats(),
+        "pipeline_pool": pipeline_stats(),
+        "jobs": job_workers.stats(),
+        "in_flight": flights.stats(),
+    }
 
 @app.post("/transcribe", response_model=TranscriptResponse)
-async def transcribe_video(request: VideoRequest):
+async def transcribe_video(request: VideoRequest, http_request: Request):
     try:
         print(f"Processing URL: {request.url}")
+        # Accept: text/event-stream 或 application/x-ndjson 时逐段推送
+        stream_mode = negotiate(http_request.headers.get('accept'))
+        
+        source, targets = request_languages(request)
+        cache_key = url_cache_key(request.url, source, targets)
+        cached = await run_io(get_result_cache().get, cache_key)
+        if cached:
+            print("Result cache hit")
+            if stream_mode:
+                return StreamingResponse(replay_events(cached, stream_mode), media_type=MEDIA_TYPES[stream_mode])
+            return TranscriptResponse(**cached)
+        
+        if stream_mode:
+            return StreamingResponse(
+                transcript_event_stream(request.url, stream_mode, cache_key, source, targets),
+                media_type=MEDIA_TYPES[stream_mode],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
         
-        # Add timeout and better error handling
+        collector = TranscriptCollector()
+        title = "Unknown"
         try:
-            audio_path, title = download_audio(request.url)
+            async for event, data in shared_events(request.url, cache_key, source, targets):
+                collector.add(event, data)
+                if event == 'done':
+                    title = data['title']
+        except (PoolBusy, PipelineBusy) as e:
+            raise HTTPException(status_code=503, detail=f"Server busy, please retry later: {e}",
+                                headers={"Retry-After": "30"})
         except Exception as e:
             print(f"Download error: {e}")
             if "403" in str(e) or "Forbidden" in str(e):
@@ -131,27 +212,7 @@ async def transcribe_video(request: VideoRequest):
             else:
                 raise HTTPException(status_code=500, detail=f"Failed to download video: {str(e)}")
         
-        try:
-            segments = transcribe_audio(audio_path)
-            
-            formatted_segments = []
-            for segment in segments:
-                translation = translate_text(segment['text'])
-                formatted_segments.append(TranscriptSegment(
-                    start=segment['start'],
-                    end=segment['end'],
-                    text=segment['text'].strip(),
-                    translation=translation
-                ))
-            
-            return TranscriptResponse(
-                title=title,
-                segments=formatted_segments
-            )
-        
-        finally:
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
+        return TranscriptResponse(**collector.result(title))
     
     except HTTPException:
         raise
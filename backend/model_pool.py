@@ -0,0 +1,124 @@
+"""
+本地 Whisper 模型进程池
+
+启动时在每个工作进程里预加载配置的模型（每个进程一份模型，CPU线程数固定），
+推理在进程池中执行，不阻塞 FastAPI 的事件循环。具体用哪个推理后端见 asr_backends.py。
+排队请求数超过上限时直接拒绝（PoolBusy），由接口返回 503。
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from asr_backends import BACKENDS, backend_options_from_env, create_backend, model_id
+
+# 工作进程内的全局状态
+_worker_models = {}
+
+
+def _init_worker(model_sizes: List[str], threads: int, backend_options: Dict):
+    # 必须在加载 torch / ctranslate2 之前设置
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    for size in model_sizes:
+        started = time.time()
+        _worker_models[size] = create_backend(model_size=size, threads=threads, **backend_options)
+        print(f"[worker {os.getpid()}] loaded {_worker_models[size].model_id} "
+              f"in {time.time() - started:.1f}s")
+
+
+def _warmup() -> int:
+    return os.getpid()
+
+
+def _transcribe_in_worker(audio_path: str, model_size: str, language: Optional[str]) -> List[Dict]:
+    return _worker_models[model_size].transcribe(audio_path, language=language)
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class WhisperModelPool:
+    def __init__(self, model_sizes: List[str], workers: int = 1, threads_per_worker: int = 1,
+                 max_queue: int = 8, backend_options: Optional[Dict] = None):
+        self.backend_options = backend_options or {'backend': 'whisper'}
+        if self.backend_options['backend'] not in BACKENDS:
+            raise ValueError(f"Unknown ASR backend: {self.backend_options['backend']}")
+        self.model_sizes = model_sizes
+        self.default_model = model_sizes[0]
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.max_queue = max_queue
+        self._executor = None
+        self._in_flight = 0
+
+    @classmethod
+    def from_env(cls) -> 'WhisperModelPool':
+        """Build from WHISPER_* and ASR_* environment variables"""
+        models = [m.strip() for m in os.environ.get('WHISPER_MODELS', 'base').split(',') if m.strip()]
+        # 默认只加载一份模型，512 MB 的容器放不下两份；多核机器按需调大
+        workers = max(1, int(os.environ.get('WHISPER_WORKERS', 1)))
+        threads = int(os.environ.get('WHISPER_THREADS', 0)) or max(1, (os.cpu_count() or 1) // workers)
+        return cls(models, workers=workers, threads_per_worker=threads,
+                   max_queue=int(os.environ.get('WHISPER_QUEUE', 8)),
+                   backend_options=backend_options_from_env())
+
+    @property
+    def model_id(self) -> str:
+        """Default model with backend and precision, e.g. faster-whisper-base-int8"""
+        return model_id(self.backend_options['backend'], self.default_model,
+                        self.backend_options.get('compute_type', 'int8'), self.backend_options.get('beam_size'))
+
+    def start(self):
+        """Spawn the workers and wait until every one has its models loaded"""
+        if self._executor is not None:
+            return
+        print(f"Starting {self.workers} {self.backend_options['backend']} workers "
+              f"({self.threads_per_worker} threads each, models: {', '.join(self.model_sizes)})")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_sizes, self.threads_per_worker, self.backend_options),
+        )
+        # 每个预热任务都会让一个新进程启动并执行 initializer
+        pids = {f.result() for f in [self._executor.submit(_warmup) for _ in range(self.workers)]}
+        print(f"Whisper workers ready: {sorted(pids)}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def transcribe(self, audio_path: str, model_size: Optional[str] = None,
+                         language: Optional[str] = 'en') -> List[Dict]:
+        model_size = model_size or self.default_model
+        if model_size not in self.model_sizes:
+            raise ValueError(f"Model {model_size} is not loaded (available: {', '.join(self.model_sizes)})")
+        if self._executor is None:
+            self.start()
+        if self._in_flight >= self.workers + self.max_queue:
+            raise PoolBusy(f"{self._in_flight} transcriptions already running or queued")
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, _transcribe_in_worker, audio_path, model_size, language
+            )
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> Dict:
+        return {
+            'backend': self.model_id,
+            'workers': self.workers,
+            'threads_per_worker': self.threads_per_worker,
+            'models': self.model_sizes,
+            'in_flight': self._in_flight,
+            'queued': max(0, self._in_flight - self.workers),
+            'capacity': self.workers + self.max_queue,
+        }
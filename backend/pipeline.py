@@ -0,0 +1,112 @@
+"""
+与 HTTP 无关的同步转写流水线
+
+FastAPI 入口和后台作业 worker 进程共用:
+探测 -> 边下载边转写 (流式失败时整段下载) -> 分组翻译。
+转写函数由调用方传入，本地模型池、进程内模型或 Whisper API 都可以。
+"""
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import yt_dlp
+
+from audio_io import download_postprocessors
+from event_stream import TranscriptCollector, transcript_events
+from info_cache import get_info_cache
+from streaming import media_headers, stream_transcribe
+from vad import transcribe_with_vad
+from video_info import YDL_HTTP_HEADERS, VideoInfo, get_video_info
+from workdir import find_download, job_workdir
+
+
+class Cancelled(Exception):
+    """Raised inside the pipeline when the caller asks it to stop"""
+
+
+def download_audio(url: str, work_dir: str) -> Tuple[str, str]:
+    """Download the audio stream into the job's work_dir and return (path, title)"""
+    ydl_opts = {
+        'format': 'worstaudio/worst',  # Use lower quality to avoid 403
+        # 默认保留原始 opus/m4a 音频流，不再转码成 mp3
+        'postprocessors': download_postprocessors(),
+        'outtmpl': os.path.join(work_dir, 'audio.%(ext)s'),
+        'quiet': False,
+        'no_warnings': False,
+        'cookiefile': 'cookies.txt',  # Optional: use cookies if available
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'referer': 'https://www.youtube.com/',
+        'socket_timeout': 30,
+        'retries': 3,
+        'fragment_retries': 3,
+        'extractor_args': {'youtube': {'skip': ['dash', 'hls']}},
+    }
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        title = info.get('title', 'Unknown')
+        # 下载时顺带拿到的元数据留给后续请求复用
+        get_info_cache().put(VideoInfo.from_info_dict(ydl.sanitize_info(info)))
+
+    # 文件留在请求目录里，由 job_workdir 统一清理，不再复制一份
+    audio_file = find_download(work_dir)
+    if audio_file is None:
+        raise Exception("Downloaded audio file not found")
+    return audio_file, title
+
+
+def iter_url_segments(url: str, transcribe_fn: Callable[[str], List[Dict]], meta: Dict,
+                      max_workers: Optional[int] = None, no_fallback: Tuple[type, ...] = ()) -> Iterator[Dict]:
+    """Yield segments on the original timeline for a video URL
+
+    Streams the audio into `transcribe_fn` chunk by chunk; if that fails before
+    the first segment, downloads the whole file instead. Fills meta['title'] and
+    meta['duration'] as soon as they are known. transcribe_fn gets 16 kHz wav paths.
+    Exceptions of the `no_fallback` types (e.g. a full worker pool) are raised as-is.
+    """
+    produced = False
+    if os.environ.get('STREAMING_TRANSCRIBE', '1') != '0':
+        try:
+            video_info = get_video_info(url, need_media=True)
+            meta['title'], meta['duration'] = video_info.title, video_info.duration
+            audio_format = video_info.best_audio()
+            if audio_format is None:
+                raise Exception("No direct audio format available")
+            for seg in stream_transcribe(
+                audio_format.url,
+                lambda chunk: transcribe_with_vad(chunk, transcribe_fn, speech_ext='.wav'),
+                headers=media_headers(YDL_HTTP_HEADERS, audio_format.http_headers),
+                max_workers=max_workers,
+            ):
+                produced = True
+                yield seg
+            return
+        except Exception as e:
+            if produced or isinstance(e, no_fallback):
+                raise
+            print(f"Streaming transcription failed, downloading whole file: {e}")
+
+    with job_workdir() as work_dir:
+        audio_path, meta['title'] = download_audio(url, work_dir)
+        yield from transcribe_with_vad(audio_path, transcribe_fn, speech_ext='.wav')
+
+
+def run_transcription(url: str, transcribe_fn: Callable[[str], List[Dict]], translator,
+                      on_progress: Optional[Callable[[str, float], None]] = None,
+                      should_cancel: Optional[Callable[[], bool]] = None,
+                      max_workers: Optional[int] = None) -> Tuple[Dict, bool]:
+    """Run the whole pipeline and return ({title, segments}, cacheable)
+
+    on_progress(stage, fraction) is called as segments arrive; should_cancel()
+    is polled between events and raises Cancelled when it returns True.
+    """
+    meta = {"title": "Unknown", "duration": 0}
+    collector = TranscriptCollector()
+    if on_progress:
+        on_progress('transcribing', 0.0)
+    for event, data in transcript_events(iter_url_segments(url, transcribe_fn, meta, max_workers), translator):
+        if should_cancel and should_cancel():
+            raise Cancelled()
+        collector.add(event, data)
+        if on_progress and event == 'segment' and meta['duration']:
+            on_progress('transcribing', min(0.99, data['end'] / meta['duration']))
+    return collector.result(meta['title']), collector.segments != [] and collector.cacheable
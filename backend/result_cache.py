@@ -0,0 +1,117 @@
+"""
+转写结果缓存
+
+以 (来源, ASR模型, 语言, 目标语言, 翻译后端) 为键保存完整的转写+翻译结果，
+换了 TRANSLATOR_BACKEND 之后不会再返回旧后端的译文。
+来源是 YouTube 视频ID 或上传音频的 SHA-256，同一个文件重复上传也能命中。
+SQLite 存储，按总字节数上限做 LRU 淘汰。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from video_info import extract_video_id
+
+
+def source_key_for_url(url: str) -> str:
+    video_id = extract_video_id(url)
+    return f"youtube:{video_id}" if video_id else f"url:{url}"
+
+
+def source_key_for_text(text: str) -> str:
+    return f"text:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+class TranscriptCache:
+    def __init__(self, db_path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, '
+            'created REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+        self._db.commit()
+
+    @staticmethod
+    def make_key(source_key: str, model: str, language: str, target_language: str, translator: str) -> str:
+        raw = json.dumps([source_key, model, language, target_language, translator])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute('SELECT data FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            self._db.execute('UPDATE results SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+            self._stats['hits'] += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict):
+        data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                (key, data, len(data), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        while total > self.max_bytes:
+            row = self._db.execute(
+                'SELECT key, size FROM results ORDER BY last_access LIMIT 1'
+            ).fetchone()
+            if row is None:
+                break
+            self._db.execute('DELETE FROM results WHERE key = ?', (row[0],))
+            total -= row[1]
+            self._stats['evictions'] += 1
+
+    def iter_results(self) -> Iterator[Dict]:
+        with self._lock:
+            rows = self._db.execute('SELECT data FROM results').fetchall()
+        for row in rows:
+            yield json.loads(row[0])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, total = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results'
+            ).fetchone()
+            stats = dict(self._stats)
+        stats.update({'entries': entries, 'bytes': total, 'max_bytes': self.max_bytes})
+        return stats
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> TranscriptCache:
+    """Process-wide cache configured from RESULT_CACHE_* environment variables"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = TranscriptCache(
+                    db_path=os.environ.get('RESULT_CACHE_DB')
+                    or os.path.join(tempfile.gettempdir(), 'transcript_cache.db'),
+                    max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+                )
+    return _result_cache
@@ -0,0 +1,126 @@
+"""
+相同请求合并 (single-flight)
+
+热门视频往往在几秒内被很多人同时提交。以 (规范化视频ID, 模型, 语言) 为键，
+第一个请求真正执行下载/转写/翻译，同时到达的相同请求挂到同一次执行上:
+    do(key, fn)       等待同一个结果 (Future)
+    stream(key, fn)   订阅同一个事件流，后到的订阅者先补发已产生的事件
+执行结束后键即释放，之后的请求走结果缓存。
+"""
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class _Channel:
+    """Replayable event log: subscribers get everything published so far, then follow live"""
+
+    def __init__(self):
+        self.events: List = []
+        self.error: Optional[BaseException] = None
+        self.closed = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, item):
+        async with self._changed:
+            self.events.append(item)
+            self._changed.notify_all()
+
+    async def close(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.closed = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator:
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: position < len(self.events) or self.closed)
+                pending = self.events[position:]
+                closed, error = self.closed, self.error
+            for item in pending:
+                yield item
+            position += len(pending)
+            if closed and position >= len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls onto one in-flight run"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Channel] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await fn() once per key; concurrent callers with the same key share its result or error"""
+        future = self._calls.get(key)
+        if future is None:
+            self.started += 1
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._release(self._calls, key, f))
+        else:
+            self.coalesced += 1
+        # 某个调用方被取消 (客户端断开) 不影响其他等待者
+        return await asyncio.shield(future)
+
+    async def stream(self, key: str, make_source: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Iterate make_source() once per key; concurrent callers subscribe to the same events
+
+        The source is cancelled once its last subscriber goes away.
+        """
+        channel = self._streams.get(key)
+        if channel is None:
+            self.started += 1
+            channel = _Channel()
+            self._streams[key] = channel
+            channel.task = asyncio.ensure_future(self._pump(key, channel, make_source))
+        else:
+            self.coalesced += 1
+
+        channel.subscribers += 1
+        try:
+            async for item in channel.subscribe():
+                yield item
+        finally:
+            channel.subscribers -= 1
+            if channel.subscribers == 0 and not channel.task.done():
+                # 先释放键，之后到达的请求重新开始一次执行
+                self._release(self._streams, key, channel)
+                channel.task.cancel()
+
+    async def _pump(self, key: str, channel: _Channel, make_source: Callable[[], AsyncIterator]):
+        error = None
+        source = make_source()
+        try:
+            async for item in source:
+                await channel.publish(item)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+        except Exception as e:
+            error = e
+        finally:
+            self._release(self._streams, key, channel)
+            await source.aclose()
+            await channel.close(error)
+
+    @staticmethod
+    def _release(table: Dict, key: str, value):
+        if table.get(key) is value:
+            del table[key]
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
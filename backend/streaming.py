@@ -0,0 +1,201 @@
+"""
+边下载边转写
+
+媒体 URL 的字节流直接喂给 ffmpeg，解码成 16 kHz 单声道 PCM 后按固定时长切块，
+每凑满一块就交给转写线程，后面的块还在下载。第一批片段的等待时间从
+"完整下载 + 整段转写" 缩短到大约一个块的时长。
+
+切块边界和重叠由 tests/test_streaming.py 覆盖 (本地 HTTP 服务器 + 合成 wav，需要 ffmpeg):
+    cd backend && python -m pytest tests
+手动试一段真实音频:
+    python -m http.server 8001 --directory /path/to/audio
+    python streaming.py http://127.0.0.1:8001/lecture.m4a
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from audio_chunker import merge_chunk
+from audio_io import SAMPLE_RATE
+from http_clients import open_media
+
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+READ_BLOCK = 64 * 1024
+
+
+def media_headers(*header_sets: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """Merge request headers for a media download, asking for an uncompressed body
+
+    Audio streams are not compressed anyway, and identity keeps byte ranges meaningful.
+    """
+    merged = {}
+    for headers in header_sets:
+        merged.update(headers or {})
+    merged = {k: v for k, v in merged.items() if k.lower() != 'accept-encoding'}
+    merged['Accept-Encoding'] = 'identity'
+    return merged
+
+
+def _feed(response, stdin, errors: List[Exception]):
+    """Copy the HTTP body into ffmpeg's stdin on a background thread"""
+    try:
+        while True:
+            block = response.read(READ_BLOCK)
+            if not block:
+                break
+            stdin.write(block)
+    except BrokenPipeError:
+        # ffmpeg 已退出（解码失败或调用方提前停止），由读取端报告
+        pass
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+        response.close()
+
+
+def iter_pcm_chunks(media_url: str, chunk_seconds: float, overlap: float = 2.0,
+                    headers: Optional[Dict[str, str]] = None, timeout: float = 30
+                    ) -> Iterator[Tuple[float, float, bytes]]:
+    """Yield (start, end, pcm) blocks of `chunk_seconds` while `media_url` is still downloading
+
+    Consecutive blocks overlap by `overlap` seconds so a word cut at the
+    boundary is heard in full by at least one of them.
+    """
+    chunk_bytes = int(chunk_seconds * SAMPLE_RATE) * 2
+    overlap_bytes = int(overlap * SAMPLE_RATE) * 2
+    step_bytes = chunk_bytes - overlap_bytes
+    if step_bytes <= 0:
+        raise ValueError("chunk_seconds must be longer than overlap")
+
+    # 共享连接池，同一 CDN 主机的后续请求不必重新握手
+    response = open_media(media_url, headers=media_headers(headers), timeout=timeout)
+    try:
+        process = subprocess.Popen(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+             '-vn', '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+    except BaseException:
+        # 没有 ffmpeg (如 Vercel) 时也要把连接还回去
+        response.close()
+        raise
+    errors = []
+    feeder = threading.Thread(target=_feed, args=(response, process.stdin, errors), daemon=True)
+    feeder.start()
+
+    buffer = bytearray()
+    offset = 0
+    finished = False
+    try:
+        while True:
+            block = process.stdout.read(READ_BLOCK)
+            if not block:
+                break
+            buffer.extend(block)
+            while len(buffer) >= chunk_bytes:
+                yield offset / BYTES_PER_SECOND, (offset + chunk_bytes) / BYTES_PER_SECOND, bytes(buffer[:chunk_bytes])
+                del buffer[:step_bytes]
+                offset += step_bytes
+        # 最后一块只要有重叠区以外的新音频就输出
+        if len(buffer) > overlap_bytes or (offset == 0 and buffer):
+            yield offset / BYTES_PER_SECOND, (offset + len(buffer)) / BYTES_PER_SECOND, bytes(buffer)
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', errors='ignore')
+        process.stderr.close()
+        returncode = process.wait()
+        feeder.join(timeout=5)
+    if errors:
+        raise Exception(f"Media download failed: {errors[0]}")
+    if returncode != 0:
+        raise Exception(f"ffmpeg stream decode failed: {stderr.strip()[-200:]}")
+
+
+def _write_wav(path: str, pcm: bytes):
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        out.writeframes(pcm)
+
+
+def stream_transcribe(media_url: str, transcribe_fn: Callable[[str], List[Dict]],
+                      headers: Optional[Dict[str, str]] = None, chunk_seconds: Optional[float] = None,
+                      overlap: float = 2.0, max_workers: Optional[int] = None) -> Iterator[Dict]:
+    """Yield segments on the original timeline, in order, while the download is still running
+
+    transcribe_fn receives a 16 kHz mono wav path and returns segments relative to it.
+    At most `max_workers` chunks are waiting or being transcribed; reading the
+    stream pauses until one finishes, so a slow ASR never buffers the whole file.
+    """
+    chunk_seconds = chunk_seconds or float(os.environ.get('STREAM_CHUNK_SECONDS', 120))
+    max_workers = max_workers or int(os.environ.get('WHISPER_CHUNK_WORKERS', 4))
+
+    work_dir = tempfile.mkdtemp(prefix='stream_')
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    chunks = []
+    futures = []
+    merged = []
+    next_index = 0
+
+    def run(index, path):
+        try:
+            segments = transcribe_fn(path)
+        finally:
+            os.remove(path)
+        start, end = chunks[index]
+        print(f"Stream chunk {index + 1} done ({start:.0f}-{end:.0f}s, {len(segments)} segments)")
+        return segments
+
+    completed = False
+    try:
+        for start, end, pcm in iter_pcm_chunks(media_url, chunk_seconds, overlap, headers=headers):
+            index = len(chunks)
+            path = os.path.join(work_dir, f'chunk_{index:04d}.wav')
+            _write_wav(path, pcm)
+            chunks.append((start, end))
+            futures.append(executor.submit(run, index, path))
+            # 第 i 块要等第 i+1 块出现后才能确定重叠边界。转写跟不上下载时在这里等最早的一块，
+            # 不再读取下一块，ffmpeg 和下载随之阻塞，磁盘上最多留 max_workers 块待转写
+            while next_index < index and (futures[next_index].done() or index - next_index >= max_workers):
+                yield from merge_chunk(merged, chunks, next_index, futures[next_index].result())
+                next_index += 1
+        while next_index < len(chunks):
+            yield from merge_chunk(merged, chunks, next_index, futures[next_index].result())
+            next_index += 1
+        completed = True
+    finally:
+        # 正常结束时所有任务都已完成；提前停止时不再等待进行中的转写
+        executor.shutdown(wait=completed, cancel_futures=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    from asr_backends import backend_options_from_env, create_backend
+
+    options = backend_options_from_env()
+    backend = create_backend(options['backend'], os.environ.get('WHISPER_MODEL', 'base'),
+                             threads=os.cpu_count() or 1, compute_type=options['compute_type'],
+                             beam_size=options['beam_size'])
+    started = time.time()
+    first = None
+    for segment in stream_transcribe(sys.argv[1], backend.transcribe, max_workers=1):
+        if first is None:
+            first = time.time() - started
+            print(f"First segment after {first:.1f}s")
+        print(f"[{segment['start']:7.1f} - {segment['end']:7.1f}] {segment['text']}")
+    print(f"Done in {time.time() - started:.1f}s")
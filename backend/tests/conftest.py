@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 和 api/*.py 一样，直接按模块名导入 backend/ 下的文件
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import pytest
+
+import audio_chunker
+import whisper_api
+from audio_chunker import merge_chunk_segments, plan_chunks, transcribe_in_chunks
+from whisper_api import transcribe_any
+
+
+def seg(start, end, text):
+    return {"start": start, "end": end, "text": text}
+
+
+def test_plan_chunks_cuts_in_silence_or_overlaps_hard_cuts():
+    chunks = plan_chunks(1300, [(590, 592)], target=600, window=60, overlap=2)
+
+    # 第一刀落在静音中点；第二刀附近没有静音，硬切并让下一段提前 2 秒开始
+    assert chunks == [(0, 591), (591, 1191), (1189, 1300)]
+
+
+def test_plan_chunks_short_audio_is_one_chunk():
+    assert plan_chunks(620, [], target=600, window=60) == [(0, 620)]
+
+
+def test_merge_offsets_timestamps_by_chunk_start():
+    chunks = [(0, 591), (591, 1200)]
+    results = [[seg(0, 4, "first")], [seg(0.5, 3, "second"), seg(100, 104.25, "third")]]
+
+    assert merge_chunk_segments(chunks, results) == [
+        seg(0, 4, "first"), seg(591.5, 594, "second"), seg(691, 695.25, "third"),
+    ]
+
+
+def test_merge_dedupes_the_overlap_at_a_hard_cut():
+    # 两段在 598-600 重叠，以中点 599 为界各取一半
+    chunks = [(0, 600), (598, 1200)]
+    results = [
+        [seg(0, 5, "hello"), seg(596, 599.5, "boundary words"), seg(599.2, 600, "tail")],
+        [seg(0, 1.5, "Boundary words."), seg(1.2, 3, "tail"), seg(10, 12, "next")],
+    ]
+
+    assert merge_chunk_segments(chunks, results) == [
+        seg(0, 5, "hello"), seg(596, 599.5, "boundary words"), seg(599.2, 601, "tail"), seg(608, 610, "next"),
+    ]
+
+
+def test_merge_drops_repeated_text_across_the_boundary():
+    chunks = [(0, 600), (598, 1200)]
+    results = [[seg(596, 599.5, "boundary words")], [seg(1.1, 2.5, "Boundary words!"), seg(3, 4, "after")]]
+
+    assert [s['text'] for s in merge_chunk_segments(chunks, results)] == ["boundary words", "after"]
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    """1300 s of audio with one silence; exported clips contain their start time"""
+    monkeypatch.setattr(audio_chunker, 'probe_duration', lambda path: 1300.0)
+    monkeypatch.setattr(audio_chunker, 'detect_silences', lambda path: [(590.0, 592.0)])
+
+    def export_clip(path, start, duration, out_path):
+        with open(out_path, 'w') as f:
+            f.write(str(start))
+    monkeypatch.setattr(audio_chunker, 'export_clip', export_clip)
+
+
+def clip_start(path):
+    with open(path) as f:
+        return float(f.read())
+
+
+def test_transcribe_in_chunks_runs_every_chunk(fake_ffmpeg):
+    def transcribe(path):
+        return [seg(1, 2, f"from {clip_start(path):.0f}")]
+
+    segments = transcribe_in_chunks('talk.m4a', transcribe, target_seconds=600, max_workers=2)
+
+    assert segments == [seg(1, 2, "from 0"), seg(592, 593, "from 591"), seg(1190, 1191, "from 1189")]
+
+
+class FakeWhisperAPI:
+    """Stands in for openai.OpenAI: records each upload and answers with verbose_json-style segments"""
+
+    def __init__(self):
+        self.uploads = []
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.create))
+
+    def create(self, model, file, response_format, timestamp_granularities, language=None):
+        self.uploads.append(file.name)
+        # 文本里带上语言和上传内容的开头，方便区分各段
+        text = f" {language} {file.read(8).decode(errors='replace').strip(chr(0))} "
+        return SimpleNamespace(segments=[{"start": 5.0, "end": 6.5, "text": text}], text='')
+
+
+def test_small_file_takes_the_single_request_path(tmp_path, monkeypatch):
+    audio = tmp_path / 'talk.mp3'
+    audio.write_bytes(b'\0' * 1024)
+
+    def no_chunking(*args, **kwargs):
+        raise AssertionError("files under 25 MB must not be chunked")
+    monkeypatch.setattr(audio_chunker, 'transcribe_in_chunks', no_chunking)
+    client = FakeWhisperAPI()
+
+    assert transcribe_any(client, str(audio), language='en') == [seg(5.0, 6.5, "en")]
+    assert client.uploads == [str(audio)]
+
+
+def test_large_file_is_chunked_and_merged(tmp_path, monkeypatch, fake_ffmpeg):
+    audio = tmp_path / 'talk.mp3'
+    audio.write_bytes(b'\0' * 1024)
+    monkeypatch.setattr(whisper_api, 'MAX_UPLOAD_BYTES', 512)
+    monkeypatch.setenv('WHISPER_CHUNK_SECONDS', '600')
+    client = FakeWhisperAPI()
+
+    segments = transcribe_any(client, str(audio), language='fr')
+
+    assert len(client.uploads) == 3
+    assert segments == [seg(5, 6.5, "fr 0.0"), seg(596, 597.5, "fr 591.0"), seg(1194, 1195.5, "fr 1189.0")]
@@ -0,0 +1,161 @@
+import os
+
+import pytest
+
+from captions import (CaptionError, align_translations, dedupe_if_rolling, dedupe_rolling, looks_rolling,
+                      merge_cues, normalize_cues, parse_captions, sniff_format)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def trickle(data: bytes, size: int):
+    """The document as it arrives over the network, split mid-tag and mid-UTF-8 sequence"""
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+def cue(start, end, text):
+    return {'start': start, 'end': end, 'text': text}
+
+
+ROLLING_VTT = [
+    cue(0.0, 2.5, 'so today we are going'),
+    cue(2.5, 4.0, 'so today we are going to talk about caching.'),
+    cue(4.0, 6.0, 'to talk about caching. It makes things fast'),
+    cue(6.0, 8.0, 'It makes things fast and cheap & simple.'),
+]
+
+EXPECTED = {
+    'rolling.vtt': ROLLING_VTT,
+    'chunked.json3': [
+        cue(0.0, 2.0, 'Hello world,'),
+        cue(2.0, 3.8, 'café naïve — 你好'),
+        cue(3.8, 5.0, 'goodbye.'),
+    ],
+    'offsets.srv3': [
+        cue(1.0, 3.5, 'we built a cache'),
+        cue(3.51, 5.51, 'that actually works.'),
+    ],
+    'ticks.ttml': [
+        cue(1.0, 3.5, 'First line continues here'),
+        cue(4.2, 6.2, 'Frame-based timing'),
+        cue(7.5, 9.0, 'Offsets & units'),
+    ],
+}
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+@pytest.mark.parametrize('size', [1, 5, 64 * 1024])
+def test_fixture_parsed_in_any_chunking(name, size):
+    assert list(parse_captions(trickle(fixture(name), size))) == EXPECTED[name]
+
+
+@pytest.mark.parametrize('name, fmt', [
+    ('rolling.vtt', 'vtt'), ('chunked.json3', 'json3'), ('offsets.srv3', 'srv3'), ('ticks.ttml', 'ttml'),
+])
+def test_explicit_format_matches_sniffed(name, fmt):
+    assert list(parse_captions(fixture(name), fmt)) == EXPECTED[name]
+
+
+def test_srt():
+    srt = '1\r\n00:00:01,000 --> 00:00:02,5\r\n<i>Hello</i>\r\nthere\r\n\r\n2\r\n00:01:02,000 --> 00:01:03,000\r\nBye'
+
+    assert list(parse_captions(srt, 'srt')) == [cue(1.0, 2.5, 'Hello there'), cue(62.0, 63.0, 'Bye')]
+
+
+def test_srv1_seconds():
+    srv1 = '<transcript><text start="1.5" dur="2">it&amp;#39;s fine</text><text start="4" dur="1"> </text></transcript>'
+
+    assert list(parse_captions(srv1, 'srv1')) == [cue(1.5, 3.5, "it's fine")]
+
+
+def test_truncated_json3_is_an_error():
+    data = fixture('chunked.json3')
+
+    with pytest.raises(CaptionError):
+        list(parse_captions(data[:len(data) // 2], 'json3'))
+
+
+def test_sniff_format():
+    assert sniff_format('\ufeff  {"events": []}') == 'json3'
+    assert sniff_format('<?xml version="1.0"?>') == 'xml'
+    assert sniff_format('WEBVTT') == 'vtt'
+
+
+def texts(cues):
+    return [c['text'] for c in cues]
+
+
+def test_rolling_track_is_detected_and_deduped():
+    assert looks_rolling(ROLLING_VTT)
+    assert texts(dedupe_rolling(ROLLING_VTT)) == [
+        'so today we are going', 'to talk about caching.', 'It makes things fast', 'and cheap & simple.',
+    ]
+
+
+def test_normalize_rolling_track_into_sentences():
+    assert list(normalize_cues(parse_captions(fixture('rolling.vtt')), rolling=True)) == [
+        cue(0.0, 4.0, 'so today we are going to talk about caching.'),
+        cue(4.0, 8.0, 'It makes things fast and cheap & simple.'),
+    ]
+
+
+def test_structured_track_keeps_words_repeated_at_a_boundary():
+    cues = [cue(0, 1, 'we want to'), cue(1, 2, 'to be fast'), cue(2, 3, 'and fast is'), cue(3, 4, 'is good.')]
+
+    assert not looks_rolling(cues)
+    assert texts(dedupe_if_rolling(cues)) == texts(cues)
+    # dedupe_rolling 本身会把边界上重复的词当成滚动
+    assert texts(dedupe_rolling(cues)) == ['we want to', 'be fast', 'and fast is', 'good.']
+
+
+def test_merge_cues_splits_on_sentence_end_pause_and_limits():
+    cues = [
+        cue(0.0, 1.0, 'one'), cue(1.0, 2.0, 'two.'),       # 句末标点
+        cue(2.0, 3.0, 'three'), cue(5.0, 6.0, 'four'),     # 超过 1 秒的停顿
+        cue(6.0, 9.0, 'five'), cue(9.0, 12.0, 'six'),      # 超过最长时长
+        cue(12.0, 13.0, 'x' * 15), cue(13.0, 14.0, 'y'),   # 超过最多字数
+    ]
+
+    assert list(merge_cues(cues, max_duration=5, max_chars=16, pause=1.0)) == [
+        cue(0.0, 2.0, 'one two.'),
+        cue(2.0, 3.0, 'three'),
+        cue(5.0, 9.0, 'four five'),
+        cue(9.0, 12.0, 'six'),
+        cue(12.0, 13.0, 'x' * 15),
+        cue(13.0, 14.0, 'y'),
+    ]
+
+
+def test_merge_cues_clips_overlapping_end_to_next_start():
+    cues = [cue(0.0, 3.0, 'first.'), cue(2.0, 4.0, 'second.')]
+
+    assert list(merge_cues(cues, max_duration=10, max_chars=100, pause=1.0)) == [
+        cue(0.0, 2.0, 'first.'), cue(2.0, 4.0, 'second.'),
+    ]
+
+
+def test_align_translations_by_cue_midpoint():
+    segments = [cue(0.0, 4.0, 'Hello there.'), cue(4.0, 8.0, 'How are you?'), cue(8.0, 10.0, 'Bye.')]
+    translated = [
+        cue(3.0, 4.5, '你好'), cue(0.5, 2.0, '喂'),          # 顺序打乱，中点都在第一段
+        cue(4.5, 6.0, 'how'), cue(6.0, 7.5, 'are you'),
+        cue(12.0, 13.0, '多出来的'),                        # 最后一段之后，丢弃
+    ]
+
+    assert align_translations(segments, translated) == 2
+    assert segments[0]['translation'] == '喂你好'
+    assert segments[1]['translation'] == 'how are you'
+    assert 'translation' not in segments[2]
+
+
+def test_align_translations_per_language():
+    segments = [cue(0.0, 2.0, 'Hi.')]
+
+    assert align_translations(segments, [cue(0.0, 2.0, 'Hola.')], lang='es') == 1
+    assert segments[0]['translations'] == {'es': 'Hola.'}
+    assert 'translation' not in segments[0]
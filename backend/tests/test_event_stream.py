@@ -0,0 +1,24 @@
+from event_stream import TranscriptCollector, cached_events, done_event, encode_event, transcript_events
+from translation import BatchTranslator, MultiTranslator
+from translators import CallableTranslator
+
+
+def test_cache_replay_matches_the_live_stream():
+    translator = MultiTranslator({'zh-cn': BatchTranslator(CallableTranslator(str.upper), backoff=0)})
+    segments = [{"start": 0.0, "end": 1.0, "text": " one "}, {"start": 1.0, "end": 2.0, "text": "two"}]
+
+    live = list(transcript_events(segments, translator, group_size=1))
+    collector = TranscriptCollector()
+    for event, data in live:
+        collector.add(event, data)
+    live.append(done_event('Talk', len(collector.segments)))
+
+    replay = list(cached_events(collector.result('Talk')))
+
+    assert replay == live
+    assert replay[-1] == ('done', {"title": "Talk", "segment_count": 2})
+
+
+def test_encode_event():
+    assert encode_event('sse', 'done', {"title": "标题"}) == 'event: done\ndata: {"title": "标题"}\n\n'.encode()
+    assert encode_event('ndjson', 'done', {"title": "t"}) == b'{"event": "done", "data": {"title": "t"}}\n'
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+import pytest
+
+import executors
+from executors import PipelineBusy, io_stats, pipeline_stats, run_io, run_pipeline
+
+
+@pytest.fixture
+def small_pools(monkeypatch):
+    monkeypatch.setenv('PIPELINE_THREADS', '1')
+    monkeypatch.setenv('PIPELINE_QUEUE', '1')
+    monkeypatch.setenv('IO_THREADS', '2')
+    executors.shutdown_io()
+    yield
+    executors.shutdown_io()
+
+
+def test_pipeline_pool_is_bounded_and_does_not_block_io(small_pools):
+    release = threading.Event()
+
+    async def main():
+        running = [asyncio.ensure_future(run_pipeline(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+
+        assert pipeline_stats() == {'threads': 1, 'in_flight': 2, 'queued': 1, 'capacity': 2}
+        with pytest.raises(PipelineBusy):
+            await run_pipeline(lambda: None)
+        # 流水线占满时短调用照常在 I/O 线程池里执行
+        assert await run_io(sum, [1, 2]) == 3
+
+        release.set()
+        await asyncio.gather(*running)
+        assert pipeline_stats()['in_flight'] == 0
+        assert io_stats() == {'threads': 2, 'in_flight': 0, 'queued': 0}
+
+    asyncio.run(main())
+
+
+def test_io_stats_count_calls_in_flight(small_pools):
+    release = threading.Event()
+
+    async def main():
+        calls = [asyncio.ensure_future(run_io(release.wait)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert io_stats() == {'threads': 2, 'in_flight': 3, 'queued': 1}
+        release.set()
+        await asyncio.gather(*calls)
+
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from jobs import JobStore, JobWorkers
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.db'), max_attempts=2)
+
+
+def submit(store, url='https://youtu.be/a', **kwargs):
+    return store.submit({"url": url}, cache_key=kwargs.pop('cache_key', url), **kwargs)
+
+
+def test_claim_takes_highest_priority_then_oldest(store):
+    first = submit(store, 'https://youtu.be/1')
+    urgent = submit(store, 'https://youtu.be/2', priority=5)
+    second = submit(store, 'https://youtu.be/3')
+
+    claimed = [store.claim('w', 'owner-a')['id'] for _ in range(3)]
+
+    assert claimed == [urgent['id'], first['id'], second['id']]
+    assert store.claim('w', 'owner-a') is None
+    assert store.get(first['id'])['status'] == 'running'
+    assert store.get(first['id'])['attempts'] == 1
+
+
+def test_duplicate_submit_returns_active_job(store):
+    job = submit(store)
+    again = submit(store, priority=3)
+
+    assert again['id'] == job['id']
+    assert again['priority'] == 3
+
+
+def test_cached_result_is_stored_done(store):
+    job = submit(store, result={"title": "t", "segments": []})
+
+    assert job['status'] == 'done'
+    assert store.claim('w', 'owner-a') is None
+
+
+def test_heartbeat_keeps_job_running(store):
+    job = submit(store)
+    store.claim('w', 'owner-a')
+    time.sleep(0.05)
+    assert store.heartbeat('owner-a') == 1
+
+    assert store.requeue_expired(timeout=0.04) == 0
+    assert store.get(job['id'])['status'] == 'running'
+
+
+def test_expired_heartbeat_requeues_then_fails(store):
+    job = submit(store)
+    store.claim('w', 'owner-a')
+    time.sleep(0.05)
+
+    assert store.requeue_expired(timeout=0.01) == 1
+    assert store.get(job['id'])['status'] == 'queued'
+
+    store.claim('w', 'owner-b')
+    time.sleep(0.05)
+    # max_attempts=2: 第二次运行也没有心跳，标记失败
+    assert store.requeue_expired(timeout=0.01) == 0
+    failed = store.get(job['id'])
+    assert failed['status'] == 'failed'
+    assert failed['attempts'] == 2
+
+
+def test_expired_job_with_cancel_request_is_cancelled(store):
+    job = submit(store)
+    store.claim('w', 'owner-a')
+    store.cancel(job['id'])
+    time.sleep(0.05)
+
+    store.requeue_expired(timeout=0.01)
+
+    assert store.get(job['id'])['status'] == 'cancelled'
+
+
+def test_cancel_queued_and_running(store):
+    queued = submit(store, 'https://youtu.be/1')
+    assert store.cancel(queued['id'])['status'] == 'cancelled'
+
+    running = submit(store, 'https://youtu.be/2')
+    store.claim('w', 'owner-a')
+    assert store.cancel(running['id'])['status'] == 'running'
+    assert store.cancel_requested(running['id'])
+    assert store.finish(running['id'], 'cancelled', 'w', 'owner-a')
+    assert store.get(running['id'])['status'] == 'cancelled'
+
+
+def test_finish_only_by_current_worker(store):
+    job = submit(store)
+    store.claim('w', 'owner-a')
+    time.sleep(0.05)
+    store.requeue_expired(timeout=0.01)
+    store.claim('w', 'owner-b')
+
+    # owner-a 心跳过期后才跑完，不能覆盖 owner-b 的运行
+    assert not store.finish(job['id'], 'done', 'w', 'owner-a', result={"segments": []})
+    assert store.get(job['id'])['status'] == 'running'
+    assert store.finish(job['id'], 'done', 'w', 'owner-b', result={"segments": [1]})
+    assert store.get(job['id'])['result'] == {"segments": [1]}
+    # 重复的 finish 不再生效
+    assert not store.finish(job['id'], 'failed', 'w', 'owner-b', error='late')
+    assert store.get(job['id'])['status'] == 'done'
+
+
+def test_old_database_is_migrated(tmp_path):
+    path = str(tmp_path / 'old.db')
+    db = sqlite3.connect(path)
+    db.execute(
+        'CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0, '
+        'request TEXT NOT NULL, cache_key TEXT, stage TEXT, progress REAL NOT NULL DEFAULT 0, '
+        'attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, '
+        'error TEXT, result TEXT, created REAL NOT NULL, started REAL, finished REAL, updated REAL NOT NULL)'
+    )
+    db.execute("INSERT INTO jobs (id, status, request, attempts, created, updated) "
+               "VALUES ('old', 'running', '{\"url\": \"u\"}', 1, 0, 0)")
+    db.commit()
+    db.close()
+
+    store = JobStore(path)
+
+    # 没有心跳的运行中作业视为过期
+    assert store.requeue_expired(timeout=60) == 1
+    assert store.get('old')['status'] == 'queued'
+
+
+def test_workers_refresh_heartbeat_until_shutdown(store):
+    job = submit(store)
+    workers = JobWorkers(store, heartbeat_timeout=0.2)
+    store.claim('w', workers.owner)
+    # 只跑心跳线程
+    heartbeat = threading.Thread(target=workers._heartbeat_loop, daemon=True)
+    heartbeat.start()
+    time.sleep(0.4)
+    assert store.requeue_expired(timeout=0.2) == 0
+
+    workers.shutdown()
+    heartbeat.join()
+    time.sleep(0.25)
+    assert store.requeue_expired(timeout=0.2) == 1
+    assert store.get(job['id'])['status'] == 'queued'
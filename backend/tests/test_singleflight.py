@@ -0,0 +1,183 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+async def settle():
+    # 让被取消或刚唤醒的任务跑完
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_do_coalesces_concurrent_calls():
+    async def main():
+        flights = SingleFlight()
+        calls = []
+        gate = asyncio.Event()
+
+        async def work():
+            calls.append(1)
+            await gate.wait()
+            return 'result'
+
+        waiters = [asyncio.ensure_future(flights.do('video', work)) for _ in range(3)]
+        await settle()
+        gate.set()
+        results = await asyncio.gather(*waiters)
+
+        assert results == ['result'] * 3
+        assert len(calls) == 1
+        assert flights.stats() == {"in_flight": 0, "started": 1, "coalesced": 2}
+
+        # 执行结束后键已释放，新的调用重新执行
+        await flights.do('video', work)
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_do_propagates_error_to_every_waiter():
+    async def main():
+        flights = SingleFlight()
+        gate = asyncio.Event()
+
+        async def fail():
+            await gate.wait()
+            raise RuntimeError('download failed')
+
+        waiters = [asyncio.ensure_future(flights.do('video', fail)) for _ in range(2)]
+        await settle()
+        gate.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+
+        assert [str(r) for r in results] == ['download failed'] * 2
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    asyncio.run(main())
+
+
+def test_do_cancelled_caller_does_not_cancel_others():
+    async def main():
+        flights = SingleFlight()
+        gate = asyncio.Event()
+
+        async def work():
+            await gate.wait()
+            return 42
+
+        leaving = asyncio.ensure_future(flights.do('video', work))
+        staying = asyncio.ensure_future(flights.do('video', work))
+        await settle()
+        leaving.cancel()
+        await settle()
+        gate.set()
+
+        assert await staying == 42
+        assert leaving.cancelled()
+
+    asyncio.run(main())
+
+
+class Source:
+    """Async event source driven step by step from the test"""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.started = 0
+        self.closed = False
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            while True:
+                item = await self.queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is None:
+                    return
+                yield item
+        finally:
+            self.closed = True
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+def test_stream_coalesces_and_replays_to_late_subscribers():
+    async def main():
+        flights = SingleFlight()
+        source = Source()
+
+        first = asyncio.ensure_future(collect(flights.stream('video', source)))
+        await settle()
+        source.queue.put_nowait('progress')
+        source.queue.put_nowait('segment 1')
+        await settle()
+
+        # 后到的订阅者先补发已有事件，再跟上实时事件
+        late = asyncio.ensure_future(collect(flights.stream('video', source)))
+        await settle()
+        source.queue.put_nowait('segment 2')
+        source.queue.put_nowait(None)
+
+        expected = ['progress', 'segment 1', 'segment 2']
+        assert await first == expected
+        assert await late == expected
+        assert source.started == 1
+        assert flights.stats() == {"in_flight": 0, "started": 1, "coalesced": 1}
+
+    asyncio.run(main())
+
+
+def test_stream_error_reaches_every_subscriber():
+    async def main():
+        flights = SingleFlight()
+        source = Source()
+        received = [[], []]
+
+        async def subscriber(index):
+            async for item in flights.stream('video', source):
+                received[index].append(item)
+
+        subscribers = [asyncio.ensure_future(subscriber(i)) for i in range(2)]
+        await settle()
+        source.queue.put_nowait('segment 1')
+        source.queue.put_nowait(RuntimeError('transcription failed'))
+        results = await asyncio.gather(*subscribers, return_exceptions=True)
+
+        assert received == [['segment 1'], ['segment 1']]
+        assert all(isinstance(r, RuntimeError) and str(r) == 'transcription failed' for r in results)
+
+    asyncio.run(main())
+
+
+def test_stream_cancels_source_when_last_subscriber_leaves():
+    async def main():
+        flights = SingleFlight()
+        source = Source()
+
+        a = flights.stream('video', source)
+        b = flights.stream('video', source)
+        source.queue.put_nowait('segment 1')
+        assert await a.__anext__() == 'segment 1'
+        assert await b.__anext__() == 'segment 1'
+
+        await a.aclose()
+        await settle()
+        assert not source.closed  # 还有一个订阅者
+
+        await b.aclose()
+        await settle()
+        assert source.closed
+        assert flights.stats()['in_flight'] == 0
+
+        # 之后的请求重新开始一次执行
+        c = flights.stream('video', source)
+        source.queue.put_nowait('again')
+        assert await c.__anext__() == 'again'
+        assert source.started == 2
+        await c.aclose()
+
+    asyncio.run(main())
+
@@ -0,0 +1,119 @@
+import functools
+import os
+import shutil
+import threading
+import time
+import wave
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+import streaming  # noqa: E402
+from streaming import BYTES_PER_SECOND, SAMPLE_RATE, iter_pcm_chunks  # noqa: E402
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg is not installed")
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def media_server(tmp_path):
+    """Serve tmp_path over HTTP; yields the base URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=str(tmp_path)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _write_wav(path, seconds: float) -> bytes:
+    """16 kHz mono s16 wav whose samples count upwards, so every offset is recognisable"""
+    frames = int(seconds * SAMPLE_RATE)
+    pcm = b''.join((i % 32768).to_bytes(2, 'little') for i in range(frames))
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        out.writeframes(pcm)
+    return pcm
+
+
+@needs_ffmpeg
+def test_chunks_overlap_and_cover_the_stream(tmp_path, media_server):
+    pcm = _write_wav(os.path.join(tmp_path, 'tone.wav'), 7.5)
+
+    chunks = list(iter_pcm_chunks(f"{media_server}/tone.wav", chunk_seconds=3, overlap=1))
+
+    assert [(start, end) for start, end, _ in chunks] == [(0, 3), (2, 5), (4, 7), (6, 7.5)]
+    for start, end, data in chunks:
+        # 16 kHz s16le 的 wav 解码后逐字节不变，每块正好是原始 PCM 的对应区间
+        assert data == pcm[int(start * BYTES_PER_SECOND):int(end * BYTES_PER_SECOND)]
+
+
+@needs_ffmpeg
+def test_short_stream_yields_one_chunk(tmp_path, media_server):
+    pcm = _write_wav(os.path.join(tmp_path, 'short.wav'), 0.5)
+
+    chunks = list(iter_pcm_chunks(f"{media_server}/short.wav", chunk_seconds=3, overlap=1))
+
+    assert chunks == [(0, 0.5, pcm)]
+
+
+def test_overlap_must_be_shorter_than_chunk():
+    with pytest.raises(ValueError):
+        list(iter_pcm_chunks('http://127.0.0.1:1/unused.wav', chunk_seconds=1, overlap=1))
+
+
+def test_response_closed_when_ffmpeg_is_missing(monkeypatch):
+    class FakeResponse:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    response = FakeResponse()
+    monkeypatch.setattr(streaming, 'open_media', lambda *args, **kwargs: response)
+
+    def missing_ffmpeg(*args, **kwargs):
+        raise FileNotFoundError('ffmpeg')
+    monkeypatch.setattr(streaming.subprocess, 'Popen', missing_ffmpeg)
+
+    with pytest.raises(FileNotFoundError):
+        list(iter_pcm_chunks('http://example.invalid/audio.m4a', chunk_seconds=3, overlap=1))
+    assert response.closed
+
+
+def test_slow_transcription_pauses_the_stream(monkeypatch):
+    chunk_bytes = BYTES_PER_SECOND  # 每块 1 秒，不重叠
+    produced = []
+    transcribed = []
+    lock = threading.Lock()
+
+    def fake_chunks(media_url, chunk_seconds, overlap, headers=None):
+        for index in range(8):
+            with lock:
+                # 读下一块之前，已写出但还没转写完的块不超过 max_workers
+                assert len(produced) - len(transcribed) <= 2
+                produced.append(index)
+            yield float(index), float(index + 1), bytes(chunk_bytes)
+    monkeypatch.setattr(streaming, 'iter_pcm_chunks', fake_chunks)
+
+    def slow_transcribe(path):
+        time.sleep(0.02)
+        with lock:
+            transcribed.append(path)
+        return [{"start": 0.2, "end": 0.8, "text": f"chunk {len(transcribed)}"}]
+
+    segments = list(streaming.stream_transcribe('http://example.invalid/a.m4a', slow_transcribe,
+                                                chunk_seconds=1, overlap=0, max_workers=2))
+
+    assert [seg['start'] for seg in segments] == [index + 0.2 for index in range(8)]
+    assert len(transcribed) == 8
@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+from translation import BatchTranslator, MultiTranslator, pack_batches, target_languages
+from translators import CallableTranslator
+
+
+def upper(text):
+    return text.upper()
+
+
+def translator(fn=upper, **kwargs):
+    kwargs.setdefault('backoff', 0)
+    return BatchTranslator(CallableTranslator(fn), **kwargs)
+
+
+def segments(*texts):
+    return [{"start": float(i), "end": float(i + 1), "text": text} for i, text in enumerate(texts)]
+
+
+def test_pack_batches_respects_char_limit():
+    texts = ['aaaa', 'bbbb', 'cccc', 'dd']
+    # 'aaaa\nbbbb' = 9 个字符
+    assert pack_batches(texts, max_chars=9, max_segments=10) == [[0, 1], [2, 3]]
+
+
+def test_pack_batches_respects_segment_limit_and_skips_empty():
+    assert pack_batches(['a', '', 'b', 'c', 'd'], max_chars=100, max_segments=2) == [[0, 2], [3, 4]]
+
+
+def test_pack_batches_gives_long_text_its_own_batch():
+    assert pack_batches(['a', 'x' * 50, 'b'], max_chars=10, max_segments=10) == [[0], [1], [2]]
+
+
+def test_batches_are_joined_into_one_call():
+    calls = []
+
+    def fake(text):
+        calls.append(text)
+        return text.upper()
+
+    result = translator(fake).translate_segments(segments('one', 'two', 'three'))
+
+    assert calls == ['one\ntwo\nthree']
+    assert [seg['translation'] for seg in result] == ['ONE', 'TWO', 'THREE']
+    assert {seg['translation_status'] for seg in result} == {'ok'}
+
+
+def test_line_count_mismatch_falls_back_to_per_segment():
+    calls = []
+
+    def merges_lines(text):
+        calls.append(text)
+        # 拼接请求里的两行被合并成一行
+        return text.replace('\n', ' ').upper()
+
+    result = translator(merges_lines).translate_segments(segments('one', 'two'))
+
+    assert calls == ['one\ntwo', 'one', 'two']
+    assert [seg['translation'] for seg in result] == ['ONE', 'TWO']
+
+
+def test_failing_segment_keeps_source_text():
+    attempts = []
+    lock = threading.Lock()
+
+    def flaky(text):
+        with lock:
+            attempts.append(text)
+        if 'bad' in text:
+            raise RuntimeError('quota')
+        return text.upper()
+
+    result = translator(flaky, retries=3).translate_segments(segments('good', ' bad '))
+
+    assert result[0] == {"start": 0.0, "end": 1.0, "text": "good", "translation": "GOOD",
+                         "translation_status": "ok"}
+    assert result[1]['translation'] == 'bad'
+    assert result[1]['translation_status'] == 'failed'
+    # 批量调用一次，之后每条逐个调用；bad 共重试 retries + 1 次
+    assert attempts.count('bad') == 4
+
+
+def test_duplicates_translated_once_and_existing_translations_kept():
+    calls = []
+
+    def fake(text):
+        calls.append(text)
+        return text.upper()
+
+    segs = segments('hello', 'hello', 'bye')
+    segs[2]['translation'] = 'ciao'
+
+    result = translator(fake).translate_segments(segs)
+
+    assert calls == ['hello']
+    assert [seg['translation'] for seg in result] == ['HELLO', 'HELLO', 'ciao']
+
+
+def test_multi_translator_marks_segment_failed_if_any_language_fails():
+    def broken(text):
+        raise RuntimeError('down')
+
+    multi = MultiTranslator({'zh-cn': translator(upper), 'ja': translator(broken, retries=0)})
+
+    result = multi.translate_segments(segments('hi'))
+
+    assert result[0]['translation'] == 'HI'
+    assert result[0]['translations'] == {'zh-cn': 'HI', 'ja': 'hi'}
+    assert result[0]['translation_status'] == 'failed'
+
+
+def test_target_languages():
+    assert target_languages('zh-CN, ja ,zh-cn') == ['zh-cn', 'ja']
+    with pytest.raises(ValueError):
+        target_languages([' '])
@@ -0,0 +1,110 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from upload_store import MIN_PART_SIZE, UploadStore, parse_sha256
+from uploads import UploadError
+
+DATA = os.urandom(MIN_PART_SIZE * 2 + 1000)
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / 'store'))
+
+
+def parts(session):
+    size = session['part_size']
+    return [DATA[i * size:(i + 1) * size] for i in range(session['part_count'])]
+
+
+def put(store, session, part, data, expected_sha256=None):
+    return store.put_part(session['upload_id'], part, io.BytesIO(data), len(data), expected_sha256=expected_sha256)
+
+
+def test_init_part_complete_checkout(store, tmp_path):
+    session = store.init('talk.mp3', len(DATA), sha256=SHA256.upper(), part_size=MIN_PART_SIZE)
+    assert session['part_count'] == 3
+    assert session['received_parts'] == []
+
+    chunks = parts(session)
+    # 顺序无关；断线后重新 init 会报告已收到的分片
+    put(store, session, 2, chunks[2])
+    put(store, session, 0, chunks[0], expected_sha256=hashlib.sha256(chunks[0]).hexdigest())
+    assert store.init('talk.mp3', len(DATA), sha256=SHA256, part_size=MIN_PART_SIZE)['received_parts'] == [0, 2]
+    put(store, session, 1, chunks[1])
+
+    assert store.complete(session['upload_id']) == {"complete": True, "sha256": SHA256, "size": len(DATA)}
+    # 同样内容再次 init 直接完成，不用传输
+    assert store.init('again.mp3', len(DATA), sha256=SHA256)['complete'] is True
+
+    path = store.checkout(SHA256, upload_dir=str(tmp_path))
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+    os.remove(path)
+    assert store.blob_path(SHA256) is not None
+
+
+def test_complete_with_missing_part(store):
+    session = store.init('talk.mp3', len(DATA), part_size=MIN_PART_SIZE)
+    put(store, session, 0, parts(session)[0])
+
+    with pytest.raises(UploadError) as error:
+        store.complete(session['upload_id'])
+    assert error.value.status == 409
+    assert 'missing parts: [1, 2]' in str(error.value)
+
+
+def test_part_checksum_mismatch(store):
+    session = store.init('talk.mp3', len(DATA), part_size=MIN_PART_SIZE)
+
+    with pytest.raises(UploadError) as error:
+        put(store, session, 0, parts(session)[0], expected_sha256='0' * 64)
+    assert error.value.status == 422
+    assert store.status(session['upload_id'])['received_parts'] == []
+
+
+def test_file_checksum_mismatch(store):
+    wrong = hashlib.sha256(b'something else').hexdigest()
+    session = store.init('talk.mp3', len(DATA), sha256=wrong, part_size=MIN_PART_SIZE)
+    for part, data in enumerate(parts(session)):
+        put(store, session, part, data)
+
+    with pytest.raises(UploadError) as error:
+        store.complete(session['upload_id'])
+    assert error.value.status == 422
+    assert store.blob_path(SHA256) is None
+    assert store.blob_path(wrong) is None
+
+
+def test_repeated_complete_returns_the_same_result(store):
+    session = store.init('talk.mp3', len(DATA), part_size=MIN_PART_SIZE)
+    for part, data in enumerate(parts(session)):
+        put(store, session, part, data)
+
+    first = store.complete(session['upload_id'])
+    assert store.complete(session['upload_id']) == first
+    assert store.status(session['upload_id']) == first
+    with pytest.raises(UploadError) as error:
+        put(store, session, 0, parts(session)[0])
+    assert error.value.status == 409
+
+
+def test_checkout_unknown_hash(store):
+    with pytest.raises(UploadError) as error:
+        store.checkout('a' * 64)
+    assert error.value.status == 404
+
+
+@pytest.mark.parametrize('value', [None, 123, ['a' * 64], 'abc', 'g' * 64])
+def test_parse_sha256_rejects_non_hex(value):
+    with pytest.raises(UploadError) as error:
+        parse_sha256(value)
+    assert error.value.status == 400
+
+
+def test_parse_sha256_lowercases():
+    assert parse_sha256('A' * 64) == 'a' * 64
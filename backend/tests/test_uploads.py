@@ -0,0 +1,73 @@
+import hashlib
+import io
+
+import pytest
+
+from uploads import UploadError, parse_boundary, parse_multipart_stream, save_stream
+
+BOUNDARY = '----formboundaryXYZ'
+
+
+class TrickleStream:
+    """Returns at most `block` bytes per read, like a slow socket"""
+
+    def __init__(self, data: bytes, block: int):
+        self._data = io.BytesIO(data)
+        self.block = block
+
+    def read(self, size: int = -1) -> bytes:
+        return self._data.read(min(size, self.block) if size >= 0 else self.block)
+
+
+def multipart_body(fields, files) -> bytes:
+    body = b'preamble\r\n'
+    for name, value in fields.items():
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                 f'{value}\r\n').encode()
+    for name, (filename, data) in files.items():
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + b'\r\n'
+    return body + f'--{BOUNDARY}--\r\nepilogue'.encode()
+
+
+# 内容里有 CRLF、"--" 和几乎完整的边界，必须原样保留
+AUDIO = (b'\x00\xff\r\n--' + BOUNDARY[:-1].encode() + b'\r\n' + bytes(range(256)) * 300)
+
+
+@pytest.mark.parametrize('block', [1, 3, 7, 64, 65536])
+def test_multipart_parsed_at_any_block_size(tmp_path, block):
+    body = multipart_body({'api_key': 'sk-test', 'url': ''}, {'audio': ('talk.M4A', AUDIO)})
+
+    fields, files = parse_multipart_stream(TrickleStream(body, block), len(body), BOUNDARY,
+                                           upload_dir=str(tmp_path))
+
+    assert fields == {'api_key': 'sk-test', 'url': ''}
+    uploaded = files['audio']
+    assert uploaded.filename == 'talk.M4A'
+    assert uploaded.path.endswith('.m4a')
+    assert uploaded.size == len(AUDIO)
+    assert uploaded.sha256 == hashlib.sha256(AUDIO).hexdigest()
+    with open(uploaded.path, 'rb') as f:
+        assert f.read() == AUDIO
+
+
+def test_truncated_multipart_removes_partial_file(tmp_path):
+    body = multipart_body({}, {'audio': ('a.mp3', AUDIO)})[:-200]
+
+    with pytest.raises(UploadError):
+        parse_multipart_stream(io.BytesIO(body), len(body), BOUNDARY, upload_dir=str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parse_boundary():
+    assert parse_boundary(f'multipart/form-data; boundary="{BOUNDARY}"') == BOUNDARY
+    with pytest.raises(UploadError):
+        parse_boundary('multipart/form-data')
+
+
+def test_save_stream_rejects_oversized_upload(tmp_path, monkeypatch):
+    monkeypatch.setenv('UPLOAD_MAX_BYTES', '10')
+
+    with pytest.raises(UploadError) as error:
+        save_stream(io.BytesIO(b'x' * 11), 11, 'a.mp3', upload_dir=str(tmp_path))
+    assert error.value.status == 413
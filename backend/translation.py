@@ -0,0 +1,313 @@
+"""
+批量翻译
+
+把多个片段用换行拼成一次请求发送，再按行拆回对应的片段下标。
+某一批失败（异常或拆分后行数对不上）时，只对这一批逐条重新翻译。
+各批在有上限的线程池里并发执行，所有请求共用一个令牌桶限速，
+逐条翻译时按指数退避重试，最终失败的片段在输出里标记出来。
+发请求之前先查翻译记忆，同一请求里重复的句子也只翻译一次。
+一份转写要翻成多种语言时，MultiTranslator 让各目标语言的 BatchTranslator 同时运行。
+"""
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from translation_memory import TranslationMemory, get_translation_memory, normalize_text
+from translators import TranslatorBackend, create_translator
+
+SEGMENT_DELIMITER = '\n'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 源语言写 auto 时由 Whisper 自动识别，翻译接口也自动检测
+AUTO_LANGUAGE = 'auto'
+
+
+def clean_text(text: str) -> str:
+    """Collapse whitespace so a segment never contains the delimiter itself"""
+    return _WHITESPACE_RE.sub(' ', text or '').strip()
+
+
+def pack_batches(texts: List[str], max_chars: int, max_segments: int) -> List[List[int]]:
+    """Group segment indexes into batches bounded by joined length and count
+
+    Empty texts are skipped; an over-long text gets a batch of its own.
+    """
+    batches = []
+    current = []
+    current_len = 0
+    for index, text in enumerate(texts):
+        if not text:
+            continue
+        added = len(text) + (len(SEGMENT_DELIMITER) if current else 0)
+        if current and (current_len + added > max_chars or len(current) >= max_segments):
+            batches.append(current)
+            current = []
+            current_len = 0
+            added = len(text)
+        current.append(index)
+        current_len += added
+    if current:
+        batches.append(current)
+    return batches
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class BatchTranslator:
+    def __init__(self, backend: TranslatorBackend, max_chars: Optional[int] = None,
+                 max_segments: int = 50, max_workers: int = 4,
+                 rate_limit: Optional[float] = None, retries: int = 3, backoff: float = 0.5,
+                 memory: Optional[TranslationMemory] = None):
+        self.backend = backend
+        self.memory = memory
+        self.max_chars = max_chars or backend.max_chars
+        self.max_segments = max_segments
+        self.max_workers = max(1, max_workers)
+        self.retries = retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+
+    @classmethod
+    def from_env(cls, backend: TranslatorBackend) -> 'BatchTranslator':
+        """Build from TRANSLATE_* environment variables"""
+        return cls(
+            backend,
+            max_chars=int(os.environ.get('TRANSLATE_BATCH_CHARS', 0)) or None,
+            max_segments=int(os.environ.get('TRANSLATE_BATCH_SEGMENTS', 50)),
+            max_workers=int(os.environ.get('TRANSLATE_CONCURRENCY', 4)),
+            rate_limit=float(os.environ.get('TRANSLATE_RATE', 0)) or None,
+            retries=int(os.environ.get('TRANSLATE_RETRIES', 3)),
+            backoff=float(os.environ.get('TRANSLATE_BACKOFF', 0.5)),
+            memory=get_translation_memory(),
+        )
+
+    def _call(self, text: str) -> str:
+        if self.bucket is not None:
+            self.bucket.acquire()
+        return self.backend.translate(text)
+
+    def _translate_batch(self, texts: List[str]) -> List[str]:
+        if len(texts) == 1:
+            return [self._call(texts[0])]
+        if self.backend.batched:
+            # 本地模型一次处理整批句子，不需要拼接再拆分
+            if self.bucket is not None:
+                self.bucket.acquire()
+            return self.backend.translate_batch(texts)
+        joined = self._call(SEGMENT_DELIMITER.join(texts))
+        parts = [part.strip() for part in (joined or '').split(SEGMENT_DELIMITER)]
+        parts = [part for part in parts if part]
+        if len(parts) != len(texts):
+            raise ValueError(f"batch split mismatch: sent {len(texts)} lines, got {len(parts)}")
+        return parts
+
+    def _translate_one(self, text: str) -> Optional[str]:
+        """Translate a single text with exponential-backoff retries"""
+        for attempt in range(self.retries + 1):
+            try:
+                return self._call(text)
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"Translation error after {attempt + 1} attempts: {e}")
+                    return None
+                delay = self.backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+                print(f"Translation error ({e}), retrying in {delay:.1f}s")
+                if delay > 0:
+                    time.sleep(delay)
+
+    def _run_batch(self, batch: List[int], cleaned: List[str]) -> Dict[int, Optional[str]]:
+        batch_texts = [cleaned[i] for i in batch]
+        try:
+            return dict(zip(batch, self._translate_batch(batch_texts)))
+        except Exception as e:
+            # 整批失败时只对这一批逐条重试
+            print(f"Batch of {len(batch)} failed ({e}), falling back to per-segment")
+            return {index: self._translate_one(cleaned[index]) for index in batch}
+
+    def translate_texts(self, texts: List[str]) -> List[Optional[str]]:
+        """Translate texts in concurrent batches; failed entries come back as None"""
+        cleaned = [clean_text(t) for t in texts]
+        results: List[Optional[str]] = ['' if not t else None for t in cleaned]
+
+        # 相同的句子只翻译一次，结果回填到所有出现的位置
+        occurrences: Dict[str, List[int]] = {}
+        for index, text in enumerate(cleaned):
+            if text:
+                occurrences.setdefault(normalize_text(text), []).append(index)
+
+        if self.memory is not None and occurrences:
+            remembered = self.memory.lookup_many(occurrences, self.backend.source, self.backend.target)
+            for key, translation in remembered.items():
+                for index in occurrences.pop(key):
+                    results[index] = translation
+            print(f"翻译记忆命中 {len(remembered)} 条，需要翻译 {len(occurrences)} 条")
+
+        unique = [''] * len(cleaned)
+        for indexes in occurrences.values():
+            unique[indexes[0]] = cleaned[indexes[0]]
+
+        batches = pack_batches(unique, self.max_chars, self.max_segments)
+        if batches:
+            workers = min(self.max_workers, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._run_batch, batch, cleaned) for batch in batches]
+                for done, future in enumerate(as_completed(futures), 1):
+                    for index, translation in future.result().items():
+                        results[index] = translation
+                    print(f"翻译进度: {done}/{len(batches)} 批")
+
+        new_pairs = []
+        for indexes in occurrences.values():
+            translation = results[indexes[0]]
+            for index in indexes[1:]:
+                results[index] = translation
+            if translation is not None:
+                new_pairs.append((cleaned[indexes[0]], translation))
+        if self.memory is not None and new_pairs:
+            self.memory.store_many(new_pairs, self.backend.source, self.backend.target)
+        return results
+
+    def translate_segments(self, segments: List[Dict]) -> List[Dict]:
+        """Return new {start, end, text, translation, translation_status} dicts in input order
+
+        Segments that already carry a translation (e.g. aligned from YouTube's
+        translated captions) are passed through without a translation call.
+        A segment that still fails after retries keeps its source text as the
+        translation and is marked translation_status="failed".
+        """
+        todo = [i for i, seg in enumerate(segments) if not seg.get('translation')]
+        translations: List[Optional[str]] = [seg.get('translation') for seg in segments]
+        if todo:
+            for i, translation in zip(todo, self.translate_texts([segments[i]['text'] for i in todo])):
+                translations[i] = translation
+        translated = []
+        for seg, translation in zip(segments, translations):
+            failed = translation is None
+            translated.append({
+                "start": seg['start'],
+                "end": seg['end'],
+                "text": seg['text'].strip(),
+                "translation": seg['text'].strip() if failed else translation,
+                "translation_status": "failed" if failed else "ok",
+            })
+        return translated
+
+_shared_translators: Dict[Tuple[str, str, str], BatchTranslator] = {}
+_shared_translators_lock = threading.Lock()
+
+
+def get_batch_translator(backend: str, source: str = 'en', target: str = 'zh-cn') -> BatchTranslator:
+    """Process-wide BatchTranslator per (backend, source, target)
+
+    Requests share the translator client (and its connection pool) and the
+    TRANSLATE_RATE token bucket instead of building their own.
+    """
+    key = (backend, source, target)
+    translator = _shared_translators.get(key)
+    if translator is None:
+        with _shared_translators_lock:
+            translator = _shared_translators.get(key)
+            if translator is None:
+                translator = BatchTranslator.from_env(create_translator(backend, source=source, target=target))
+                _shared_translators[key] = translator
+    return translator
+
+
+def source_language(value: Optional[str], default: str = 'en') -> str:
+    """Normalized source language; 'auto' (or AUTO_LANGUAGE) means detect it"""
+    return (value or os.environ.get('SOURCE_LANGUAGE') or default).strip().lower()
+
+
+def asr_language(source: str) -> Optional[str]:
+    """Language hint for Whisper; None lets it detect the spoken language"""
+    return None if source == AUTO_LANGUAGE else source
+
+
+def target_languages(value: Union[str, Iterable[str], None], default: str = 'zh-cn') -> List[str]:
+    """Requested target languages in order, deduplicated
+
+    Accepts a list or a comma-separated string; falls back to TARGET_LANGUAGES
+    (or `default`). At most MAX_TARGET_LANGUAGES are kept.
+    """
+    if not value:
+        value = os.environ.get('TARGET_LANGUAGES') or default
+    if isinstance(value, str):
+        value = value.split(',')
+    targets: List[str] = []
+    for lang in value:
+        lang = str(lang).strip().lower()
+        if lang and lang not in targets:
+            targets.append(lang)
+    if not targets:
+        raise ValueError("At least one target language is required")
+    limit = int(os.environ.get('MAX_TARGET_LANGUAGES', 5))
+    if len(targets) > limit:
+        raise ValueError(f"At most {limit} target languages are supported, got {len(targets)}")
+    return targets
+
+
+class MultiTranslator:
+    """Translate the same segments into several languages concurrently
+
+    The first target is the primary language: its text stays in `translation`
+    so single-language clients see no change. With more than one target each
+    segment also carries `translations` {lang: text}, and is marked failed if
+    any language failed.
+    """
+
+    def __init__(self, translators: Dict[str, BatchTranslator]):
+        self.translators = translators
+        self.targets = list(translators)
+
+    @classmethod
+    def for_targets(cls, backend: str, source: str, targets: List[str]) -> 'MultiTranslator':
+        return cls({target: get_batch_translator(backend, source, target) for target in targets})
+
+    def _translate(self, target: str, segments: List[Dict]) -> List[Dict]:
+        # 已对齐的 YouTube 翻译字幕按语言放在 seg['translations'] 里，交给对应语言透传
+        prepared = [dict(seg, translation=(seg.get('translations') or {}).get(target) or
+                         (seg.get('translation') if target == self.targets[0] else None))
+                    for seg in segments]
+        return self.translators[target].translate_segments(prepared)
+
+    def translate_segments(self, segments: List[Dict]) -> List[Dict]:
+        if len(self.targets) == 1:
+            return self._translate(self.targets[0], segments)
+        with ThreadPoolExecutor(max_workers=len(self.targets)) as executor:
+            futures = {target: executor.submit(self._translate, target, segments) for target in self.targets}
+            results = {target: future.result() for target, future in futures.items()}
+        merged = []
+        for index, seg in enumerate(results[self.targets[0]]):
+            per_language = [results[target][index] for target in self.targets]
+            merged.append(dict(
+                seg,
+                translations={target: result['translation'] for target, result in zip(self.targets, per_language)},
+                translation_status='failed' if any(r['translation_status'] == 'failed' for r in per_language) else 'ok',
+            ))
+        return merged
@@ -0,0 +1,186 @@
+"""
+翻译记忆
+
+自动字幕里大量重复的句子（开场白、"记得订阅"、口头禅）只翻译一次。
+以 规范化原文 (Unicode NFC、合并空白，保留大小写) + 语言对 为键存进 SQLite，超过条数上限时按最近使用时间淘汰。
+
+预热:
+    python translation_memory.py warm transcript1.json transcript2.json
+    python translation_memory.py warm --from-result-cache
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+# 1: 键区分大小写 ("US" 和 "us" 的译文不同)，旧版本按小写存的条目作废
+SCHEMA_VERSION = 1
+
+
+def normalize_text(text: str) -> str:
+    """Memory / dedupe key: NFC form with collapsed whitespace; case is kept"""
+    return _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFC', text or '')).strip()
+
+
+class TranslationMemory:
+    def __init__(self, db_path: str, max_entries: int = 200000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evictions': 0}
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS memory ('
+            'source_text TEXT NOT NULL, lang_pair TEXT NOT NULL, translation TEXT NOT NULL, '
+            'last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, '
+            'PRIMARY KEY (source_text, lang_pair))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS memory_last_used ON memory (last_used)')
+        if self._db.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            self._db.execute('DELETE FROM memory')
+            self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._db.commit()
+
+    def lookup_many(self, texts: Iterable[str], source: str, target: str) -> Dict[str, str]:
+        """Return {normalized text: translation} for the texts already in memory"""
+        lang_pair = f"{source}>{target}"
+        keys = list({normalize_text(t) for t in texts if t})
+        found = {}
+        with self._lock:
+            # SQLite 默认最多 999 个绑定参数
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._db.execute(
+                    f'SELECT source_text, translation FROM memory '
+                    f'WHERE lang_pair = ? AND source_text IN ({placeholders})',
+                    [lang_pair] + chunk,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                self._db.executemany(
+                    'UPDATE memory SET last_used = ?, hits = hits + 1 WHERE source_text = ? AND lang_pair = ?',
+                    [(time.time(), key, lang_pair) for key in found],
+                )
+                self._db.commit()
+            self._stats['hits'] += len(found)
+            self._stats['misses'] += len(keys) - len(found)
+        return found
+
+    def store_many(self, pairs: Iterable[Tuple[str, str]], source: str, target: str):
+        lang_pair = f"{source}>{target}"
+        now = time.time()
+        rows = [(normalize_text(src), lang_pair, dst, now) for src, dst in pairs if src and dst]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany(
+                'INSERT INTO memory (source_text, lang_pair, translation, last_used) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (source_text, lang_pair) DO UPDATE SET '
+                'translation = excluded.translation, last_used = excluded.last_used',
+                rows,
+            )
+            self._stats['stored'] += len(rows)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        count = self._db.execute('SELECT COUNT(*) FROM memory').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # 一次多删一些，避免每次写入都触发淘汰
+        excess = count - int(self.max_entries * 0.9)
+        self._db.execute(
+            'DELETE FROM memory WHERE rowid IN (SELECT rowid FROM memory ORDER BY last_used LIMIT ?)',
+            (excess,),
+        )
+        self._stats['evictions'] += excess
+
+    def warm_from_segments(self, segments: Iterable[Dict], source: str, target: str) -> int:
+        """Load text/translation pairs from past transcript segments"""
+        pairs = [
+            (seg.get('text', ''), seg.get('translation', ''))
+            for seg in segments
+            if seg.get('translation_status', 'ok') == 'ok'
+            and seg.get('translation') and seg.get('translation') != seg.get('text')
+        ]
+        self.store_many(pairs, source, target)
+        return len(pairs)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM memory').fetchone()[0]
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['entries'] = entries
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_translation_memory = None
+_translation_memory_lock = threading.Lock()
+
+
+def get_translation_memory() -> Optional[TranslationMemory]:
+    """Process-wide memory from TRANSLATION_MEMORY_* variables; None when disabled"""
+    global _translation_memory
+    if os.environ.get('TRANSLATION_MEMORY', '1') == '0':
+        return None
+    if _translation_memory is None:
+        with _translation_memory_lock:
+            if _translation_memory is None:
+                _translation_memory = TranslationMemory(
+                    db_path=os.environ.get('TRANSLATION_MEMORY_DB')
+                    or os.path.join(tempfile.gettempdir(), 'translation_memory.db'),
+                    max_entries=int(os.environ.get('TRANSLATION_MEMORY_SIZE', 200000)),
+                )
+    return _translation_memory
+
+
+def _transcripts_from_files(paths: List[str]) -> Iterable[Dict]:
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            yield json.load(f)
+
+
+def _transcripts_from_result_cache() -> Iterable[Dict]:
+    from result_cache import get_result_cache
+    return get_result_cache().iter_results()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translation memory tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+    warm = sub.add_parser('warm', help="pre-warm from past transcript JSON files")
+    warm.add_argument('files', nargs='*', help="transcript JSON files ({title, segments})")
+    warm.add_argument('--from-result-cache', action='store_true', help="also load every cached transcript")
+    warm.add_argument('--source', default='en')
+    warm.add_argument('--target', default='zh-cn')
+    sub.add_parser('stats', help="print entry count")
+    args = parser.parse_args()
+
+    memory = get_translation_memory()
+    if memory is None:
+        parser.error("translation memory is disabled (TRANSLATION_MEMORY=0)")
+
+    if args.command == 'warm':
+        transcripts = list(_transcripts_from_files(args.files))
+        if args.from_result_cache:
+            transcripts.extend(_transcripts_from_result_cache())
+        loaded = sum(memory.warm_from_segments(t.get('segments', []), args.source, args.target)
+                     for t in transcripts)
+        print(f"Loaded {loaded} segment pairs from {len(transcripts)} transcripts")
+    print(json.dumps(memory.stats()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+翻译后端适配层
+
+把 deep-translator、googletrans、本地 OPUS-MT 等不同的翻译实现统一成 translate(text) -> str，
+批量翻译、缓存、重试都在 translation.py 里基于这个接口实现。
+本地模型这类能一次处理多句的后端设置 batched = True，并实现 translate_batch。
+部署时用 TRANSLATOR_BACKEND 选择后端。
+"""
+import os
+import threading
+from typing import Callable, List
+
+
+class TranslatorBackend:
+    name = 'base'
+    # 单次请求允许的最大字符数（Google 网页接口上限约 5000）
+    max_chars = 4500
+    # True 时 BatchTranslator 把一批句子作为列表交给 translate_batch，而不是用换行拼成一段文本
+    batched = False
+
+    def __init__(self, source: str = 'en', target: str = 'zh-cn'):
+        self.source = source
+        self.target = target
+
+    def translate(self, text: str) -> str:
+        raise NotImplementedError
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        return [self.translate(text) for text in texts]
+
+
+class DeepGoogleTranslator(TranslatorBackend):
+    """deep_translator.GoogleTranslator, used by the serverless API"""
+    name = 'google'
+
+    def __init__(self, source: str = 'en', target: str = 'zh-cn'):
+        super().__init__(source, target)
+        from deep_translator import GoogleTranslator
+        self._factory = lambda: GoogleTranslator(source=source, target=target)
+        # GoogleTranslator.translate 会改写实例上的请求参数，并发批次各用各线程的实例
+        self._local = threading.local()
+
+    def translate(self, text: str) -> str:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._factory()
+        return client.translate(text)
+
+
+class GoogletransTranslator(TranslatorBackend):
+    """googletrans.Translator, used by the FastAPI backends (keeps one pooled httpx client)"""
+    name = 'googletrans'
+
+    def __init__(self, source: str = 'en', target: str = 'zh-cn'):
+        super().__init__(source, target)
+        from googletrans import Translator
+        self._client = Translator()
+
+    def translate(self, text: str) -> str:
+        return self._client.translate(text, src=self.source, dest=self.target).text
+
+
+class OpusMTTranslator(TranslatorBackend):
+    """Local Marian/OPUS-MT model converted to CTranslate2 (int8 on CPU); no network calls
+
+    Convert once with:
+        ct2-transformers-converter --model Helsinki-NLP/opus-mt-en-zh --output_dir opus-mt-en-zh \\
+            --quantization int8 --copy_files source.spm target.spm
+    """
+    name = 'opus-mt'
+    batched = True
+    # 一批句子的总字符数上限，实际批大小由 TRANSLATE_BATCH_SEGMENTS 控制
+    max_chars = 20000
+
+    # 多目标语言模型需要在源文前加目标语言标记
+    TARGET_TOKENS = {
+        'zh-cn': '>>cmn_Hans<<',
+        'zh-tw': '>>cmn_Hant<<',
+    }
+
+    def __init__(self, source: str = 'en', target: str = 'zh-cn'):
+        if source == 'auto':
+            # 本地模型固定语言对，没法自动识别源语言；用 OPUS_MT_SOURCE 指定
+            source = os.environ.get('OPUS_MT_SOURCE', '')
+            if not source:
+                raise ValueError("opus-mt cannot auto-detect the source language; "
+                                 "set SOURCE_LANGUAGE or OPUS_MT_SOURCE (e.g. 'en')")
+        super().__init__(source, target)
+        import ctranslate2
+        import sentencepiece
+
+        # 多个目标语言各用一个模型时，OPUS_MT_MODEL_DIR 里可以写 {source} / {target} 占位符
+        model_dir = os.environ.get('OPUS_MT_MODEL_DIR', 'opus-mt-{source}-{target}').format(
+            source=source, target=target.split('-')[0])
+        self._translator = ctranslate2.Translator(
+            model_dir,
+            device='cpu',
+            compute_type=os.environ.get('OPUS_MT_COMPUTE_TYPE', 'int8'),
+            # inter_threads 个批次并行执行，每批用 intra_threads 个线程
+            inter_threads=int(os.environ.get('OPUS_MT_WORKERS', 2)),
+            intra_threads=int(os.environ.get('OPUS_MT_THREADS', 0)),
+        )
+        self._source_spm = sentencepiece.SentencePieceProcessor(model_file=os.path.join(model_dir, 'source.spm'))
+        self._target_spm = sentencepiece.SentencePieceProcessor(model_file=os.path.join(model_dir, 'target.spm'))
+        token = os.environ.get('OPUS_MT_TARGET_TOKEN', self.TARGET_TOKENS.get(target.lower(), ''))
+        self._prefix = [token] if token else []
+        self._beam_size = int(os.environ.get('OPUS_MT_BEAM_SIZE', 2))
+
+    def translate(self, text: str) -> str:
+        return self.translate_batch([text])[0]
+
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        tokens = [self._prefix + self._source_spm.encode(text, out_type=str) + ['</s>'] for text in texts]
+        results = self._translator.translate_batch(
+            tokens,
+            beam_size=self._beam_size,
+            max_batch_size=int(os.environ.get('OPUS_MT_MAX_BATCH', 32)),
+        )
+        return [self._target_spm.decode(result.hypotheses[0]) for result in results]
+
+
+class CallableTranslator(TranslatorBackend):
+    """Wrap a plain function; handy for local fakes"""
+    name = 'callable'
+
+    def __init__(self, fn: Callable[[str], str], source: str = 'en', target: str = 'zh-cn',
+                 max_chars: int = 4500):
+        super().__init__(source, target)
+        self._fn = fn
+        self.max_chars = max_chars
+
+    def translate(self, text: str) -> str:
+        return self._fn(text)
+
+
+BACKENDS = {
+    DeepGoogleTranslator.name: DeepGoogleTranslator,
+    GoogletransTranslator.name: GoogletransTranslator,
+    OpusMTTranslator.name: OpusMTTranslator,
+}
+
+
+def backend_from_env(default: str) -> str:
+    """Translator backend for this deployment: TRANSLATOR_BACKEND, else the entry point's default"""
+    return os.environ.get('TRANSLATOR_BACKEND', default)
+
+
+def create_translator(name: str, source: str = 'en', target: str = 'zh-cn') -> TranslatorBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown translator backend: {name} (available: {', '.join(BACKENDS)})")
+    return BACKENDS[name](source=source, target=target)
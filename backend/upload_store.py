@@ -0,0 +1,292 @@
+"""
+可续传的分片上传
+
+协议: init -> 上传第 N 片 (可重试) -> complete。
+每片单独计算 SHA-256 并落盘，complete 时按顺序拼接，同时计算整个文件的 SHA-256。
+拼好的文件以内容哈希命名保存，之后 init 时带上同一个哈希就直接跳过传输；
+这个哈希也是转写结果缓存的 key (sha256:<hash>)。
+
+分片、拼好的文件和 checkout 都在本机的 UPLOAD_STORE_DIR 里，没有共享存储:
+init、各个分片、complete 和随后的转写请求必须落到同一个实例上，且磁盘要在请求之间保留。
+适用于单实例、带持久磁盘的部署 (Render/Railway/docker-compose)。Vercel 这类无服务器
+部署每个请求可能在不同实例上执行，没有显式配置 UPLOAD_STORE_DIR 时直接拒绝，
+不会随机报 "Unknown or expired upload_id"。
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, Optional
+
+from uploads import UploadError, max_upload_bytes, save_stream
+
+DEFAULT_PART_SIZE = 4 * 1024 * 1024
+MIN_PART_SIZE = 256 * 1024
+MAX_PART_SIZE = 32 * 1024 * 1024
+
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_EXT_RE = re.compile(r'^\.[a-z0-9]{1,5}$')
+
+
+def parse_sha256(value) -> str:
+    """Client-supplied content hash as lowercase hex; anything else is a 400"""
+    sha256 = value.lower() if isinstance(value, str) else ''
+    if not _SHA256_RE.match(sha256):
+        raise UploadError("sha256 must be 64 hex characters")
+    return sha256
+
+
+class UploadStore:
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 * 1024 * 1024, ttl: float = 24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.parts_dir = os.path.join(root, 'parts')
+        self.blobs_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.parts_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+    # ---- 内部工具 ----
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if not _UPLOAD_ID_RE.match(upload_id or ''):
+            raise UploadError("Invalid upload_id")
+        return os.path.join(self.parts_dir, upload_id)
+
+    def _load_manifest(self, upload_id: str) -> Dict:
+        path = os.path.join(self._upload_dir(upload_id), 'manifest.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Unknown or expired upload_id", status=404)
+
+    @staticmethod
+    def _write_json(path: str, data: Dict):
+        # 先写临时文件再替换，并发上传分片时不会读到写了一半的 JSON
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _completed(self, upload_id: str) -> Optional[Dict]:
+        """Result of an earlier complete(), kept until the upload directory expires"""
+        try:
+            with open(os.path.join(self._upload_dir(upload_id), 'complete.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _received_parts(self, upload_id: str) -> Dict[int, Dict]:
+        received = {}
+        upload_dir = self._upload_dir(upload_id)
+        for name in os.listdir(upload_dir):
+            if name.startswith('part_') and name.endswith('.json'):
+                with open(os.path.join(upload_dir, name)) as f:
+                    meta = json.load(f)
+                received[meta['part']] = meta
+        return received
+
+    def _status(self, manifest: Dict) -> Dict:
+        received = self._received_parts(manifest['upload_id'])
+        return {
+            "upload_id": manifest['upload_id'],
+            "complete": False,
+            "size": manifest['size'],
+            "part_size": manifest['part_size'],
+            "part_count": manifest['part_count'],
+            "received_parts": sorted(received),
+        }
+
+    def blob_path(self, sha256: str) -> Optional[str]:
+        """Stored file for a content hash, if this instance already has it"""
+        if not _SHA256_RE.match(sha256 or ''):
+            return None
+        for name in os.listdir(self.blobs_dir):
+            if name.startswith(sha256):
+                path = os.path.join(self.blobs_dir, name)
+                os.utime(path)
+                return path
+        return None
+
+    def _cleanup(self):
+        """Drop stale unfinished uploads and the least recently used blobs over max_bytes"""
+        now = time.time()
+        for upload_id in os.listdir(self.parts_dir):
+            upload_dir = os.path.join(self.parts_dir, upload_id)
+            try:
+                if now - os.path.getmtime(upload_dir) > self.ttl:
+                    shutil.rmtree(upload_dir, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+        blobs = []
+        for name in os.listdir(self.blobs_dir):
+            path = os.path.join(self.blobs_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    # ---- 协议 ----
+
+    def init(self, filename: str, size: int, sha256: Optional[str] = None,
+             part_size: Optional[int] = None) -> Dict:
+        """Start (or resume) an upload
+
+        With a client-computed sha256 the upload_id is derived from it, so calling
+        init again after a dropped connection returns the parts already received,
+        and a file this store already has is reported complete without any transfer.
+        """
+        self._cleanup()
+        sha256 = parse_sha256(sha256) if sha256 else None
+        if sha256 and self.blob_path(sha256):
+            return {"complete": True, "sha256": sha256, "size": size}
+        if size <= 0:
+            raise UploadError("size must be positive")
+        if size > max_upload_bytes():
+            raise UploadError("Uploaded file is too large", status=413)
+
+        part_size = min(max(int(part_size or DEFAULT_PART_SIZE), MIN_PART_SIZE), MAX_PART_SIZE)
+        upload_id = sha256[:32] if sha256 else uuid.uuid4().hex
+        upload_dir = self._upload_dir(upload_id)
+        if self._completed(upload_id):
+            # 之前完成过，但文件已被清理，重新上传
+            shutil.rmtree(upload_dir, ignore_errors=True)
+        if os.path.exists(os.path.join(upload_dir, 'manifest.json')):
+            manifest = self._load_manifest(upload_id)
+            if manifest['size'] == size:
+                return self._status(manifest)
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+        os.makedirs(upload_dir, exist_ok=True)
+        ext = os.path.splitext(filename or '')[1].lower()
+        manifest = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "ext": ext if _EXT_RE.match(ext) else '.mp3',
+            "size": size,
+            "sha256": sha256,
+            "part_size": part_size,
+            "part_count": (size + part_size - 1) // part_size,
+            "created": time.time(),
+        }
+        self._write_json(os.path.join(upload_dir, 'manifest.json'), manifest)
+        return self._status(manifest)
+
+    def status(self, upload_id: str) -> Dict:
+        return self._completed(upload_id) or self._status(self._load_manifest(upload_id))
+
+    def put_part(self, upload_id: str, part: int, stream, length: int,
+                 expected_sha256: Optional[str] = None) -> Dict:
+        """Store part `part` (0-based); re-sending a part replaces it"""
+        if self._completed(upload_id):
+            raise UploadError("upload is already complete", status=409)
+        manifest = self._load_manifest(upload_id)
+        if not 0 <= part < manifest['part_count']:
+            raise UploadError(f"part must be between 0 and {manifest['part_count'] - 1}")
+        expected_size = min(manifest['part_size'], manifest['size'] - part * manifest['part_size'])
+        if length != expected_size:
+            raise UploadError(f"part {part} must be {expected_size} bytes, got {length}")
+
+        upload_dir = self._upload_dir(upload_id)
+        saved = save_stream(stream, length, 'part.bin', upload_dir=upload_dir)
+        if expected_sha256 and saved.sha256 != expected_sha256.lower():
+            os.remove(saved.path)
+            raise UploadError(f"part {part} checksum mismatch", status=422)
+
+        os.replace(saved.path, os.path.join(upload_dir, f'part_{part:05d}.bin'))
+        meta = {"part": part, "size": saved.size, "sha256": saved.sha256}
+        self._write_json(os.path.join(upload_dir, f'part_{part:05d}.json'), meta)
+        # 更新目录 mtime，活跃的上传不会被当作过期清理
+        os.utime(upload_dir)
+        return meta
+
+    def complete(self, upload_id: str) -> Dict:
+        """Concatenate the parts in order, hashing as we go, and keep the result by content hash
+
+        Calling it again (e.g. the client retrying after a timeout) returns the same result.
+        """
+        done = self._completed(upload_id)
+        if done:
+            return done
+        manifest = self._load_manifest(upload_id)
+        received = self._received_parts(upload_id)
+        missing = [part for part in range(manifest['part_count']) if part not in received]
+        if missing:
+            raise UploadError(f"missing parts: {missing[:20]}", status=409)
+
+        upload_dir = self._upload_dir(upload_id)
+        assembled = os.path.join(upload_dir, 'assembled' + manifest['ext'])
+        total = hashlib.sha256()
+        with open(assembled, 'wb') as out:
+            for part in range(manifest['part_count']):
+                with open(os.path.join(upload_dir, f'part_{part:05d}.bin'), 'rb') as f:
+                    while True:
+                        block = f.read(1024 * 1024)
+                        if not block:
+                            break
+                        total.update(block)
+                        out.write(block)
+        sha256 = total.hexdigest()
+        if manifest['sha256'] and manifest['sha256'] != sha256:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise UploadError("file checksum mismatch, upload again", status=422)
+
+        os.replace(assembled, os.path.join(self.blobs_dir, sha256 + manifest['ext']))
+        result = {"complete": True, "sha256": sha256, "size": manifest['size']}
+        # 分片删掉，只留下完成记录，重复的 complete 直接返回它，目录到期后一起清理
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        os.makedirs(upload_dir, exist_ok=True)
+        self._write_json(os.path.join(upload_dir, 'complete.json'), result)
+        return result
+
+    def checkout(self, sha256: str, upload_dir: Optional[str] = None) -> str:
+        """Hard-link a stored file to a private path the caller may delete when done"""
+        blob = self.blob_path(sha256)
+        if blob is None:
+            raise UploadError("Uploaded file not found, upload it again", status=404)
+        path = os.path.join(upload_dir or tempfile.gettempdir(),
+                            f'upload_{uuid.uuid4().hex[:12]}{os.path.splitext(blob)[1]}')
+        try:
+            os.link(blob, path)
+        except OSError:
+            shutil.copyfile(blob, path)
+        return path
+
+    def stats(self) -> Dict:
+        blobs = os.listdir(self.blobs_dir)
+        return {
+            "pending_uploads": len(os.listdir(self.parts_dir)),
+            "stored_files": len(blobs),
+            "stored_bytes": sum(os.path.getsize(os.path.join(self.blobs_dir, name)) for name in blobs),
+        }
+
+
+_upload_store = None
+
+
+def get_upload_store() -> UploadStore:
+    global _upload_store
+    if _upload_store is None:
+        if os.environ.get('VERCEL') and not os.environ.get('UPLOAD_STORE_DIR'):
+            raise UploadError("Resumable uploads need a single instance with a persistent UPLOAD_STORE_DIR; "
+                              "they are not available on serverless deployments", status=501)
+        _upload_store = UploadStore(
+            root=os.environ.get('UPLOAD_STORE_DIR', os.path.join(tempfile.gettempdir(), 'uploads')),
+            max_bytes=int(os.environ.get('UPLOAD_STORE_MAX_BYTES', 2 * 1024 * 1024 * 1024)),
+            ttl=float(os.environ.get('UPLOAD_TTL', 24 * 3600)),
+        )
+    return _upload_store
@@ -0,0 +1,226 @@
+"""
+音频上传的流式接收
+
+原始二进制 (application/octet-stream) 和 multipart/form-data 请求体都按固定大小的块
+读取并直接写入磁盘，边写边算 SHA-256，内存里只保留一个块加一小段边界缓冲。
+"""
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from dataclasses import dataclass
+from email.message import Message
+from typing import BinaryIO, Dict, Optional, Tuple
+
+UPLOAD_BLOCK = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+MAX_FIELD_BYTES = 1024 * 1024
+
+_EXT_RE = re.compile(r'^\.[a-z0-9]{1,5}$')
+_NAME_RE = re.compile(r'\bname="([^"]*)"')
+_FILENAME_RE = re.compile(r'\bfilename="([^"]*)"')
+
+
+class UploadError(Exception):
+    """Malformed or oversized upload; `status` is the HTTP code to answer with"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class UploadedFile:
+    path: str
+    filename: str
+    size: int
+    sha256: str
+
+
+def max_upload_bytes() -> int:
+    return int(os.environ.get('UPLOAD_MAX_BYTES', 500 * 1024 * 1024))
+
+
+def upload_path(filename: str, upload_dir: Optional[str] = None) -> str:
+    """Unique path for an uploaded file, keeping only a safe extension from the client's name"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    if not _EXT_RE.match(ext):
+        ext = '.mp3'
+    return os.path.join(upload_dir or tempfile.gettempdir(), f'upload_{uuid.uuid4().hex[:12]}{ext}')
+
+
+def parse_boundary(content_type: str) -> str:
+    message = Message()
+    message['Content-Type'] = content_type
+    boundary = message.get_param('boundary')
+    if not boundary:
+        raise UploadError("multipart/form-data request without a boundary")
+    return boundary
+
+
+class _BoundedReader:
+    """Reads at most `length` bytes so we never block waiting past the request body"""
+
+    def __init__(self, stream: BinaryIO, length: int):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size: int = UPLOAD_BLOCK) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        block = self.stream.read(min(size, self.remaining))
+        if not block:
+            raise UploadError("Request body ended early")
+        self.remaining -= len(block)
+        return block
+
+
+class _FileSink:
+    def __init__(self, filename: str, upload_dir: Optional[str]):
+        self.filename = filename
+        self.path = upload_path(filename, upload_dir)
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(self.path, 'wb')
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > max_upload_bytes():
+            raise UploadError("Uploaded file is too large", status=413)
+        self._hash.update(data)
+        self._file.write(data)
+
+    def close(self) -> UploadedFile:
+        self._file.close()
+        return UploadedFile(self.path, self.filename, self.size, self._hash.hexdigest())
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _FieldSink:
+    def __init__(self):
+        self.value = bytearray()
+
+    def write(self, data: bytes):
+        self.value.extend(data)
+        if len(self.value) > MAX_FIELD_BYTES:
+            raise UploadError("Form field is too large", status=413)
+
+
+def save_stream(stream: BinaryIO, length: int, filename: str,
+                upload_dir: Optional[str] = None) -> UploadedFile:
+    """Write a raw request body of `length` bytes to disk block by block"""
+    if length <= 0:
+        raise UploadError("Empty upload")
+    if length > max_upload_bytes():
+        raise UploadError("Uploaded file is too large", status=413)
+    reader = _BoundedReader(stream, length)
+    sink = _FileSink(filename, upload_dir)
+    try:
+        while True:
+            block = reader.read()
+            if not block:
+                break
+            sink.write(block)
+    except BaseException:
+        sink.discard()
+        raise
+    return sink.close()
+
+
+def parse_multipart_stream(stream: BinaryIO, length: int, boundary: str,
+                           upload_dir: Optional[str] = None
+                           ) -> Tuple[Dict[str, str], Dict[str, UploadedFile]]:
+    """Incrementally parse a multipart/form-data body
+
+    File parts are streamed to disk; other parts are returned as text fields.
+    Only one block plus a boundary-sized tail is held in memory at a time.
+    """
+    reader = _BoundedReader(stream, length)
+    delimiter = b'\r\n--' + boundary.encode('latin-1')
+    keep = len(delimiter) + 4
+    # 统一处理: 请求体开头的边界前补一个 CRLF
+    buffer = bytearray(b'\r\n')
+    fields = {}
+    files = {}
+    sink = None
+
+    def fill() -> bool:
+        block = reader.read()
+        buffer.extend(block)
+        return bool(block)
+
+    try:
+        # 前导内容
+        while True:
+            index = buffer.find(delimiter)
+            if index >= 0:
+                del buffer[:index + len(delimiter)]
+                break
+            del buffer[:max(0, len(buffer) - keep)]
+            if not fill():
+                raise UploadError("Multipart boundary not found")
+
+        while True:
+            while len(buffer) < 2:
+                if not fill():
+                    raise UploadError("Multipart body is truncated")
+            if buffer[:2] == b'--':
+                break
+
+            # 分段头
+            while True:
+                end = buffer.find(b'\r\n\r\n')
+                if end >= 0:
+                    break
+                if len(buffer) > MAX_HEADER_BYTES:
+                    raise UploadError("Multipart part headers are too large")
+                if not fill():
+                    raise UploadError("Multipart body is truncated")
+            headers = buffer[:end].decode('utf-8', errors='replace')
+            del buffer[:end + 4]
+            name_match = _NAME_RE.search(headers)
+            filename_match = _FILENAME_RE.search(headers)
+            name = name_match.group(1) if name_match else ''
+            if filename_match is not None:
+                sink = _FileSink(filename_match.group(1), upload_dir)
+            else:
+                sink = _FieldSink()
+
+            # 分段内容，直到下一个边界
+            while True:
+                index = buffer.find(delimiter)
+                if index >= 0:
+                    sink.write(bytes(buffer[:index]))
+                    del buffer[:index + len(delimiter)]
+                    break
+                safe = len(buffer) - keep
+                if safe > 0:
+                    sink.write(bytes(buffer[:safe]))
+                    del buffer[:safe]
+                if not fill():
+                    raise UploadError("Multipart body is truncated")
+
+            if isinstance(sink, _FileSink):
+                if name in files:
+                    os.remove(files[name].path)
+                files[name] = sink.close()
+            else:
+                fields[name] = sink.value.decode('utf-8', errors='replace')
+            sink = None
+        # 丢弃结尾的 epilogue，保证请求体被完整读完
+        while reader.read():
+            pass
+    except BaseException:
+        if isinstance(sink, _FileSink):
+            sink.discard()
+        for uploaded in files.values():
+            if os.path.exists(uploaded.path):
+                os.remove(uploaded.path)
+        raise
+
+    return fields, files
@@ -0,0 +1,237 @@
+"""
+单次 yt-dlp 元数据探测
+
+一次 extract_info 拿到标题、时长、字幕轨道和按优先级排好的音频格式，
+后续的标题、字幕、音频URL查找都从同一个 VideoInfo 读取。
+"""
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import yt_dlp
+
+YDL_HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+}
+
+PROBE_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'http_headers': YDL_HTTP_HEADERS,
+    'extractor_retries': 3,
+}
+
+ENGLISH_LANGS = ['en', 'en-US', 'en-GB']
+# 结构化格式优先，时间戳和文本不需要猜 (解析见 captions.py)
+CAPTION_EXTS = ['json3', 'srv3', 'srv2', 'srv1', 'ttml', 'vtt']
+
+# 翻译目标语言代码 (googletrans / deep-translator) -> YouTube 字幕语言代码，按优先级
+CAPTION_LANGS = {
+    'zh-cn': ['zh-Hans', 'zh-CN', 'zh'],
+    'zh-tw': ['zh-Hant', 'zh-TW'],
+    'ja': ['ja'],
+    'ko': ['ko'],
+    'es': ['es', 'es-419'],
+    'pt': ['pt', 'pt-BR', 'pt-PT'],
+}
+
+# OpenAI Whisper 能直接接收的容器格式，排序时优先
+API_FRIENDLY_EXTS = ('m4a', 'webm', 'mp3', 'mp4')
+
+_VIDEO_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([A-Za-z0-9_-]{11})'
+)
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """Return the 11-character YouTube video ID for a URL, if it has one"""
+    match = _VIDEO_ID_RE.search(url or '')
+    return match.group(1) if match else None
+
+
+@dataclass
+class AudioFormat:
+    format_id: str
+    url: str
+    ext: str
+    acodec: str = ''
+    abr: float = 0.0
+    filesize: int = 0
+    http_headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_format(cls, fmt: Dict) -> 'AudioFormat':
+        return cls(
+            format_id=str(fmt.get('format_id', '')),
+            url=fmt.get('url', ''),
+            ext=fmt.get('ext', ''),
+            acodec=fmt.get('acodec') or '',
+            abr=float(fmt.get('abr') or fmt.get('tbr') or 0),
+            filesize=int(fmt.get('filesize') or fmt.get('filesize_approx') or 0),
+            http_headers=dict(fmt.get('http_headers') or {}),
+        )
+
+
+@dataclass
+class VideoInfo:
+    video_id: Optional[str]
+    title: str
+    duration: float
+    subtitles: Dict[str, List[Dict]] = field(default_factory=dict)
+    automatic_captions: Dict[str, List[Dict]] = field(default_factory=dict)
+    audio_formats: List[AudioFormat] = field(default_factory=list)
+    webpage_url: str = ''
+    # 原始 info dict，不参与比较和打印
+    raw: Optional[Dict] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_info_dict(cls, info: Dict) -> 'VideoInfo':
+        return cls(
+            video_id=info.get('id'),
+            title=info.get('title') or 'Unknown Video',
+            duration=float(info.get('duration') or 0),
+            subtitles=_track_table(info.get('subtitles')),
+            automatic_captions=_track_table(info.get('automatic_captions')),
+            audio_formats=rank_audio_formats(info.get('formats') or []),
+            webpage_url=info.get('webpage_url') or '',
+            raw=info,
+        )
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data.pop('raw', None)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'VideoInfo':
+        data = dict(data)
+        data['audio_formats'] = [AudioFormat(**f) for f in data.get('audio_formats', [])]
+        return cls(**data)
+
+    def find_caption_track(self, langs=ENGLISH_LANGS, exts=CAPTION_EXTS) -> Tuple[Optional[str], Optional[Dict], bool]:
+        """Pick a caption track: manual subtitles first, then automatic captions
+
+        Returns (lang, track, is_automatic); lang and track are None if nothing matches.
+        """
+        for table, is_auto in ((self.subtitles, False), (self.automatic_captions, True)):
+            for lang in langs:
+                tracks = table.get(lang)
+                if not tracks:
+                    continue
+                for ext in exts:
+                    for track in tracks:
+                        if track.get('ext') == ext and track.get('url'):
+                            return lang, track, is_auto
+        return None, None, False
+
+    def find_translated_track(self, target: str, source_track: Optional[Dict] = None) -> Tuple[Optional[Dict], bool]:
+        """YouTube's own captions in the `target` translation language
+
+        Manual subtitles first, then listed auto-translations, and finally the
+        source track URL with `tlang` (YouTube translates any timedtext track).
+        Returns (track, is_automatic).
+        """
+        langs = caption_langs(target)
+        _, track, is_auto = self.find_caption_track(langs)
+        if track:
+            return track, is_auto
+        if source_track and 'timedtext' in (source_track.get('url') or ''):
+            return {'ext': source_track.get('ext'), 'url': with_query(source_track['url'], tlang=langs[0])}, True
+        return None, False
+
+    def best_audio(self) -> Optional[AudioFormat]:
+        return self.audio_formats[0] if self.audio_formats else None
+
+
+def caption_langs(lang: str) -> List[str]:
+    return CAPTION_LANGS.get(lang.lower(), [lang])
+
+
+def with_query(url: str, **params: str) -> str:
+    """Set (or replace) query parameters on a URL"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in params]
+    query.extend(params.items())
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _track_table(table) -> Dict[str, List[Dict]]:
+    """Keep only the fields we use from yt-dlp's subtitle tables"""
+    result = {}
+    for lang, tracks in (table or {}).items():
+        result[lang] = [
+            {'ext': t.get('ext'), 'url': t.get('url'), 'name': t.get('name', '')}
+            for t in tracks or []
+        ]
+    return result
+
+
+def rank_audio_formats(formats: List[Dict]) -> List[AudioFormat]:
+    """Audio-only formats first, then API-friendly containers, then higher bitrate"""
+    candidates = []
+    for fmt in formats:
+        if not fmt.get('url') or fmt.get('acodec') in (None, 'none'):
+            continue
+        # 跳过 m3u8/dash 分片清单，只要能直接下载的URL
+        if fmt.get('protocol', 'https') not in ('http', 'https'):
+            continue
+        candidates.append(fmt)
+
+    def sort_key(fmt):
+        audio_only = fmt.get('vcodec') in (None, 'none')
+        friendly = fmt.get('ext') in API_FRIENDLY_EXTS
+        return (not audio_only, not friendly, -(fmt.get('abr') or fmt.get('tbr') or 0))
+
+    return [AudioFormat.from_format(f) for f in sorted(candidates, key=sort_key)]
+
+
+def probe_video(url: str, ydl_opts: Optional[Dict] = None) -> VideoInfo:
+    """Run a single extract_info(download=False) and wrap the result"""
+    opts = dict(PROBE_OPTS)
+    if ydl_opts:
+        opts.update(ydl_opts)
+
+    print(f"Probing video info: {url}")
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if not info:
+        raise Exception("无法获取视频信息")
+
+    video_info = VideoInfo.from_info_dict(ydl.sanitize_info(info))
+    print(f"Probe done: {video_info.title} ({video_info.duration:.0f}s, "
+          f"{len(video_info.audio_formats)} audio formats)")
+    return video_info
+
+
+def get_video_info(url: str, need_media: bool = False) -> VideoInfo:
+    """Probe through the shared info cache
+
+    need_media=True forces a fresh probe when the cached signed audio URLs
+    have expired; otherwise a cached entry with only static fields is enough.
+    """
+    from info_cache import get_info_cache
+
+    cache = get_info_cache()
+    video_id = extract_video_id(url)
+    if video_id:
+        cached = cache.get(video_id, need_media=need_media)
+        if cached is not None:
+            print(f"Video info cache hit: {video_id}")
+            return cached
+
+    video_info = probe_video(url)
+    cache.put(video_info)
+    return video_info
+
+
+def source_caption_langs(source: str) -> List[str]:
+    """Caption languages that hold the spoken text; English when the source is auto-detected"""
+    if source in ('en', 'auto'):
+        return ENGLISH_LANGS
+    return caption_langs(source)
@@ -0,0 +1,66 @@
+"""
+OpenAI Whisper API 调用
+
+单个文件的转写以及把 verbose_json 响应统一转换成 {start, end, text} 片段。
+超过 25 MB 的文件由 transcribe_any 按静音点切分后并发转写。
+"""
+import os
+from typing import Dict, List, Optional
+
+# OpenAI 接口单个文件上限 25 MB
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+
+SUPPORTED_FORMATS = ['.mp3', '.mp4', '.m4a', '.wav', '.webm', '.mpeg', '.mpga', '.ogg', '.oga', '.flac']
+
+
+def _field(seg, name, default=None):
+    # 新版 SDK 返回对象，旧版返回 dict
+    if isinstance(seg, dict):
+        return seg.get(name, default)
+    return getattr(seg, name, default)
+
+
+def parse_transcription(response) -> List[Dict]:
+    segments = []
+    for seg in getattr(response, 'segments', None) or []:
+        segments.append({
+            "start": float(_field(seg, 'start', 0) or 0),
+            "end": float(_field(seg, 'end', 0) or 0),
+            "text": (_field(seg, 'text', '') or '').strip(),
+        })
+    if not segments:
+        # Fallback
+        text = getattr(response, 'text', str(response))
+        segments.append({"start": 0, "end": 30, "text": text})
+    return segments
+
+
+def transcribe_file(client, audio_file: str, language: Optional[str] = 'en') -> List[Dict]:
+    """Send one file (<= 25 MB) to whisper-1 and return its segments"""
+    file_ext = os.path.splitext(audio_file)[1].lower()
+    if file_ext not in SUPPORTED_FORMATS:
+        print(f"Warning: File format {file_ext} may not be supported")
+
+    params = {}
+    if language:
+        params['language'] = language
+    with open(audio_file, 'rb') as audio:
+        response = client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio,
+            response_format="verbose_json",
+            timestamp_granularities=["segment"],
+            **params
+        )
+    return parse_transcription(response)
+
+
+def transcribe_any(client, audio_file: str, language: Optional[str] = 'en') -> List[Dict]:
+    """Transcribe a file of any size, splitting it at silences when it is over the 25 MB limit"""
+    file_size = os.path.getsize(audio_file)
+    if file_size > MAX_UPLOAD_BYTES:
+        from audio_chunker import transcribe_in_chunks
+
+        print(f"File is {file_size / (1024 * 1024):.1f} MB, transcribing in chunks...")
+        return transcribe_in_chunks(audio_file, lambda chunk: transcribe_file(client, chunk, language=language))
+    return transcribe_file(client, audio_file, language=language)
@@ -0,0 +1,32 @@
+"""
+请求级工作目录
+
+下载、VAD、分段等中间文件都放在同一个目录里，随请求结束整体删除。
+文件在目录内只做重命名，不再为了离开临时目录而整份读进内存再写一遍。
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+@contextmanager
+def job_workdir(prefix: str = 'job_') -> Iterator[str]:
+    """Create a private directory for one request and always remove it afterwards
+
+    JOB_WORKDIR_ROOT puts these directories on a specific volume (default: system temp).
+    """
+    path = tempfile.mkdtemp(prefix=prefix, dir=os.environ.get('JOB_WORKDIR_ROOT') or None)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def find_download(work_dir: str, stem: str = 'audio') -> Optional[str]:
+    """Path of the finished yt-dlp output named `stem.<ext>`, ignoring .part files"""
+    for name in sorted(os.listdir(work_dir)):
+        if name.startswith(stem + '.') and not name.endswith(('.part', '.ytdl')):
+            return os.path.join(work_dir, name)
+    return None
@@ -1,6 +1,8 @@
 import React, { useState } from 'react';
 import axios from 'axios';
 import './App.css';
+import { isChunkedUploadUnsupported, uploadInParts } from './chunkedUpload';
+import { streamTranscript } from './transcriptStream';
 
 function App() {
   const [url, setUrl] = useState('');
@@ -45,37 +47,45 @@ function App() {
       if (inputMode === 'file' && audioFile) {
         console.log('Processing file:', audioFile.name, 'Size:', audioFile.size);
         
-        // 检查文件大小 (限制25MB)
-        if (audioFile.size > 25 * 1024 * 1024) {
-          throw new Error('文件太大，请选择25MB以内的文件');
+        // 检查文件大小 (限制500MB)
+        if (audioFile.size > 500 * 1024 * 1024) {
+          throw new Error('文件太大，请选择500MB以内的文件');
         }
         
-        // 将文件转换为base64
-        console.log('Converting file to base64...');
-        const reader = new FileReader();
-        const base64Promise = new Promise((resolve, reject) => {
-          reader.onload = () => {
-            console.log('File converted to base64, length:', reader.result.length);
-            resolve(reader.result);
-          };
-          reader.onerror = (error) => {
-            console.error('FileReader error:', error);
-            reject(error);
-          };
-          reader.readAsDataURL(audioFile);
-        });
-        
-        const base64Data = await base64Promise;
-        
-        console.log('Sending request with base64 data...');
-        // 发送base64数据
-        response = await axios.post(apiUrl, {
-          audio_base64: base64Data,
-          filename: audioFile.name,
-          api_key: apiKey
-        }, {
-          timeout: 300000 // 5分钟超时
-        });
+        let uploadSha256 = null;
+        if (audioFile.size > 4 * 1024 * 1024) {
+          // 大文件分片上传，断线后只需重传失败的分片
+          console.log('Uploading file in parts...');
+          const uploadUrl = apiUrl.replace(/\/transcribe$/, '/upload');
+          try {
+            uploadSha256 = await uploadInParts(uploadUrl, audioFile, (progress) => {
+              console.log(`Upload progress: ${Math.round(progress * 100)}%`);
+            });
+          } catch (err) {
+            if (!isChunkedUploadUnsupported(err)) throw err;
+            // 后端不支持分片上传，改为整体上传
+            console.log(err.message, '- falling back to a single upload');
+          }
+        }
+
+        if (uploadSha256) {
+          response = await axios.post(apiUrl, {
+            upload_sha256: uploadSha256,
+            api_key: apiKey
+          }, {
+            timeout: 300000 // 5分钟超时
+          });
+        } else {
+          // 以 multipart/form-data 上传，服务端边收边写入磁盘
+          const formData = new FormData();
+          formData.append('api_key', apiKey);
+          formData.append('audio', audioFile, audioFile.name);
+          
+          console.log('Uploading file...');
+          response = await axios.post(apiUrl, formData, {
+            timeout: 300000 // 5分钟超时
+          });
+        }
       } else if (inputMode === 'text' && subtitleText) {
         console.log('Processing subtitle text...');
         // 字幕文本
@@ -87,17 +97,17 @@ function App() {
         });
       } else {
         console.log('Processing YouTube URL:', url);
-        // YouTube URL
-        response = await axios.post(apiUrl, { 
+        // YouTube URL：逐段显示，不必等整个视频处理完
+        await streamTranscript(apiUrl, {
           url: url,
-          api_key: apiKey 
-        }, {
-          timeout: 300000 // 5分钟超时
-        });
+          api_key: apiKey
+        }, setTranscript);
       }
       
-      console.log('Response received:', response.data);
-      setTranscript(response.data);
+      if (response) {
+        console.log('Response received:', response.data);
+        setTranscript(response.data);
+      }
     } catch (err) {
       console.error('Error details:', err);
       console.error('Error response:', err.response);
@@ -0,0 +1,73 @@
+import axios from 'axios';
+
+// 单片小于 Vercel 函数 4.5MB 的请求体上限
+const PART_SIZE = 4 * 1024 * 1024;
+const PART_RETRIES = 5;
+// 超过这个大小不在浏览器里整体计算哈希，避免占用过多内存
+const MAX_HASH_BYTES = 200 * 1024 * 1024;
+
+const toHex = (buffer) =>
+  Array.from(new Uint8Array(buffer)).map((b) => b.toString(16).padStart(2, '0')).join('');
+
+const sha256 = async (blob) => toHex(await crypto.subtle.digest('SHA-256', await blob.arrayBuffer()));
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// 后端没有 /upload (本地 FastAPI 后端 404) 或没有配置持久存储 (Vercel 501)
+export const isChunkedUploadUnsupported = (err) => Boolean(err && err.chunkedUploadUnsupported);
+
+// init -> 逐片上传(失败只重传该片) -> complete，返回文件的 sha256
+// 后端不支持分片上传时抛出的错误满足 isChunkedUploadUnsupported，由调用方改用普通上传
+export async function uploadInParts(uploadUrl, file, onProgress) {
+  const fileHash = file.size <= MAX_HASH_BYTES && crypto.subtle ? await sha256(file) : null;
+
+  let session;
+  try {
+    ({ data: session } = await axios.post(`${uploadUrl}?action=init`, {
+      filename: file.name,
+      size: file.size,
+      sha256: fileHash,
+      part_size: PART_SIZE,
+    }));
+  } catch (err) {
+    if (err.response && (err.response.status === 404 || err.response.status === 501)) {
+      const unsupported = new Error(`Chunked upload unavailable (HTTP ${err.response.status})`);
+      unsupported.chunkedUploadUnsupported = true;
+      throw unsupported;
+    }
+    throw err;
+  }
+  if (session.complete) {
+    // 服务器上已经有同样内容的文件，跳过传输
+    onProgress && onProgress(1);
+    return session.sha256;
+  }
+
+  const received = new Set(session.received_parts);
+  for (let part = 0; part < session.part_count; part++) {
+    if (received.has(part)) continue;
+    const blob = file.slice(part * session.part_size, (part + 1) * session.part_size);
+    const partHash = crypto.subtle ? await sha256(blob) : undefined;
+    for (let attempt = 0; ; attempt++) {
+      try {
+        await axios.put(`${uploadUrl}?upload_id=${session.upload_id}&part=${part}`, blob, {
+          headers: {
+            'Content-Type': 'application/octet-stream',
+            ...(partHash ? { 'X-Part-Sha256': partHash } : {}),
+          },
+          timeout: 120000,
+        });
+        break;
+      } catch (err) {
+        if (attempt + 1 >= PART_RETRIES || (err.response && err.response.status < 500 && err.response.status !== 422)) {
+          throw err;
+        }
+        await sleep(1000 * 2 ** attempt);
+      }
+    }
+    onProgress && onProgress((part + 1) / session.part_count);
+  }
+
+  const { data: result } = await axios.post(`${uploadUrl}?action=complete&upload_id=${session.upload_id}`);
+  return result.sha256;
+}
@@ -0,0 +1,54 @@
+// 以 NDJSON 逐段接收转写结果；服务端返回普通 JSON 时(如缓存或无API密钥)整体交给 onTranscript
+export async function streamTranscript(apiUrl, body, onTranscript) {
+  const response = await fetch(apiUrl, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'application/x-ndjson',
+    },
+    body: JSON.stringify(body),
+  });
+
+  const contentType = response.headers.get('Content-Type') || '';
+  if (!response.ok || !contentType.includes('application/x-ndjson')) {
+    const data = await response.json();
+    if (!response.ok) {
+      throw new Error(data.error || data.detail || `HTTP ${response.status}`);
+    }
+    onTranscript(data);
+    return data;
+  }
+
+  const transcript = { title: '', segments: [] };
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  const handle = ({ event, data }) => {
+    if (event === 'progress' && data.title) {
+      transcript.title = data.title;
+    } else if (event === 'segment') {
+      transcript.segments[data.index] = { ...data, translation: '' };
+    } else if (event === 'translation') {
+      transcript.segments[data.index] = { ...transcript.segments[data.index], ...data };
+    } else if (event === 'done') {
+      transcript.title = data.title;
+    } else if (event === 'error') {
+      throw new Error(data.message);
+    }
+    onTranscript({ title: transcript.title, segments: [...transcript.segments] });
+  };
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (line.trim()) handle(JSON.parse(line));
+    }
+  }
+  if (buffer.trim()) handle(JSON.parse(buffer));
+  return transcript;
+}